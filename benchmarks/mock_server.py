@@ -0,0 +1,386 @@
+import argparse
+import hashlib
+import http.server
+import json
+import random
+import threading
+import time
+import urllib.parse
+from collections import Counter
+
+DEFAULT_PORT = 8545
+DEFAULT_HEAD = 20_000_000
+DEFAULT_TXS_PER_BLOCK = 20
+DEFAULT_DEPLOYMENT_RATE = 0.05
+DEFAULT_VERIFIED_RATE = 0.6
+# Numero di contratti "modello": i deployment con lo stesso modello sono cloni
+DEFAULT_TEMPLATES = 50
+GENESIS_TIMESTAMP = 1_438_269_973
+VERSIONS = ("4", "5", "6", "7", "8")
+
+THROTTLE_RESPONSE = {"status": "0", "message": "NOTOK", "result": "Max rate limit reached"}
+
+
+class TokenBucket:
+    """Limite di richieste al secondo del servizio simulato; rate=0 lo disattiva."""
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self):
+        if not self.rate:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def _digest(*parts):
+    return hashlib.sha256(":".join(str(part) for part in parts).encode()).hexdigest()
+
+
+class SyntheticChain:
+    """
+    Catena sintetica deterministica: ogni blocco, transazione e contratto è
+    ricavato dal seed, così esecuzioni diverse vedono gli stessi dati.
+    L'hash di una transazione codifica blocco e indice, le ricevute non
+    richiedono quindi stato.
+    """
+    def __init__(self, seed=0, head=DEFAULT_HEAD, txs_per_block=DEFAULT_TXS_PER_BLOCK,
+                 deployment_rate=DEFAULT_DEPLOYMENT_RATE, verified_rate=DEFAULT_VERIFIED_RATE,
+                 templates=DEFAULT_TEMPLATES):
+        self.seed = seed
+        self.head = head
+        self.txs_per_block = txs_per_block
+        self.deployment_rate = deployment_rate
+        self.verified_rate = verified_rate
+        self.templates = templates
+
+    def transaction(self, block_number, index):
+        rng = random.Random(_digest(self.seed, "tx", block_number, index))
+        deployment = rng.random() < self.deployment_rate
+        template = rng.randrange(self.templates)
+        return {
+            "blockNumber": hex(block_number),
+            "hash": f"0x{block_number:032x}{index:032x}",
+            "transactionIndex": hex(index),
+            "from": "0x" + _digest(self.seed, "sender", block_number, index)[:40],
+            "nonce": hex(rng.randrange(1000)),
+            "to": None if deployment else "0x" + _digest(self.seed, "to", rng.randrange(1000))[:40],
+            "input": self.creation_bytecode(template) if deployment else "0x",
+            "value": "0x0",
+            "gas": hex(3_000_000),
+            "gasPrice": hex(20 * 10**9),
+        }
+
+    def block_hash(self, block_number):
+        return "0x" + _digest(self.seed, "hash", block_number)
+
+    def block(self, block_number):
+        if block_number > self.head:
+            return None
+        rng = random.Random(_digest(self.seed, "block", block_number))
+        count = rng.randint(0, 2 * self.txs_per_block)
+        return {
+            "number": hex(block_number),
+            "hash": self.block_hash(block_number),
+            # Concatenato all'hash del blocco precedente, come richiesto da --follow per rilevare i reorg
+            "parentHash": self.block_hash(block_number - 1) if block_number > 0 else "0x" + "00" * 32,
+            "timestamp": hex(GENESIS_TIMESTAMP + block_number * 12),
+            "transactions": [self.transaction(block_number, i) for i in range(count)],
+        }
+
+    def transaction_by_hash(self, tx_hash):
+        try:
+            block_number, index = int(tx_hash[2:34], 16), int(tx_hash[34:66], 16)
+        except ValueError:
+            return None
+        if block_number > self.head:
+            return None
+        return self.transaction(block_number, index)
+
+    def receipt(self, tx_hash):
+        tx = self.transaction_by_hash(tx_hash)
+        if tx is None:
+            return None
+        contract_address = None
+        if tx["to"] is None:
+            # Import differito: solo le ricevute dei deployment richiedono keccak
+            from scripts.contract_address import compute_contract_address
+            contract_address = compute_contract_address(tx["from"], int(tx["nonce"], 16))
+        return {
+            "transactionHash": tx_hash,
+            "blockNumber": tx["blockNumber"],
+            "contractAddress": contract_address,
+            "status": "0x1",
+        }
+
+    def _contract(self, address):
+        rng = random.Random(_digest(self.seed, "contract", address.lower()))
+        return {
+            "verified": rng.random() < self.verified_rate,
+            "version": rng.choice(VERSIONS),
+            "patch": rng.randrange(20),
+            "template": rng.randrange(self.templates),
+        }
+
+    @staticmethod
+    def _body(template):
+        return "".join(
+            f"    function f{i}(uint256 x) public pure returns (uint256) {{ return x * {template + i}; }}\n"
+            for i in range(20)
+        )
+
+    def creation_bytecode(self, template):
+        return "0x60806040" + _digest("code", template) * 40 + f"{template:064x}"
+
+    def runtime_bytecode(self, address):
+        contract = self._contract(address)
+        # Metadati CBOR diversi per ogni indirizzo, come quelli prodotti da solc
+        metadata = "a264697066735822" + "1220" + _digest("ipfs", address.lower()) + "64736f6c6343" + "000811" + "0033"
+        return "0x6080604052" + _digest("code", contract["template"]) * 40 + metadata
+
+    def source_metadata(self, address):
+        contract = self._contract(address)
+        if not contract["verified"]:
+            return {"SourceCode": "", "ABI": "Contract source code not verified", "ContractName": "",
+                    "CompilerVersion": "", "OptimizationUsed": "", "ConstructorArguments": "",
+                    "Library": "", "Proxy": "0", "CompilerType": ""}
+        version = f"0.{contract['version']}.{contract['patch']}"
+        abi = [
+            {"type": "constructor", "inputs": [{"name": "seed", "type": "uint256"}], "stateMutability": "nonpayable"},
+            *({"type": "function", "name": f"f{i}", "inputs": [{"name": "x", "type": "uint256"}],
+               "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "pure"} for i in range(20)),
+        ]
+        return {
+            "SourceCode": f"// SPDX-License-Identifier: MIT\npragma solidity ^{version};\n\n"
+                          f"contract C{contract['template']} {{\n{self._body(contract['template'])}}}\n",
+            "ABI": json.dumps(abi),
+            "ContractName": f"C{contract['template']}",
+            "CompilerVersion": f"v{version}+commit.{_digest('commit', version)[:8]}",
+            "OptimizationUsed": "1",
+            "Runs": "200",
+            "ConstructorArguments": f"{contract['template']:064x}",
+            "Library": "",
+            "Proxy": "0",
+            "Implementation": "",
+            "CompilerType": "solc",
+        }
+
+
+class RecordedResponses:
+    """
+    Risposte registrate in una cache del miner (--cache): hanno precedenza
+    su quelle sintetiche quando la chiave corrisponde.
+    """
+    def __init__(self, path):
+        from scripts.response_cache import ResponseCache
+        self.cache = ResponseCache(path, offline=False)
+
+    def get(self, module, action, params):
+        from scripts.response_cache import MISS
+        value = self.cache.get(module, action, params)
+        return None if value is MISS else value
+
+
+class MockState:
+    """
+    Configurazione e contatori condivisi dai thread del server.
+    :param latency: Latenza media in secondi aggiunta a ogni richiesta
+    :param jitter: Variazione massima della latenza, in secondi
+    :param etherscan_rate: Richieste al secondo accettate da Etherscan (0 = illimitate)
+    :param node_rate: Richieste HTTP al secondo accettate dal nodo (0 = illimitate)
+    :param error_rate: Frazione di richieste che falliscono con un 5xx
+    """
+    def __init__(self, chain, latency=0.0, jitter=0.0, etherscan_rate=0, node_rate=0, error_rate=0.0, recorded=None):
+        self.chain = chain
+        self.latency = latency
+        self.jitter = jitter
+        self.etherscan_bucket = TokenBucket(etherscan_rate)
+        self.node_bucket = TokenBucket(node_rate)
+        self.error_rate = error_rate
+        self.recorded = recorded
+        self.lock = threading.Lock()
+        self.counters = Counter()
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.counters[key] += amount
+
+    def stats(self, reset=False):
+        with self.lock:
+            stats = dict(self.counters)
+            if reset:
+                self.counters.clear()
+        return stats
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def inject_error(self):
+        return self.error_rate and random.random() < self.error_rate
+
+    def rpc(self, method, params):
+        """
+        :return: Risultato JSON-RPC, oppure solleva ValueError per i metodi non supportati
+        """
+        if self.recorded is not None:
+            recorded = self.recorded.get("rpc", method, params)
+            if recorded is not None:
+                return recorded
+        chain = self.chain
+        if method == "eth_blockNumber":
+            return hex(chain.head)
+        if method == "eth_chainId":
+            return "0x1"
+        if method == "eth_getBlockByNumber":
+            tag = params[0]
+            return chain.block(chain.head if tag == "latest" else int(tag, 16))
+        if method == "eth_getTransactionByHash":
+            return chain.transaction_by_hash(params[0])
+        if method == "eth_getTransactionReceipt":
+            return chain.receipt(params[0])
+        if method == "eth_getCode":
+            return chain.runtime_bytecode(params[0])
+        raise ValueError(f"method {method} not supported")
+
+    def etherscan(self, params):
+        module, action = params.pop("module", None), params.pop("action", None)
+        params.pop("apikey", None)
+        if self.recorded is not None:
+            recorded = self.recorded.get(module, action, params)
+            if recorded is not None:
+                return recorded
+        if module == "contract" and action == "getsourcecode":
+            return {"status": "1", "message": "OK", "result": [self.chain.source_metadata(params["address"])]}
+        if module == "proxy":
+            rpc_params = {
+                "eth_blockNumber": lambda: [],
+                "eth_getBlockByNumber": lambda: [params["tag"], params.get("boolean") == "true"],
+                "eth_getTransactionByHash": lambda: [params["txhash"]],
+                "eth_getTransactionReceipt": lambda: [params["txhash"]],
+                "eth_getCode": lambda: [params["address"], params.get("tag", "latest")],
+            }
+            if action in rpc_params:
+                return {"jsonrpc": "2.0", "id": 1, "result": self.rpc(action, rpc_params[action]())}
+        return {"status": "0", "message": "NOTOK", "result": f"Error! Unsupported {module}/{action}"}
+
+
+class MockHandler(http.server.BaseHTTPRequestHandler):
+    # Keep-alive come i server reali: il pool di connessioni del miner viene riutilizzato
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fail(self):
+        self.state.count("errors")
+        self._reply(random.choice((500, 502, 503)), {"error": "injected"})
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        if url.path == "/stats":
+            self._reply(200, self.state.stats(reset=params.get("reset") == "1"))
+            return
+        if url.path != "/api":
+            self._reply(404, {"error": "not found"})
+            return
+        self.state.delay()
+        self.state.count(f"etherscan {params.get('action')}")
+        if self.state.inject_error():
+            self._fail()
+        elif not self.state.etherscan_bucket.allow():
+            self.state.count("throttled")
+            self._reply(200, THROTTLE_RESPONSE)
+        else:
+            self._reply(200, self.state.etherscan(params))
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+        self.state.delay()
+        calls = request if isinstance(request, list) else [request]
+        for call in calls:
+            self.state.count(f"node {call.get('method')}")
+        self.state.count("node requests")
+        if self.state.inject_error():
+            self._fail()
+            return
+        if not self.state.node_bucket.allow():
+            self.state.count("throttled")
+            self._reply(429, {"error": "too many requests"})
+            return
+        responses = []
+        for call in calls:
+            try:
+                responses.append({"jsonrpc": "2.0", "id": call.get("id"), "result": self.state.rpc(call["method"], call.get("params", []))})
+            except ValueError as e:
+                responses.append({"jsonrpc": "2.0", "id": call.get("id"), "error": {"code": -32601, "message": str(e)}})
+        self._reply(200, responses if isinstance(request, list) else responses[0])
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(state, port=DEFAULT_PORT, host="127.0.0.1"):
+    """
+    Avvia il server su un thread in background.
+    :return: ThreadingHTTPServer; la porta effettiva è server.server_address[1]
+    """
+    server = http.server.ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, name="mock-server", daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--head", type=int, default=DEFAULT_HEAD, help=f"Latest block of the synthetic chain (default: {DEFAULT_HEAD})")
+    parser.add_argument("--txs-per-block", type=int, default=DEFAULT_TXS_PER_BLOCK, help=f"Average transactions per block (default: {DEFAULT_TXS_PER_BLOCK})")
+    parser.add_argument("--deployment-rate", type=float, default=DEFAULT_DEPLOYMENT_RATE, help=f"Fraction of transactions that deploy a contract (default: {DEFAULT_DEPLOYMENT_RATE})")
+    parser.add_argument("--verified-rate", type=float, default=DEFAULT_VERIFIED_RATE, help=f"Fraction of contracts with verified source (default: {DEFAULT_VERIFIED_RATE})")
+    parser.add_argument("--templates", type=int, default=DEFAULT_TEMPLATES, help=f"Distinct contracts; deployments of the same one are clones (default: {DEFAULT_TEMPLATES})")
+    parser.add_argument("--latency", type=float, default=50, help="Mean latency per request in ms (default: 50)")
+    parser.add_argument("--jitter", type=float, default=20, help="Maximum latency variation in ms (default: 20)")
+    parser.add_argument("--etherscan-rate", type=float, default=5, help="Etherscan requests per second before 'Max rate limit reached', 0 for no limit (default: 5)")
+    parser.add_argument("--node-rate", type=float, default=0, help="Node HTTP requests per second before HTTP 429, 0 for no limit (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 5xx (default: 0)")
+    parser.add_argument("--recorded", default=None, help="Serve the responses stored in a miner --cache database before synthetic ones")
+
+
+def state_from_args(args):
+    chain = SyntheticChain(args.seed, args.head, args.txs_per_block, args.deployment_rate, args.verified_rate, args.templates)
+    recorded = RecordedResponses(args.recorded) if args.recorded else None
+    return MockState(chain, args.latency / 1000, args.jitter / 1000, args.etherscan_rate, args.node_rate, args.error_rate, recorded)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Etherscan API and an Ethereum JSON-RPC node.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_server(state_from_args(args), args.port)
+    print(f"Etherscan API on http://127.0.0.1:{args.port}/api, JSON-RPC on http://127.0.0.1:{args.port}/rpc/<key>")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
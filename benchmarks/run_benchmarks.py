@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from benchmarks.mock_server import start_server, state_from_args, add_arguments
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BLOCKS = 200
+COUNTER_LIMIT = 1_000_000
+# Chunk per esecuzione: abbastanza da dare lavoro a tutti i thread degli scenari
+CHUNKS_PER_RUN = 32
+
+# Nome -> argomenti di main.py; --start-block, --end-block, --chunk-size e le opzioni di misura sono aggiunti dal runner
+DEFAULT_SCENARIOS = {
+    "threads-1": ["--threads", "1"],
+    "threads-4": ["--threads", "4"],
+    "threads-8": ["--threads", "8"],
+    "threads-4-node": ["--threads", "4", "--block-source", "node"],
+    "async-16-node": ["--engine", "async", "--window", "16", "--block-source", "node"],
+}
+
+CONFIG_TEMPLATE = """\
+ETHERSCAN_API_KEY = "benchmark"
+ETHERSCAN_API_URL = "{url}/api"
+ETHERSCAN_RATE_LIMIT_DELAY = {delay}
+INFURA_API_URL = "{url}/rpc/"
+INFURA_API_KEY = "benchmark"
+COUNTER_LIMIT = {{"0_4": {limit}, "0_5": {limit}, "0_6": {limit}, "0_7": {limit}, "0_8": {limit}}}
+"""
+
+
+def fetch_stats(url, reset=False):
+    with urllib.request.urlopen(f"{url}/stats" + ("?reset=1" if reset else "")) as response:
+        return json.loads(response.read())
+
+
+def run_scenario(name, main_args, url, start_block, blocks, delay):
+    """
+    Esegue main.py in una cartella temporanea, con un config.py che punta al
+    server simulato, e ne misura tempo, chiamate e memoria di picco.
+    """
+    with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as workdir:
+        with open(os.path.join(workdir, "config.py"), "w") as file:
+            file.write(CONFIG_TEMPLATE.format(url=url, delay=delay, limit=COUNTER_LIMIT))
+        command = [
+            sys.executable, os.path.join(REPO_ROOT, "main.py"),
+            "--start-block", str(start_block),
+            "--end-block", str(start_block - blocks + 1),
+            "--log-level", "warning",
+            "--metrics-file", "metrics.json",
+            *main_args,
+        ]
+        if "--chunk-size" not in main_args:
+            # Con il --chunk-size predefinito (100) pochi blocchi stanno in un solo chunk e lavora un solo thread
+            command += ["--chunk-size", str(max(1, blocks // CHUNKS_PER_RUN))]
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join([workdir, REPO_ROOT])}
+        fetch_stats(url, reset=True)
+        started = time.monotonic()
+        process = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        stderr = process.stderr.read()
+        process.stderr.close()
+        # wait4 restituisce le risorse del solo processo figlio
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.monotonic() - started
+        exit_code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+        calls = fetch_stats(url)
+
+        saved = 0
+        metrics_path = os.path.join(workdir, "metrics.json")
+        if os.path.exists(metrics_path):
+            with open(metrics_path) as file:
+                counters = json.load(file)["counters"]
+            saved = sum(value for key, value in counters.items() if key.startswith("miner_saves_total"))
+
+    etherscan_calls = sum(count for key, count in calls.items() if key.startswith("etherscan "))
+    node_calls = calls.get("node requests", 0)
+    return {
+        "scenario": name,
+        "args": " ".join(main_args),
+        "exit code": exit_code,
+        "seconds": elapsed,
+        "blocks/s": blocks / elapsed,
+        "saved": saved,
+        "etherscan calls": etherscan_calls,
+        "node requests": node_calls,
+        "calls per saved contract": (etherscan_calls + node_calls) / saved if saved else None,
+        "throttled": calls.get("throttled", 0),
+        "errors injected": calls.get("errors", 0),
+        # ru_maxrss è in KB su Linux
+        "peak memory MB": usage.ru_maxrss / 1024,
+        "stderr": stderr.decode(errors="replace")[-2000:] if exit_code or not saved else "",
+    }
+
+
+def print_results(results):
+    columns = ("scenario", "seconds", "blocks/s", "saved", "etherscan calls", "node requests",
+               "calls per saved contract", "throttled", "peak memory MB")
+    print(" | ".join(columns))
+    for result in results:
+        cells = []
+        for column in columns:
+            value = result[column]
+            cells.append(f"{value:.2f}" if isinstance(value, float) else str(value))
+        print(" | ".join(cells))
+    for result in results:
+        if result["exit code"]:
+            print(f"\n{result['scenario']} exited with {result['exit code']}:\n{result['stderr']}")
+        elif not result["saved"]:
+            print(f"\n{result['scenario']} saved no contracts, calls per saved contract cannot be measured:\n{result['stderr']}")
+
+
+def failed(results):
+    # Uno scenario senza contratti salvati non misura nulla: va segnalato come errore
+    return [result["scenario"] for result in results if result["exit code"] or not result["saved"]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run main.py end-to-end against a local mock of Etherscan and the node.")
+    parser.add_argument("--blocks", type=int, default=DEFAULT_BLOCKS, help=f"Blocks scanned per scenario (default: {DEFAULT_BLOCKS})")
+    parser.add_argument("--scenario", action="append", default=None, choices=list(DEFAULT_SCENARIOS),
+                        help=f"Scenario to run, repeatable (default: all of {', '.join(DEFAULT_SCENARIOS)})")
+    parser.add_argument("--extra-args", default="", help="Arguments appended to every main.py invocation, e.g. \"--dedup --cache\"")
+    parser.add_argument("--output", default=None, help="Also write the results to this JSON file")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_server(state_from_args(args), port=0)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    # Il miner rispetta lo stesso limite del server, come con la API key reale
+    delay = 1 / args.etherscan_rate if args.etherscan_rate else 0.001
+    results = []
+    for name in args.scenario or DEFAULT_SCENARIOS:
+        print(f"Running {name}...")
+        main_args = DEFAULT_SCENARIOS[name] + args.extra_args.split()
+        results.append(run_scenario(name, main_args, url, args.head, args.blocks, delay))
+    server.shutdown()
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if failed(results):
+        sys.exit(f"Failed scenarios: {', '.join(failed(results))}")
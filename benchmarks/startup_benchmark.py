@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import Manager
+from benchmarks.mock_server import start_server, state_from_args, add_arguments
+from benchmarks.run_benchmarks import CONFIG_TEMPLATE, REPO_ROOT, fetch_stats
+
+DEFAULT_RUNS = 10
+DEFAULT_RESERVATIONS = 20_000
+VERSION_FOLDERS = ("0_4", "0_5", "0_6", "0_7", "0_8")
+
+# Nome -> comando Python eseguito nella cartella temporanea
+STARTUP_COMMANDS = {
+    "import main": ["-c", "import main"],
+    "main.py --help": ["main.py", "--help"],
+}
+
+
+def write_config(workdir, url, limit):
+    with open(os.path.join(workdir, "config.py"), "w") as file:
+        file.write(CONFIG_TEMPLATE.format(url=url, delay=0.001, limit=limit))
+
+
+def time_startup(label, tree, url, runs):
+    """
+    Mediana del tempo di avvio di ogni comando in STARTUP_COMMANDS, su `runs`
+    processi freschi, e chiamate di rete fatte prima di tornare.
+    :param tree: Cartella con main.py (il repository o un'altra revisione)
+    """
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-startup-") as workdir:
+        write_config(workdir, url, 1)
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join([workdir, tree])}
+        for name, args in STARTUP_COMMANDS.items():
+            if args[0].endswith(".py"):
+                args = [os.path.join(tree, args[0])] + args[1:]
+            fetch_stats(url, reset=True)
+            timings = []
+            exit_code = 0
+            for _ in range(runs):
+                started = time.monotonic()
+                completed = subprocess.run([sys.executable, *args], cwd=workdir, env=env,
+                                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+                timings.append(time.monotonic() - started)
+                exit_code = exit_code or completed.returncode
+            calls = fetch_stats(url)
+            results.append({
+                "tree": label,
+                "command": name,
+                "median ms": statistics.median(timings) * 1000,
+                "min ms": min(timings) * 1000,
+                "network calls per run": (sum(count for key, count in calls.items() if key.startswith("etherscan "))
+                                          + calls.get("node requests", 0)) / runs,
+                "exit code": exit_code,
+                "stderr": completed.stderr.decode(errors="replace")[-2000:] if exit_code else "",
+            })
+    return results
+
+
+def export_tree(ref, directory):
+    # git archive evita di toccare la copia di lavoro
+    archive = subprocess.run(["git", "-C", REPO_ROOT, "archive", ref], check=True, capture_output=True).stdout
+    subprocess.run(["tar", "-x", "-C", directory], input=archive, check=True)
+
+
+def time_reservations(name, reserve, reservations):
+    folders = [VERSION_FOLDERS[i % len(VERSION_FOLDERS)] for i in range(reservations)]
+    started = time.perf_counter()
+    for version_folder in folders:
+        reserve(version_folder)
+    elapsed = time.perf_counter() - started
+    return {"counter": name, "reservations": reservations, "us per save": elapsed / reservations * 1e6}
+
+
+def counter_overhead(reservations):
+    """
+    Costo di controllo e incremento del contatore per ogni salvataggio:
+    dizionario di un Manager (il vecchio schema) contro scripts.counter.
+    """
+    # Import differito: scripts.counter legge COUNTER_LIMIT da config.py
+    from scripts.counter import SaveCounter, StoreCounter
+
+    limits = dict.fromkeys(VERSION_FOLDERS, reservations)
+    results = []
+    lock = threading.Lock()
+    with Manager() as manager:
+        shared = manager.dict(dict.fromkeys(VERSION_FOLDERS, 0))
+
+        def reserve_manager(version_folder):
+            # Ogni lettura e scrittura è un round trip verso il processo del Manager
+            with lock:
+                if shared[version_folder] < limits[version_folder]:
+                    shared[version_folder] += 1
+
+        results.append(time_reservations("multiprocessing.Manager dict", reserve_manager, reservations))
+    results.append(time_reservations("SaveCounter", SaveCounter(limits).reserve, reservations))
+    with tempfile.TemporaryDirectory(prefix="bench-counter-") as workdir:
+        counter = StoreCounter(os.path.join(workdir, "counters.db"), limits)
+        results.append(time_reservations("StoreCounter", counter.reserve, reservations))
+        counter.close()
+    return results
+
+
+def print_results(startup, counters):
+    print("tree | command | median ms | min ms | network calls per run")
+    for result in startup:
+        print(f"{result['tree']} | {result['command']} | {result['median ms']:.1f} | {result['min ms']:.1f} | {result['network calls per run']:.1f}")
+    print("\ncounter | reservations | us per save")
+    for result in counters:
+        print(f"{result['counter']} | {result['reservations']} | {result['us per save']:.2f}")
+    for result in startup:
+        if result["exit code"]:
+            print(f"\n{result['tree']} {result['command']} exited with {result['exit code']}:\n{result['stderr']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cold start of main.py and the per-save counter overhead.")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help=f"Fresh processes per startup command (default: {DEFAULT_RUNS})")
+    parser.add_argument("--reservations", type=int, default=DEFAULT_RESERVATIONS, help=f"Counter reservations per counter (default: {DEFAULT_RESERVATIONS})")
+    parser.add_argument("--baseline", default=None, help="Also time the startup of this git revision, e.g. HEAD~1")
+    parser.add_argument("--output", default=None, help="Also write the results to this JSON file")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    # Il server simulato risponde a eth_blockNumber se l'avvio interroga ancora la rete
+    server = start_server(state_from_args(args), port=0)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    startup = time_startup("working tree", REPO_ROOT, url, args.runs)
+    if args.baseline:
+        with tempfile.TemporaryDirectory(prefix="bench-baseline-") as baseline:
+            export_tree(args.baseline, baseline)
+            startup += time_startup(args.baseline, baseline, url, args.runs)
+    server.shutdown()
+
+    with tempfile.TemporaryDirectory(prefix="bench-config-") as workdir:
+        write_config(workdir, url, 1)
+        sys.path.insert(0, workdir)
+        counters = counter_overhead(args.reservations)
+
+    print_results(startup, counters)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"startup": startup, "counters": counters}, file, indent=2)
@@ -1,136 +1,178 @@
 import concurrent.futures
 import argparse
+import logging
 import traceback
-from multiprocessing import Manager
-from scripts.client_etherscan import EtherscanClient
+import threading
+import time
+from scripts.client_etherscan import EtherscanClient, BudgetExhausted, total_stats, set_call_budget
 from scripts.client_web3 import Web3Client
-from scripts.dispatcher import save
-from scripts.utils import * 
-from threading import Lock
+from scripts.http_session import configure_pool
+from scripts.dispatcher import is_already_saved
+from scripts.pipeline import ContractPipeline, Candidate
+from scripts.checkpoint import ProgressJournal, plan_ranges, DEFAULT_JOURNAL_PATH
+from scripts.work_queue import BlockQueue, DEFAULT_CHUNK_SIZE
+from scripts.coordinator import LeaseQueue, open_leases, default_worker_id, DEFAULT_LEASE_SECONDS
+from scripts.key_pool import configure_pools
+from scripts.follow import (
+    FollowState,
+    RetryQueue,
+    ChainHead,
+    run_follow,
+    DEFAULT_FOLLOW_PATH,
+    DEFAULT_CONFIRMATIONS,
+    DEFAULT_POLL_INTERVAL,
+)
+from scripts.metadata_store import configure_store, BACKENDS, DEFAULT_BACKEND
+from scripts.artifact_sink import configure_sink, close_sink, SINKS, DEFAULT_SINK, DEFAULT_SHARD_SIZE_MB
+from scripts.block_source import make_block_source, iter_batches, BLOCK_SOURCES, DEFAULT_RPC_BATCH_SIZE
+from scripts.contract_address import ReceiptVerifier, VERIFY_MODES, DEFAULT_SAMPLE_RATE
+from scripts.response_cache import configure_cache, DEFAULT_CACHE_PATH, DEFAULT_CACHE_SIZE_MB
+from scripts.dedup import configure_dedup, DEFAULT_DEDUP_PATH
+from scripts.counter import configure_counter, get_counter, DEFAULT_COUNTER_PATH
+from scripts.corpus_index import configure_index, DEFAULT_INDEX_PATH
+from scripts.cpu_pool import configure_cpu_pool, DEFAULT_CPU_QUEUE_SIZE
+from scripts.discovery import run_discovery, DISCOVERY_MODES, DEFAULT_CANDIDATES_PATH
+from scripts.metrics import (
+    start_http_server,
+    start_snapshot_writer,
+    write_snapshot,
+    print_profile,
+    LOG_LEVELS,
+    DEFAULT_LOG_LEVEL,
+    DEFAULT_SNAPSHOT_INTERVAL,
+)
 
+logger = logging.getLogger("main")
 
 
-def process_block_range(start_block, end_block, file_counter, lock):
+
+def process_block_range(start_block, end_block, pipeline, journal=None, source=None, verifier=None):
+    """
+    Scansiona i blocchi da start_block a end_block (all'indietro).
+    :return: None se l'esecuzione è stata fermata (quota o Ctrl+C), altrimenti
+             la lista dei blocchi non completati per un errore (vuota se tutto è andato bene)
+    """
     clientEth = EtherscanClient()
     clientWeb3 = Web3Client()
+    if source is None:
+        source = make_block_source("etherscan", clientEth, clientWeb3)
+    if verifier is None:
+        verifier = ReceiptVerifier()
+    range_start = start_block
+    failed_blocks = []
 
-    print(f"Scanning from block {start_block} to {end_block}")
-    while start_block >= end_block:
+    logger.debug(f"Scanning from block {start_block} to {end_block}")
+    for batch in iter_batches(start_block, end_block, source.batch_size):
+        if pipeline.quota.stopped.is_set():
+            return None
         try:
-            print("Scanning Block:", start_block)
-            # Aggiungi protezione con Lock per l'accesso sicuro
-            with lock:
-                transactions = clientEth.get_transactions_from_block(start_block)
-                try:
-                    for tx in transactions:
-                        if clientEth.isAContractDeployment(tx):
-                            id_transaction = tx["hash"]
-                            tx_receipt = clientEth.get_transaction_receipt(id_transaction)      
-                            contract_address = tx_receipt["contractAddress"]
-                            metadata = clientEth.get_contract_metadata(contract_address)
-
-                            proxy = metadata["Proxy"]
-                            source_code = metadata["SourceCode"]
-                            optimization = metadata["OptimizationUsed"]
-                            constructor_arguments = metadata["ConstructorArguments"]
-                            abi = metadata["ABI"]
-                            compiler_type = metadata["CompilerType"]
-                            
-                            creation_bytecode = tx["input"]
-                            compiler_version = metadata["CompilerVersion"]
-                            library = metadata["Library"]
-                            version_to_skip = "0_8"
-                            if (not skipVersion(version_to_skip, source_code)):
-                                
-                                runtime_bytecode = clientWeb3.get_bytecode(contract_address)
-
-                                if proxy == "1":
-                                    print(f"✗ Skipped {contract_address}: Proxy contract detected. Proxy:", {proxy})
-                                    continue
-                                if source_code.strip().startswith('{'):
-                                    print(f"✗ Skipped {contract_address}: Source code import external file or library.")
-                                    continue
-
-                                is_code_ok = check_source_and_byte(
-                                    source_code,
-                                    runtime_bytecode,
-                                    creation_bytecode,
-                                    contract_address)
-                                if is_code_ok:
-                                    are_versions_match = is_same_version(
-                                        source_code, 
-                                        compiler_version, 
-                                        contract_address)
-                                is_library_empty = isLibraryEmpty(
-                                    library, 
-                                    contract_address)
-                                is_abi_ok = isAbiAvailable(
-                                    abi, 
-                                    contract_address)
-                                
-                                if is_code_ok and are_versions_match and is_library_empty and is_abi_ok:
-                                    constructor_arguments_decoded = decode_constructor_args(abi, constructor_arguments)
-                                    # Salva il contratto
-                                    save(
-                                        contract_address,
-                                        source_code,
-                                        runtime_bytecode,
-                                        creation_bytecode,
-                                        compiler_version,
-                                        compiler_type,
-                                        optimization,
-                                        abi,
-                                        constructor_arguments,
-                                        constructor_arguments_decoded,
-                                        file_counter
-                                    )
-                            else:
-                                print(f"✗ Skipped version: {version_to_skip}") 
-                except Exception as e:
-                    print(f"An error occurred in transaction {tx['hash']}: {traceback.print_exc()}") 
+            logger.debug(f"Scanning Block: {' '.join(map(str, batch))}")
+            # Con la sorgente "node" blocchi e ricevute arrivano in due sole richieste batch
+            blocks = source.get_blocks(batch)
+            deployments = [
+                tx
+                for block_number in batch
+                for tx in blocks[block_number] or []
+                if clientEth.isAContractDeployment(tx)
+            ]
+            # Le ricevute servono solo per le transazioni scelte per la verifica:
+            # l'indirizzo del contratto si calcola da sender e nonce
+            receipts = source.get_transaction_receipts(
+                [tx["hash"] for tx in deployments if verifier.should_fetch(tx)]
+            )
+        except BudgetExhausted as e:
+            # Budget esaurito scaricando blocchi o ricevute: tutti i worker si fermano
+            pipeline.quota.stop(str(e))
+            return None
         except Exception as e:
-            print(f"An error occurred in block {start_block}: {e}\n{traceback.print_exc()}") 
+            logger.error(f"An error occurred in block {batch[0]}: {e}\n{traceback.format_exc()}")
+            failed_blocks.extend(batch)
+            continue
         except KeyboardInterrupt:
-            print("Process interrupted by user.")
+            logger.warning("Process interrupted by user.")
+            return None
+
+        for block_number in batch:
+            failed = False
+            try:
+                for tx in blocks[block_number] or []:
+                    if clientEth.isAContractDeployment(tx):
+                        contract_address = verifier.contract_address(tx, receipts.get(tx["hash"]))
+                        if is_already_saved(contract_address):
+                            logger.info(f"✗ Skipped {contract_address}: already saved.")
+                            continue
+                        candidate = Candidate(
+                            contract_address,
+                            tx,
+                            block_number,
+                            tx_receipt=receipts.get(tx["hash"])
+                        )
+                        # Filtri economici prima, eth_getCode e decodifica solo se superati
+                        pipeline.run(
+                            candidate,
+                            clientEth.get_contract_metadata,
+                            clientWeb3.get_bytecode,
+                            lambda tx_hash: source.get_transaction_receipts([tx_hash])[tx_hash]
+                        )
+            except BudgetExhausted as e:
+                # Ricevuta richiesta dalla pipeline: il blocco resta incompleto
+                pipeline.quota.stop(str(e))
+                return None
+            except Exception:
+                logger.error(f"An error occurred in transaction {tx['hash']}: {traceback.format_exc()}")
+                failed = True
+            except KeyboardInterrupt:
+                logger.warning("Process interrupted by user.")
+                return None
+            # Il blocco è completo solo se è stato scaricato e scansionato
+            # (con l'esecuzione fermata dalla quota alcuni deployment potrebbero mancare)
+            if pipeline.quota.stopped.is_set():
+                return None
+            # Un deployment fallito lascia il blocco in sospeso: --resume lo riprova
+            if failed:
+                failed_blocks.append(block_number)
+            elif journal is not None:
+                journal.mark_done(block_number, range_start, end_block)
+    return failed_blocks
+
+
+def process_chunks(block_queue, pipeline, journal=None, source=None, verifier=None):
+    # Il worker prende un nuovo chunk dalla coda condivisa appena finisce il precedente
+    worker = threading.current_thread().name
+    chunk = block_queue.next_chunk(worker)
+    while chunk is not None:
+        started = time.monotonic()
+        failed = process_block_range(chunk[0], chunk[1], pipeline, journal, source, verifier)
+        if failed is None:
+            # Esecuzione fermata: il chunk resta tra quelli incompleti
             break
-        start_block -= 1
-
-
-def parallel_process_blocks(start_block, end_block, num_threads):
-    # Crea un manager per un dizionario condiviso tra i thread
-    with Manager() as manager:
-        file_counter = manager.dict({
-            "0_4": 0,
-            "0_5": 0,   
-            "0_6": 0,
-            "0_7": 0,
-            "0_8": 0,
-        })
-        lock = Lock()  # Lock per sincronizzare l'accesso ai dati condivisi
-        
-        # Calcola la dimensione del sotto-intervallo per ogni thread
-        step = (start_block - end_block + 1) // num_threads
-        ranges = []
-        
-        # Crea i sotto-intervalli
-        for i in range(num_threads):
-            sub_start = start_block - i * step
-            sub_end = sub_start - step + 1
-            if i == num_threads - 1:
-                sub_end = end_block  # Assicurati che l'ultimo blocco arrivi a end_block
-            ranges.append((sub_start, sub_end))
-
-        # Usa ThreadPoolExecutor per eseguire i calcoli in parallelo
-        with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
-            futures = [
-                executor.submit(process_block_range, r[0], r[1], file_counter, lock) for r in ranges
-            ]
-            # Aspetta che tutti i task siano completi
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    future.result()
-                except Exception as e:
-                    print(f"An error occurred: {e}")
+        # Con blocchi falliti il chunk non è completo: il coordinatore lo riassegna
+        block_queue.chunk_done(chunk, worker, time.monotonic() - started, failed)
+        chunk = block_queue.next_chunk(worker)
+
+
+def parallel_process_blocks(ranges, num_threads, chunk_size=DEFAULT_CHUNK_SIZE, journal=None, source=None, verifier=None, max_calls=None, block_queue=None):
+    # Contatore condiviso tra i thread, in memoria (o su file con il coordinatore)
+    pipeline = ContractPipeline(get_counter(), max_calls)
+    # Coda condivisa di piccoli chunk al posto di intervalli fissi per thread
+    # (oppure i lease del coordinatore, condivisi con gli altri worker)
+    if block_queue is None:
+        block_queue = BlockQueue(ranges, chunk_size)
+
+    # Usa ThreadPoolExecutor per eseguire i calcoli in parallelo
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix="worker") as executor:
+        futures = [
+            executor.submit(process_chunks, block_queue, pipeline, journal, source, verifier) for _ in range(num_threads)
+        ]
+        # Aspetta che tutti i task siano completi
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"An error occurred: {e}")
+    block_queue.print_summary()
+    block_queue.close()
+    pipeline.print_summary()
 
 
 if __name__ == "__main__":
@@ -141,7 +183,7 @@ if __name__ == "__main__":
         type=int,
         help="Start block number (default: latest block)",
         required=False,
-        default=EtherscanClient().get_last_block()
+        default=None
     )
     parser.add_argument(
         "--end-block",
@@ -157,8 +199,390 @@ if __name__ == "__main__":
         default=1,
         required=False
     )
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "async"],
+        help="Execution engine: one thread per block range or a single asyncio event loop (default: threads)",
+        default="threads",
+        required=False
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        help="Maximum number of in-flight requests with --engine async (default: 10)",
+        default=10,
+        required=False
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        help=f"Number of blocks per work-queue chunk (default: {DEFAULT_CHUNK_SIZE})",
+        default=DEFAULT_CHUNK_SIZE,
+        required=False
+    )
+    parser.add_argument(
+        "--block-source",
+        choices=BLOCK_SOURCES,
+        help="Where blocks and receipts are fetched from: the Etherscan proxy or the node with JSON-RPC batches (default: etherscan)",
+        default="etherscan",
+        required=False
+    )
+    parser.add_argument(
+        "--rpc-batch-size",
+        type=int,
+        help=f"Number of blocks per JSON-RPC batch with --block-source node (default: {DEFAULT_RPC_BATCH_SIZE})",
+        default=DEFAULT_RPC_BATCH_SIZE,
+        required=False
+    )
+    parser.add_argument(
+        "--verify-receipts",
+        choices=VERIFY_MODES,
+        help="Fetch creation receipts to cross-check locally derived contract addresses: never, for a random sample or always (default: none)",
+        default="none",
+        required=False
+    )
+    parser.add_argument(
+        "--verify-sample-rate",
+        type=float,
+        help=f"Fraction of deployments verified with --verify-receipts sample (default: {DEFAULT_SAMPLE_RATE})",
+        default=DEFAULT_SAMPLE_RATE,
+        required=False
+    )
+    parser.add_argument(
+        "--metadata-store",
+        choices=BACKENDS,
+        help=f"Where contract metadata is saved: append-only logs.jsonl, indexed SQLite or the legacy logs.json (default: {DEFAULT_BACKEND})",
+        default=DEFAULT_BACKEND,
+        required=False
+    )
+    parser.add_argument(
+        "--output",
+        choices=SINKS,
+        help=f"How source and bytecode are written: three files per contract or size-bounded tar shards (default: {DEFAULT_SINK})",
+        default=DEFAULT_SINK,
+        required=False
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        help=f"Maximum shard size in MB for --output shards (default: {DEFAULT_SHARD_SIZE_MB})",
+        default=DEFAULT_SHARD_SIZE_MB,
+        required=False
+    )
+    parser.add_argument(
+        "--shard-compress",
+        action="store_true",
+        help="Write .tar.zst shards (requires the zstandard package)",
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const=DEFAULT_CACHE_PATH,
+        help=f"Cache immutable Etherscan and node responses in a SQLite file (default path: {DEFAULT_CACHE_PATH})",
+        default=None,
+        required=False
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        help=f"Maximum cache size in MB, least recently used entries are evicted (default: {DEFAULT_CACHE_SIZE_MB})",
+        default=DEFAULT_CACHE_SIZE_MB,
+        required=False
+    )
+    parser.add_argument(
+        "--cache-compress",
+        action="store_true",
+        help="Compress cached responses with zstd (requires the zstandard package)",
+    )
+    parser.add_argument(
+        "--cache-only",
+        action="store_true",
+        help="Offline mode: serve every request from the cache and never call the APIs. The latest block is never cached, so --start-block is required",
+    )
+    parser.add_argument(
+        "--dedup",
+        nargs="?",
+        const=DEFAULT_DEDUP_PATH,
+        help=f"Skip contracts whose runtime bytecode or source matches an already saved one, recording them as references (default path: {DEFAULT_DEDUP_PATH})",
+        default=None,
+        required=False
+    )
+    parser.add_argument(
+        "--index",
+        nargs="?",
+        const=DEFAULT_INDEX_PATH,
+        help=f"Index every saved contract by function selector, event topic, pragma, compiler and optimization (default path: {DEFAULT_INDEX_PATH})",
+        default=None,
+        required=False
+    )
+    parser.add_argument(
+        "--cpu-workers",
+        type=int,
+        help="Processes for ABI parsing and constructor decoding; 0 runs them on the I/O threads (default: 0)",
+        default=0,
+        required=False
+    )
+    parser.add_argument(
+        "--cpu-queue-size",
+        type=int,
+        help=f"Maximum CPU tasks in flight on --cpu-workers before the I/O threads wait (default: {DEFAULT_CPU_QUEUE_SIZE})",
+        default=DEFAULT_CPU_QUEUE_SIZE,
+        required=False
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=LOG_LEVELS,
+        help=f"Per-block and per-contract messages are printed at debug and info level (default: {DEFAULT_LOG_LEVEL})",
+        default=DEFAULT_LOG_LEVEL,
+        required=False
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics (and /metrics.json)",
+        default=None,
+        required=False
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help=f"Write a JSON snapshot of the metrics to this file every {DEFAULT_SNAPSHOT_INTERVAL} seconds",
+        default=None,
+        required=False
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print wall and CPU time per pipeline stage, CPU task and API endpoint at exit",
+    )
+    parser.add_argument(
+        "--max-calls",
+        type=int,
+        help="Stop after this many Etherscan calls; unfinished blocks can be continued with --resume",
+        default=None,
+        required=False
+    )
+    parser.add_argument(
+        "--discovery",
+        choices=DISCOVERY_MODES,
+        help="Build the set of deployments first (batched node scan or imported list), then query Etherscan only for those",
+        default=None,
+        required=False
+    )
+    parser.add_argument(
+        "--candidates-file",
+        help="CSV or Parquet list of deployments (contract_address, block_number, tx_hash[, input]) for --discovery import",
+        default=None,
+        required=False
+    )
+    parser.add_argument(
+        "--candidates-db",
+        help=f"Path of the candidate set used by --discovery (default: {DEFAULT_CANDIDATES_PATH})",
+        default=DEFAULT_CANDIDATES_PATH,
+        required=False
+    )
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="Keep mining new blocks forward from --start-block as they are produced, instead of scanning backwards",
+    )
+    parser.add_argument(
+        "--confirmations",
+        type=int,
+        help=f"With --follow, only scan blocks this many blocks below the head, to stay clear of reorgs (default: {DEFAULT_CONFIRMATIONS})",
+        default=DEFAULT_CONFIRMATIONS,
+        required=False
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        help=f"With --follow, seconds between eth_blockNumber polls once caught up (default: {DEFAULT_POLL_INTERVAL})",
+        default=DEFAULT_POLL_INTERVAL,
+        required=False
+    )
+    parser.add_argument(
+        "--coordinator",
+        help="Take block chunks as leases from a shared coordinator: the path of its SQLite lease table or its http:// URL (see python -m scripts.coordinator)",
+        default=None,
+        required=False
+    )
+    parser.add_argument(
+        "--worker-id",
+        help="Name of this worker for the coordinator and for WORKER_KEYS in config.py (default: hostname-pid)",
+        default=None,
+        required=False
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=int,
+        help=f"Lease duration; chunks of a worker that stops renewing are re-issued after it (default: {DEFAULT_LEASE_SECONDS})",
+        default=DEFAULT_LEASE_SECONDS,
+        required=False
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip the blocks the progress journal already records as completed",
+    )
+    parser.add_argument(
+        "--journal",
+        help=f"Path of the progress journal (default: {DEFAULT_JOURNAL_PATH})",
+        default=DEFAULT_JOURNAL_PATH,
+        required=False
+    )
 
     args = parser.parse_args()
 
-    # Avvia l'esecuzione parallela
-    parallel_process_blocks(args.start_block, args.end_block, num_threads=args.threads)
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+    # API key e nodi del worker: ogni key Etherscan ha il proprio rate limit
+    etherscan_keys, node_urls = configure_pools(args.worker_id)
+    logger.info(f"Using {len(etherscan_keys)} Etherscan API keys and {len(node_urls)} node endpoints")
+    # La testa della catena si chiede solo se serve: con il coordinatore i blocchi
+    # arrivano dai lease, --follow la legge dalla propria sorgente, l'import dei
+    # candidati non scansiona blocchi
+    if args.cache_only and args.follow:
+        parser.error("--follow needs the chain head and cannot run with --cache-only")
+    scans_blocks = args.coordinator is None and not args.follow and args.discovery != "import"
+    if args.start_block is None and scans_blocks:
+        if args.cache_only:
+            parser.error("--cache-only requires --start-block: the latest block is never cached")
+        args.start_block = EtherscanClient().get_last_block()
+    if args.metrics_port is not None:
+        start_http_server(args.metrics_port)
+    snapshot_writer = start_snapshot_writer(args.metrics_file) if args.metrics_file else None
+    configure_store(args.metadata_store)
+    if args.coordinator is not None and args.worker_id is None:
+        args.worker_id = default_worker_id()
+    # I worker del coordinatore condividono COUNTER_LIMIT tramite un file accanto all'output
+    counter = configure_counter(DEFAULT_COUNTER_PATH if args.coordinator is not None else None)
+    configure_sink(args.output, shard_size_mb=args.shard_size, compress=args.shard_compress, writer_id=args.worker_id)
+    cache = None
+    if args.cache or args.cache_only:
+        cache = configure_cache(args.cache or DEFAULT_CACHE_PATH, args.cache_size, args.cache_compress, args.cache_only)
+    # Va attivata prima di creare le pipeline, che la leggono nel costruttore
+    dedup = configure_dedup(args.dedup) if args.dedup else None
+    index = configure_index(args.index) if args.index else None
+    cpu_pool = configure_cpu_pool(args.cpu_workers, args.cpu_queue_size)
+    journal = ProgressJournal(args.journal)
+    # In modalità discovery i blocchi scansionati sono registrati insieme ai candidati,
+    # con il coordinatore i chunk arrivano dalla tabella dei lease
+    ranges = None
+    block_queue = None
+    if args.coordinator is not None:
+        if args.discovery is not None or args.follow:
+            parser.error("--coordinator cannot be combined with --discovery or --follow")
+        block_queue = LeaseQueue(open_leases(args.coordinator), args.worker_id, args.lease_seconds)
+    elif args.follow:
+        if args.engine == "async":
+            parser.error("--follow requires --engine threads")
+        if args.discovery is not None:
+            parser.error("--follow cannot be combined with --discovery")
+    elif args.discovery is None:
+        ranges = plan_ranges(journal, args.start_block, args.end_block, args.resume)
+    verifier = ReceiptVerifier(args.verify_receipts, args.verify_sample_rate)
+    # Limite rigido nello scheduler; la pipeline smette già prima di chiedere altri metadati
+    set_call_budget(args.max_calls)
+
+    try:
+        if args.discovery is not None:
+            if args.discovery == "import" and args.candidates_file is None:
+                parser.error("--discovery import requires --candidates-file")
+            configure_pool(args.threads)
+            pipeline = ContractPipeline(get_counter(), args.max_calls)
+            run_discovery(
+                args.discovery,
+                pipeline,
+                args.start_block,
+                args.end_block,
+                num_threads=args.threads,
+                chunk_size=args.chunk_size,
+                rpc_batch_size=args.rpc_batch_size,
+                candidates_file=args.candidates_file,
+                candidates_path=args.candidates_db,
+                resume=args.resume
+            )
+            pipeline.print_summary()
+        elif args.follow:
+            # I contratti non ancora verificati tornano in coda e vengono ricontrollati più tardi
+            state = FollowState(DEFAULT_FOLLOW_PATH)
+            retries = RetryQueue(DEFAULT_FOLLOW_PATH)
+            pipeline = ContractPipeline(get_counter(), args.max_calls, retries, state)
+            clientEth, clientWeb3 = EtherscanClient(), Web3Client()
+            source = make_block_source(args.block_source, clientEth, clientWeb3, args.rpc_batch_size)
+            run_follow(
+                pipeline,
+                lambda start, end: process_block_range(start, end, pipeline, journal, source, verifier),
+                ChainHead(args.block_source, clientEth, clientWeb3),
+                state,
+                retries,
+                clientEth,
+                clientWeb3,
+                source,
+                start_block=args.start_block,
+                confirmations=args.confirmations,
+                poll_interval=args.poll_interval,
+                step=args.chunk_size
+            )
+            state.close()
+            retries.close()
+            pipeline.print_summary()
+        elif args.engine == "async":
+            # Import differito: aiohttp serve solo a questo motore
+            from scripts.async_engine import run_async_engine
+            run_async_engine(
+                ranges,
+                window=args.window,
+                chunk_size=args.chunk_size,
+                journal=journal,
+                block_source=args.block_source,
+                rpc_batch_size=args.rpc_batch_size,
+                verifier=verifier,
+                max_calls=args.max_calls,
+                block_queue=block_queue
+            )
+        else:
+            # Un pool di connessioni keep-alive per host, dimensionato sui worker
+            configure_pool(args.threads)
+            source = make_block_source(args.block_source, EtherscanClient(), Web3Client(), args.rpc_batch_size)
+            # Avvia l'esecuzione parallela
+            parallel_process_blocks(
+                ranges,
+                num_threads=args.threads,
+                chunk_size=args.chunk_size,
+                journal=journal,
+                source=source,
+                verifier=verifier,
+                max_calls=args.max_calls,
+                block_queue=block_queue
+            )
+    finally:
+        # Anche con un errore o Ctrl+C i contratti ancora in coda vanno scritti negli shard
+        journal.close()
+        close_sink()
+
+    # Riepilogo degli scheduler delle richieste Etherscan, sommati sulle API key
+    stats = total_stats()
+    print(
+        f"Etherscan requests issued: {stats['requests issued']} with {stats['api keys']} API keys, "
+        f"tokens waited: {stats['tokens waited']} ({stats['wait time']:.1f}s), "
+        f"throttle responses: {stats['throttle responses']}"
+    )
+    if cache is not None:
+        stats = cache.stats()
+        print(
+            f"Response cache hits: {stats['hits']}, misses: {stats['misses']}, "
+            f"stored: {stats['stored']}, evicted: {stats['evicted']}, size: {stats['bytes'] / 1024 / 1024:.1f} MB"
+        )
+        cache.close()
+    if dedup is not None:
+        dedup.close()
+    if index is not None:
+        index.close()
+    counter.close()
+    cpu_pool.print_summary()
+    cpu_pool.close()
+    if args.profile:
+        print_profile()
+    if snapshot_writer is not None:
+        # L'ultimo snapshot contiene i totali dell'intera esecuzione
+        snapshot_writer.set()
+        write_snapshot(args.metrics_file)
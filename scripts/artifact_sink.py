@@ -0,0 +1,391 @@
+import argparse
+import concurrent.futures
+import glob
+import io
+import logging
+import mmap
+import os
+import queue
+import tarfile
+import threading
+import time
+
+CONTRACTS_DIR = "contracts"
+SINKS = ("files", "shards")
+DEFAULT_SINK = "files"
+DEFAULT_SHARD_SIZE_MB = 256
+# Contratti scritti dal writer prima di ogni flush
+DEFAULT_FLUSH_BATCH = 100
+
+logger = logging.getLogger(__name__)
+
+# Nome del membro nello shard -> (cartella, estensione) nel layout a directory
+ARTIFACTS = {
+    "source.sol": ("sourcecode", ".sol"),
+    "runtime.hex": ("runtime_bytecode", ".hex"),
+    "creation.hex": ("creation_bytecode", ".hex"),
+}
+
+
+class FileSink:
+    """
+    Layout storico: tre file per contratto in contracts/<versione>/{sourcecode,
+    runtime_bytecode,creation_bytecode}. Le cartelle sono create una volta
+    per versione.
+    """
+    def __init__(self, root=CONTRACTS_DIR):
+        self.root = root
+        self.created = set()
+        # Controllo dei file esistenti e scrittura atomici tra i worker
+        self.lock = threading.Lock()
+
+    def _path(self, version_folder, contract_address, member):
+        folder, extension = ARTIFACTS[member]
+        return f"{self.root}/{version_folder}/{folder}/{contract_address}{extension}"
+
+    def write(self, version_folder, contract_address, source_code, runtime_bytecode, creation_bytecode):
+        """
+        :return: False se i file del contratto esistono già
+        """
+        contents = dict(zip(ARTIFACTS, (source_code, runtime_bytecode, creation_bytecode)))
+        with self.lock:
+            if any(os.path.exists(self._path(version_folder, contract_address, member)) for member in ARTIFACTS):
+                return False
+            if version_folder not in self.created:
+                for folder, _ in ARTIFACTS.values():
+                    os.makedirs(f"{self.root}/{version_folder}/{folder}", exist_ok=True)
+                self.created.add(version_folder)
+            for member, content in contents.items():
+                with open(self._path(version_folder, contract_address, member), "w") as file:
+                    file.write(content)
+        return True
+
+    def saved_addresses(self):
+        if not os.path.isdir(self.root):
+            return
+        for version_folder in os.listdir(self.root):
+            source_dir = f"{self.root}/{version_folder}/sourcecode"
+            if os.path.isdir(source_dir):
+                for name in os.listdir(source_dir):
+                    if name.endswith(".sol"):
+                        yield name[:-len(".sol")]
+
+    def close(self):
+        pass
+
+
+def list_shards(root=CONTRACTS_DIR, version_folder="*"):
+    return sorted(glob.glob(f"{root}/{version_folder}/shards/shard-*.tar*"))
+
+
+def _shard_index(path):
+    # shard-00012.tar, shard-00012-worker-a.tar.zst -> 12
+    return int(os.path.basename(path)[len("shard-"):len("shard-") + 5])
+
+
+def iter_shard(path):
+    """
+    Legge uno shard in streaming, compresso o no.
+    Uno shard troncato da un'interruzione è letto fino all'ultimo contratto completo.
+    :return: Generatore di (indirizzo, {"source.sol": ..., "runtime.hex": ..., "creation.hex": ...})
+    """
+    truncated = (tarfile.ReadError, EOFError)
+    with open(path, "rb") as raw:
+        stream = raw
+        if path.endswith(".zst"):
+            # Import differito: zstandard serve solo per gli shard compressi
+            import zstandard
+            stream = zstandard.ZstdDecompressor().stream_reader(raw)
+            truncated += (zstandard.ZstdError,)
+        address, contents = None, {}
+        try:
+            with tarfile.open(fileobj=stream, mode="r|") as tar:
+                for member in tar:
+                    member_address, name = member.name.split("/", 1)
+                    if member_address != address:
+                        if len(contents) == len(ARTIFACTS):
+                            yield address, contents
+                        address, contents = member_address, {}
+                    contents[name] = tar.extractfile(member).read().decode()
+        except truncated as e:
+            logger.warning(f"Shard {path} is truncated, read up to the last complete contract: {e}")
+        if len(contents) == len(ARTIFACTS):
+            yield address, contents
+
+
+class ShardReader:
+    """
+    Accesso casuale a uno shard non compresso tramite memory map: i
+    contenuti sono letti dal page cache senza copiare l'intero file.
+    :param path: Percorso di uno shard .tar
+    """
+    def __init__(self, path):
+        if path.endswith(".zst"):
+            raise ValueError(f"{path} is compressed: use iter_shard() to read it")
+        self.offsets = {}
+        try:
+            with tarfile.open(path, "r") as tar:
+                for member in tar:
+                    self.offsets[member.name] = (member.offset_data, member.size)
+        except (tarfile.ReadError, EOFError):
+            pass
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def addresses(self):
+        return sorted({name.split("/", 1)[0] for name in self.offsets})
+
+    def read(self, contract_address, member):
+        """
+        :param member: "source.sol", "runtime.hex" oppure "creation.hex"
+        :return: Contenuto come memoryview, senza copia
+        """
+        offset, size = self.offsets[f"{contract_address}/{member}"]
+        return memoryview(self.map)[offset:offset + size]
+
+    def __iter__(self):
+        for address in self.addresses():
+            yield address, {member: bytes(self.read(address, member)).decode() for member in ARTIFACTS}
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class _Shard:
+    def __init__(self, path, compress):
+        self.path = path
+        # "xb": uno shard esistente non viene mai troncato
+        self.raw = open(path, "xb")
+        self.stream = None
+        if compress:
+            import zstandard
+            self.stream = zstandard.ZstdCompressor().stream_writer(self.raw)
+            self.tar = tarfile.open(fileobj=self.stream, mode="w|")
+        else:
+            self.tar = tarfile.open(fileobj=self.raw, mode="w")
+
+    def add(self, contract_address, contents):
+        now = int(time.time())
+        for member, content in contents.items():
+            data = content.encode()
+            info = tarfile.TarInfo(f"{contract_address}/{member}")
+            info.size = len(data)
+            info.mtime = now
+            self.tar.addfile(info, io.BytesIO(data))
+
+    def flush(self):
+        if self.stream is not None:
+            import zstandard
+            self.stream.flush(zstandard.FLUSH_BLOCK)
+        self.raw.flush()
+
+    def size(self):
+        return self.raw.tell()
+
+    def close(self):
+        self.tar.close()
+        if self.stream is not None:
+            self.stream.close()
+        if not self.raw.closed:
+            self.raw.close()
+
+
+class ShardSink:
+    """
+    Scrive i contratti in archivi tar (opzionalmente .tar.zst) di dimensione
+    limitata, contracts/<versione>/shards/shard-NNNNN.tar, al posto di tre file
+    per contratto. Un solo thread in background scrive e fa il flush a lotti:
+    write accoda il contratto e ritorna dopo il flush del lotto che lo contiene,
+    così i worker che salvano in parallelo condividono lo stesso flush.
+    Gli indirizzi già salvati sono letti dagli shard una sola volta, all'apertura.
+    :param max_bytes: Dimensione oltre la quale lo shard viene chiuso
+    :param compress: Comprime gli shard con zstd (richiede il pacchetto zstandard)
+    :param flush_batch: Contratti scritti al massimo tra due flush
+    :param writer_id: Suffisso dei nomi degli shard, per più processi che scrivono nella stessa cartella
+    """
+    def __init__(self, root=CONTRACTS_DIR, max_bytes=DEFAULT_SHARD_SIZE_MB * 1024 * 1024, compress=False,
+                 flush_batch=DEFAULT_FLUSH_BATCH, writer_id=None):
+        self.root = root
+        self.writer_id = writer_id
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.flush_batch = flush_batch
+        self.shards = {}
+        self.lock = threading.Lock()
+        self.addresses = {address for path in list_shards(root) for address, _ in iter_shard(path)}
+        # Errore del writer, rilanciato ai worker alla prossima write o alla close
+        self.error = None
+        # Coda limitata: se il disco non tiene il passo i worker aspettano
+        self.queue = queue.Queue(maxsize=flush_batch * 4)
+        self.writer = threading.Thread(target=self._write_loop, name="shard-writer", daemon=True)
+        self.writer.start()
+
+    def _check(self):
+        if self.error is not None:
+            raise RuntimeError(f"Shard writer failed: {self.error}") from self.error
+        if not self.writer.is_alive():
+            raise RuntimeError("Shard writer is not running")
+
+    def write(self, version_folder, contract_address, source_code, runtime_bytecode, creation_bytecode):
+        """
+        :return: False se il contratto è già in uno shard, True quando è stato scritto su disco
+        """
+        self._check()
+        with self.lock:
+            if contract_address in self.addresses:
+                return False
+            self.addresses.add(contract_address)
+        contents = dict(zip(ARTIFACTS, (source_code, runtime_bytecode, creation_bytecode)))
+        written = concurrent.futures.Future()
+        self.queue.put((version_folder, contract_address, contents, written))
+        try:
+            # Conferma del writer dopo il flush, oppure il suo errore
+            written.result()
+        except Exception:
+            with self.lock:
+                self.addresses.discard(contract_address)
+            raise
+        return True
+
+    def _write_loop(self):
+        stop = False
+        while not stop:
+            batch = [self.queue.get()]
+            # Raccoglie quanto è già in coda, fino a flush_batch contratti
+            while len(batch) < self.flush_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stop = True
+                batch = [item for item in batch if item is not None]
+            try:
+                if self.error is not None:
+                    raise self.error
+                self._write_batch(batch)
+            except Exception as e:
+                # Il writer continua a svuotare la coda, così i worker non restano bloccati su put
+                if self.error is None:
+                    logger.error(f"An error occurred while writing shards: {e}")
+                    self.error = e
+                for *_, written in batch:
+                    written.set_exception(RuntimeError(f"Shard writer failed: {e}"))
+                continue
+            for *_, written in batch:
+                written.set_result(True)
+
+    def _write_batch(self, batch):
+        touched = set()
+        for version_folder, contract_address, contents, _ in batch:
+            self._shard(version_folder).add(contract_address, contents)
+            touched.add(version_folder)
+        for version_folder in touched:
+            shard = self.shards[version_folder]
+            shard.flush()
+            if shard.size() >= self.max_bytes:
+                shard.close()
+                del self.shards[version_folder]
+
+    def _shard(self, version_folder):
+        if version_folder not in self.shards:
+            os.makedirs(f"{self.root}/{version_folder}/shards", exist_ok=True)
+            # Uno shard nuovo a ogni esecuzione: quelli esistenti non vengono riaperti.
+            # Il massimo e non il numero degli shard, che possono essere stati spostati
+            index = max((_shard_index(path) for path in list_shards(self.root, version_folder)), default=0) + 1
+            extension = ".tar.zst" if self.compress else ".tar"
+            suffix = f"-{self.writer_id}" if self.writer_id else ""
+            path = f"{self.root}/{version_folder}/shards/shard-{index:05d}{suffix}{extension}"
+            self.shards[version_folder] = _Shard(path, self.compress)
+        return self.shards[version_folder]
+
+    def saved_addresses(self):
+        with self.lock:
+            return list(self.addresses)
+
+    def close(self):
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+        for shard in self.shards.values():
+            shard.close()
+        self.shards = {}
+        if self.error is not None:
+            raise RuntimeError(f"Shard writer failed: {self.error}") from self.error
+
+
+def open_sink(sink=DEFAULT_SINK, root=CONTRACTS_DIR, shard_size_mb=DEFAULT_SHARD_SIZE_MB, compress=False, writer_id=None):
+    if sink == "files":
+        return FileSink(root)
+    if sink == "shards":
+        return ShardSink(root, shard_size_mb * 1024 * 1024, compress, writer_id=writer_id)
+    raise ValueError(f"Unknown output format: {sink}")
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def configure_sink(sink=DEFAULT_SINK, root=CONTRACTS_DIR, shard_size_mb=DEFAULT_SHARD_SIZE_MB, compress=False, writer_id=None):
+    """
+    Sceglie dove dispatcher.save scrive sorgente e bytecode.
+    :param sink: "files" (tre file per contratto) oppure "shards"
+    :param writer_id: Identificativo del worker, nei nomi degli shard
+    """
+    global _sink
+    with _sink_lock:
+        if _sink is not None:
+            _sink.close()
+        _sink = open_sink(sink, root, shard_size_mb, compress, writer_id)
+        return _sink
+
+
+def get_sink():
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = open_sink(DEFAULT_SINK)
+        return _sink
+
+
+def close_sink():
+    # Gli shard vanno chiusi a fine esecuzione per scrivere i contratti ancora in coda
+    global _sink
+    with _sink_lock:
+        if _sink is not None:
+            _sink.close()
+            _sink = None
+
+
+def extract_shards(root=CONTRACTS_DIR, version_folder="*"):
+    """
+    Ricrea il layout a directory a partire dagli shard.
+    :return: Numero di contratti estratti
+    """
+    sink = FileSink(root)
+    extracted = 0
+    for path in list_shards(root, version_folder):
+        folder = os.path.basename(os.path.dirname(os.path.dirname(path)))
+        for address, contents in iter_shard(path):
+            if sink.write(folder, address, *(contents[member] for member in ARTIFACTS)):
+                extracted += 1
+        print(f"✓ Extracted {path}")
+    return extracted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read contract shards.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    list_parser = subparsers.add_parser("list", help="Print the contracts stored in each shard")
+    list_parser.add_argument("--root", default=CONTRACTS_DIR)
+    extract_parser = subparsers.add_parser("extract", help="Write the shards back as contracts/<version>/{sourcecode,runtime_bytecode,creation_bytecode}")
+    extract_parser.add_argument("--root", default=CONTRACTS_DIR)
+    extract_parser.add_argument("--version", default="*", help="Version folder to extract, e.g. 0_5 (default: all)")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for path in list_shards(args.root):
+            print(f"{path}: {sum(1 for _ in iter_shard(path))} contracts")
+    elif args.command == "extract":
+        print(f"Extracted {extract_shards(args.root, args.version)} contracts")
@@ -0,0 +1,338 @@
+import asyncio
+import logging
+import time
+import traceback
+import aiohttp
+from config import ETHERSCAN_API_URL
+from scripts.key_pool import etherscan_pool, node_pool
+from scripts.client_etherscan import get_scheduler, is_throttle_response, EtherscanError, BudgetExhausted
+from scripts.http_session import backoff_delay, MAX_RETRIES, RETRY_STATUS
+from scripts.dispatcher import is_already_saved
+from scripts.pipeline import ContractPipeline, Candidate
+from scripts.counter import get_counter
+from scripts.work_queue import BlockQueue, DEFAULT_CHUNK_SIZE
+from scripts.block_source import iter_batches, DEFAULT_RPC_BATCH_SIZE
+from scripts.contract_address import ReceiptVerifier, is_empty_bytecode
+from scripts.response_cache import lookup, store, MISS
+from scripts.metrics import inc, observe_call, rpc_endpoint
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncEtherscanClient:
+    """
+    Versione asyncio di EtherscanClient: stesse API key, stessi token bucket
+    (e quindi stesso budget di chiamate al secondo) del client sincrono.
+    :param session: aiohttp.ClientSession condivisa
+    :param window: Semaforo che limita le richieste in volo
+    """
+    def __init__(self, session, window, api_key=None):
+        self.api_key = api_key
+        self.session = session
+        self.window = window
+
+    async def _make_request(self, module, action, params):
+        cached = lookup(module, action, params)
+        if cached is not MISS:
+            return cached
+        api_key = self.api_key or etherscan_pool().next()
+        scheduler = get_scheduler(api_key)
+        payload = {
+            "module": module,
+            "action": action,
+            "apikey": api_key,
+            **params
+        }
+        for attempt in range(MAX_RETRIES + 1):
+            await asyncio.sleep(scheduler.reserve())
+            async with self.window:
+                started = time.monotonic()
+                async with self.session.get(ETHERSCAN_API_URL, params=payload) as response:
+                    observe_call("etherscan", action, time.monotonic() - started)
+                    if response.status == 429:
+                        scheduler.record_throttle()
+                        inc("miner_throttle_total", service="etherscan", endpoint=action)
+                    elif response.status not in RETRY_STATUS:
+                        response.raise_for_status()
+                        result = await response.json(content_type=None)
+                        if not is_throttle_response(result):
+                            store(module, action, params, result)
+                            return result
+                        scheduler.record_throttle()
+                        inc("miner_throttle_total", service="etherscan", endpoint=action)
+            if attempt < MAX_RETRIES:
+                inc("miner_retries_total", service="etherscan", endpoint=action)
+                await asyncio.sleep(backoff_delay(attempt))
+        raise EtherscanError(f"{module}/{action}: request still failing after {MAX_RETRIES} retries")
+
+    async def get_contract_metadata(self, address):
+        result = await self._make_request("contract", "getsourcecode", {"address": address})
+        if result.get("status") == "1":
+            return result["result"][0]
+        return None
+
+    async def get_transactions_from_block(self, block_number):
+        result = await self._make_request("proxy", "eth_getBlockByNumber", {"tag": hex(block_number), "boolean": "true"})
+        if result["result"]["transactions"] != []:
+            return result["result"]["transactions"]
+        else:
+            logger.debug(f"get_transactions_from_block: No transactions found in block {block_number}")
+            return None
+
+    async def get_transaction_receipt(self, tx_hash):
+        result = await self._make_request("proxy", "eth_getTransactionReceipt", {"txhash": tx_hash})
+        if result["result"] is not None:
+            return result["result"]
+        else:
+            logger.warning(f"get_transaction_receipt: Transaction not found {tx_hash}")
+            return None
+
+
+class AsyncWeb3Client:
+    """
+    Chiamate JSON-RPC dirette al nodo sulla sessione aiohttp condivisa.
+    :param session: aiohttp.ClientSession condivisa
+    :param window: Semaforo che limita le richieste in volo
+    """
+    def __init__(self, session, window, url=None):
+        self.url = url
+        self.session = session
+        self.window = window
+
+    async def _post(self, payload, endpoint):
+        for attempt in range(MAX_RETRIES + 1):
+            async with self.window:
+                started = time.monotonic()
+                async with self.session.post(self.url or node_pool().next(), json=payload) as response:
+                    observe_call("node", endpoint, time.monotonic() - started)
+                    if response.status not in RETRY_STATUS:
+                        response.raise_for_status()
+                        return await response.json(content_type=None)
+            if attempt < MAX_RETRIES:
+                inc("miner_retries_total", service="node", endpoint=endpoint)
+                await asyncio.sleep(backoff_delay(attempt))
+        raise RuntimeError(f"JSON-RPC request still failing after {MAX_RETRIES} retries")
+
+    async def _call(self, method, params):
+        result = await self._post({"jsonrpc": "2.0", "method": method, "params": params, "id": 1}, method)
+        if "error" in result:
+            raise RuntimeError(f"{method}: {result['error']}")
+        return result["result"]
+
+    async def _batch(self, calls):
+        # Stessa logica di Web3Client._batch: in rete solo le chiamate non in cache
+        results = [lookup("rpc", method, params) for method, params in calls]
+        missing = [i for i, result in enumerate(results) if result is MISS]
+        if missing:
+            fetched = await self._send_batch([calls[i] for i in missing])
+            for i, result in zip(missing, fetched):
+                results[i] = result
+                store("rpc", calls[i][0], calls[i][1], result)
+        return results
+
+    async def _send_batch(self, calls):
+        results = await self._post([
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(calls)
+        ], rpc_endpoint(calls))
+        if isinstance(results, dict):
+            raise RuntimeError(f"JSON-RPC batch rejected: {results.get('error')}")
+        by_id = {result.get("id"): result for result in results}
+        ordered = []
+        for i, (method, _) in enumerate(calls):
+            result = by_id.get(i)
+            if result is None or "error" in result:
+                raise RuntimeError(f"{method}: {result.get('error') if result else 'missing response'}")
+            ordered.append(result["result"])
+        return ordered
+
+    async def get_bytecode(self, address):
+        #runtime bytecode
+        params = [address.lower(), "latest"]
+        cached = lookup("rpc", "eth_getCode", params)
+        if cached is not MISS:
+            return cached
+        bytecode = await self._call("eth_getCode", params)
+        store("rpc", "eth_getCode", params, bytecode)
+        return bytecode
+
+    async def get_blocks(self, block_numbers):
+        blocks = await self._batch([("eth_getBlockByNumber", [hex(n), True]) for n in block_numbers])
+        return {
+            n: (block["transactions"] if block is not None else None)
+            for n, block in zip(block_numbers, blocks)
+        }
+
+    async def get_transaction_receipts(self, tx_hashes):
+        receipts = await self._batch([("eth_getTransactionReceipt", [h]) for h in tx_hashes])
+        return dict(zip(tx_hashes, receipts))
+
+
+class AsyncEtherscanBlockSource:
+    # Equivalente asyncio di block_source.EtherscanBlockSource
+    batch_size = 1
+
+    def __init__(self, clientEth):
+        self.clientEth = clientEth
+
+    async def get_blocks(self, block_numbers):
+        transactions = await asyncio.gather(
+            *(self.clientEth.get_transactions_from_block(n) for n in block_numbers)
+        )
+        return dict(zip(block_numbers, transactions))
+
+    async def get_transaction_receipts(self, tx_hashes):
+        receipts = await asyncio.gather(*(self.clientEth.get_transaction_receipt(h) for h in tx_hashes))
+        return dict(zip(tx_hashes, receipts))
+
+
+class AsyncNodeBlockSource:
+    # Equivalente asyncio di block_source.NodeBlockSource
+    def __init__(self, clientWeb3, batch_size=DEFAULT_RPC_BATCH_SIZE):
+        self.clientWeb3 = clientWeb3
+        self.batch_size = batch_size
+
+    async def get_blocks(self, block_numbers):
+        return await self.clientWeb3.get_blocks(block_numbers)
+
+    async def get_transaction_receipts(self, tx_hashes):
+        return await self.clientWeb3.get_transaction_receipts(tx_hashes)
+
+
+async def process_deployment(clientEth, clientWeb3, source, verifier, pipeline, tx, tx_receipt):
+    contract_address = verifier.contract_address(tx, tx_receipt)
+    if is_already_saved(contract_address):
+        logger.info(f"✗ Skipped {contract_address}: already saved.")
+        return
+    candidate = Candidate(contract_address, tx, int(tx["blockNumber"], 16), tx_receipt=tx_receipt)
+
+    # Stessi stadi di ContractPipeline.run, con l'I/O in attesa sull'event loop
+    loop = asyncio.get_running_loop()
+    if not pipeline.quota.check():
+        return
+    if pipeline.dedup is not None:
+        candidate.runtime_bytecode = await clientWeb3.get_bytecode(contract_address)
+        if not pipeline.deduplicate(candidate):
+            return
+    try:
+        candidate.set_metadata(await clientEth.get_contract_metadata(contract_address))
+    except BudgetExhausted as e:
+        pipeline.quota.stop(str(e))
+        return
+    # I filtri possono attendere il pool CPU: fuori dall'event loop
+    if not await loop.run_in_executor(None, pipeline.prefilter, candidate):
+        return
+    if candidate.runtime_bytecode is None:
+        candidate.runtime_bytecode = await clientWeb3.get_bytecode(contract_address)
+    if is_empty_bytecode(candidate.runtime_bytecode) and candidate.tx_receipt is None:
+        # Nessun codice all'indirizzo: il deployment potrebbe essere fallito
+        candidate.tx_receipt = (await source.get_transaction_receipts([tx["hash"]]))[tx["hash"]]
+    # Validazione e salvataggio (I/O su disco, decode ABI) fuori dall'event loop
+    await loop.run_in_executor(None, pipeline.finish, candidate)
+
+
+async def process_batch(clientEth, clientWeb3, source, verifier, pipeline, batch, journal=None):
+    """
+    :return: None se l'esecuzione è stata fermata dalla quota prima di completare il batch,
+             altrimenti la lista dei blocchi non completati per un errore
+    """
+    if pipeline.quota.stopped.is_set():
+        return None
+    logger.debug(f"Scanning Block: {' '.join(map(str, batch))}")
+    try:
+        blocks = await source.get_blocks(batch)
+        deployments = [
+            tx
+            for block_number in batch
+            for tx in blocks[block_number] or []
+            if tx["to"] is None
+        ]
+        receipts = await source.get_transaction_receipts(
+            [tx["hash"] for tx in deployments if verifier.should_fetch(tx)]
+        )
+    except BudgetExhausted as e:
+        # Budget esaurito scaricando blocchi o ricevute: tutti i worker si fermano
+        pipeline.quota.stop(str(e))
+        return None
+    except Exception as e:
+        logger.error(f"An error occurred in block {batch[0]}: {e}\n{traceback.format_exc()}")
+        return list(batch)
+    results = await asyncio.gather(
+        *(process_deployment(clientEth, clientWeb3, source, verifier, pipeline, tx, receipts.get(tx["hash"])) for tx in deployments),
+        return_exceptions=True
+    )
+    failed = set()
+    for tx, result in zip(deployments, results):
+        if isinstance(result, BudgetExhausted):
+            pipeline.quota.stop(str(result))
+        elif isinstance(result, Exception):
+            logger.error(f"An error occurred in transaction {tx['hash']}: {result!r}")
+            failed.add(int(tx["blockNumber"], 16))
+    # I blocchi sono completi solo se sono stati scaricati e scansionati
+    if pipeline.quota.stopped.is_set():
+        return None
+    if journal is not None:
+        # Un deployment fallito lascia il suo blocco in sospeso: --resume lo riprova
+        for block_number in batch:
+            if block_number not in failed:
+                journal.mark_done(block_number)
+    return [block_number for block_number in batch if block_number in failed]
+
+
+async def async_process_blocks(block_queue, window, pipeline, journal=None, block_source="etherscan", rpc_batch_size=DEFAULT_RPC_BATCH_SIZE, verifier=None):
+    """
+    Scansiona i chunk della coda (all'indietro) in un unico processo: ogni
+    blocco e ogni deployment è un task asyncio, e al più `window` richieste
+    HTTP sono in volo contemporaneamente.
+    :param block_queue: BlockQueue condivisa dai worker
+    :param window: Numero massimo di richieste in volo
+    :param block_source: "etherscan" oppure "node" (JSON-RPC batch)
+    """
+    semaphore = asyncio.Semaphore(window)
+    connector = aiohttp.TCPConnector(limit=window)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        clientEth = AsyncEtherscanClient(session, semaphore)
+        clientWeb3 = AsyncWeb3Client(session, semaphore)
+        if verifier is None:
+            verifier = ReceiptVerifier()
+        if block_source == "node":
+            source = AsyncNodeBlockSource(clientWeb3, rpc_batch_size)
+        else:
+            source = AsyncEtherscanBlockSource(clientEth)
+
+        loop = asyncio.get_running_loop()
+
+        async def worker(name):
+            # Ogni worker prende il prossimo chunk libero appena finisce il precedente
+            # (fuori dall'event loop: con il coordinatore è una richiesta di rete)
+            chunk = await loop.run_in_executor(None, block_queue.next_chunk, name)
+            while chunk is not None:
+                started = time.monotonic()
+                failed = []
+                for batch in iter_batches(chunk[0], chunk[1], source.batch_size):
+                    batch_failed = await process_batch(clientEth, clientWeb3, source, verifier, pipeline, batch, journal)
+                    if batch_failed is None:
+                        break
+                    failed.extend(batch_failed)
+                if pipeline.quota.stopped.is_set():
+                    # Esecuzione fermata: il chunk resta tra quelli incompleti
+                    return
+                await loop.run_in_executor(None, block_queue.chunk_done, chunk, name, time.monotonic() - started, failed)
+                chunk = await loop.run_in_executor(None, block_queue.next_chunk, name)
+
+        # Un worker per slot della finestra basta a tenerla sempre piena
+        await asyncio.gather(*(worker(f"async_{i}") for i in range(window)))
+
+
+def run_async_engine(ranges, window, chunk_size=DEFAULT_CHUNK_SIZE, journal=None, block_source="etherscan", rpc_batch_size=DEFAULT_RPC_BATCH_SIZE, verifier=None, max_calls=None, block_queue=None):
+    pipeline = ContractPipeline(get_counter(), max_calls)
+    if block_queue is None:
+        block_queue = BlockQueue(ranges, chunk_size)
+    try:
+        asyncio.run(async_process_blocks(block_queue, window, pipeline, journal, block_source, rpc_batch_size, verifier))
+    except KeyboardInterrupt:
+        print("Process interrupted by user.")
+    block_queue.print_summary()
+    block_queue.close()
+    pipeline.print_summary()
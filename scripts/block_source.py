@@ -0,0 +1,55 @@
+BLOCK_SOURCES = ("etherscan", "node")
+DEFAULT_RPC_BATCH_SIZE = 10
+
+
+class EtherscanBlockSource:
+    """
+    Blocchi e ricevute dal modulo proxy di Etherscan: una chiamata per
+    blocco e una per ricevuta, tutte soggette al rate limit della API key.
+    """
+    batch_size = 1
+
+    def __init__(self, clientEth):
+        self.clientEth = clientEth
+
+    def get_blocks(self, block_numbers):
+        return {n: self.clientEth.get_transactions_from_block(n) for n in block_numbers}
+
+    def get_transaction_receipts(self, tx_hashes):
+        return {h: self.clientEth.get_transaction_receipt(h) for h in tx_hashes}
+
+
+class NodeBlockSource:
+    """
+    Blocchi e ricevute direttamente dal nodo con richieste JSON-RPC batch:
+    un round trip per `batch_size` blocchi e uno per tutte le ricevute delle
+    loro transazioni di creazione. Etherscan resta solo per getsourcecode.
+    """
+    def __init__(self, clientWeb3, batch_size=DEFAULT_RPC_BATCH_SIZE):
+        self.clientWeb3 = clientWeb3
+        self.batch_size = batch_size
+
+    def get_blocks(self, block_numbers):
+        return self.clientWeb3.get_blocks(block_numbers)
+
+    def get_transaction_receipts(self, tx_hashes):
+        return self.clientWeb3.get_transaction_receipts(tx_hashes)
+
+
+def make_block_source(name, clientEth, clientWeb3, batch_size=DEFAULT_RPC_BATCH_SIZE):
+    if name == "node":
+        return NodeBlockSource(clientWeb3, batch_size)
+    if name == "etherscan":
+        return EtherscanBlockSource(clientEth)
+    raise ValueError(f"Unknown block source: {name}")
+
+
+def iter_batches(start_block, end_block, batch_size):
+    """
+    Divide l'intervallo (all'indietro) in liste di al più `batch_size` blocchi.
+    :return: Generatore di liste di numeri di blocco decrescenti
+    """
+    while start_block >= end_block:
+        batch_end = max(end_block, start_block - batch_size + 1)
+        yield list(range(start_block, batch_end - 1, -1))
+        start_block = batch_end - 1
@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_JOURNAL_PATH = "contracts/progress.db"
+
+
+class ProgressJournal:
+    """
+    Registro persistente dei blocchi già scansionati, su SQLite in modalità WAL.
+    Ogni blocco completato è una transazione a sé: un'interruzione non lascia
+    mai il registro in uno stato parziale.
+    :param path: Percorso del file SQLite
+    """
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS completed_blocks ("
+                " block INTEGER PRIMARY KEY,"
+                " range_start INTEGER,"
+                " range_end INTEGER,"
+                " completed_at REAL)"
+            )
+
+    def mark_done(self, block, range_start=None, range_end=None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO completed_blocks VALUES (?, ?, ?, ?)",
+                (block, range_start, range_end, time.time()),
+            )
+
+    def completed_count(self, start_block, end_block):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*) FROM completed_blocks WHERE block BETWEEN ? AND ?",
+                (end_block, start_block),
+            ).fetchone()
+        return row[0]
+
+    def remaining_ranges(self, start_block, end_block):
+        """
+        Calcola gli intervalli di blocchi non ancora completati.
+        :param start_block: Blocco più alto (incluso)
+        :param end_block: Blocco più basso (incluso)
+        :return: Lista di (start, end) in ordine decrescente
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT block FROM completed_blocks WHERE block BETWEEN ? AND ? ORDER BY block DESC",
+                (end_block, start_block),
+            )
+            ranges = []
+            current = start_block
+            for (block,) in rows:
+                if block < current:
+                    ranges.append((current, block + 1))
+                current = block - 1
+        if current >= end_block:
+            ranges.append((current, end_block))
+        return ranges
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def plan_ranges(journal, start_block, end_block, resume):
+    """
+    Restituisce gli intervalli da scansionare: l'intero range, oppure con
+    --resume solo i blocchi che il registro non riporta come completati.
+    :return: Lista di (start, end) decrescenti
+    """
+    if not resume:
+        return [(start_block, end_block)]
+    ranges = journal.remaining_ranges(start_block, end_block)
+    remaining = sum(start - end + 1 for start, end in ranges)
+    print(
+        f"Resuming: {journal.completed_count(start_block, end_block)} blocks already completed, "
+        f"{remaining} remaining in {len(ranges)} ranges"
+    )
+    return ranges
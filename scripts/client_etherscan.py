@@ -1,26 +1,202 @@
 # etherscan_client.py
 
+import logging
 import time
-import requests
+import threading
+from scripts.http_session import get_session, backoff_delay, MAX_RETRIES
+from scripts.response_cache import lookup, store, require_online, MISS
+from scripts.metrics import inc, observe_call
+from scripts.key_pool import etherscan_pool
 from config import ETHERSCAN_API_URL, ETHERSCAN_API_KEY, ETHERSCAN_RATE_LIMIT_DELAY
 
+logger = logging.getLogger(__name__)
+
+
+class RequestScheduler:
+    """
+    Token bucket condiviso tra tutti i thread che usano la stessa API key.
+    I token si ricaricano a `rate` chiamate al secondo fino a `capacity`;
+    ogni richiesta prenota un token e attende solo il proprio turno.
+    :param rate: Chiamate al secondo consentite dalla API key
+    :param capacity: Numero massimo di chiamate in burst
+    :param budget: CallBudget condiviso da tutte le API key (None = illimitate)
+    """
+    def __init__(self, rate, capacity=1, budget=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.budget = budget
+        self.tokens = capacity
+        self.timestamp = time.monotonic()
+        self.lock = threading.Lock()
+        self.counters = {
+            "tokens waited": 0,
+            "wait time": 0.0,
+            "requests issued": 0,
+            "throttle responses": 0,
+        }
+
+    def reserve(self):
+        """
+        Prenota un token e restituisce i secondi da attendere prima di usarlo.
+        Usata direttamente dal motore asyncio, che attende con asyncio.sleep.
+        :return: Secondi di attesa (0 se il token è già disponibile)
+        :raise BudgetExhausted: se il budget di chiamate è esaurito
+        """
+        if self.budget is not None:
+            self.budget.spend()
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+            self.timestamp = now
+            # Prenota il token anche se non è ancora disponibile (saldo negativo):
+            # il chiamante attende fuori dal lock per il tempo che manca al suo turno
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.counters["requests issued"] += 1
+            if wait > 0:
+                self.counters["tokens waited"] += 1
+                self.counters["wait time"] += wait
+        return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def record_throttle(self):
+        with self.lock:
+            self.counters["throttle responses"] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+class CallBudget:
+    """
+    Chiamate Etherscan totali consentite all'esecuzione, sommate su tutte le API key.
+    :param max_calls: Numero massimo di chiamate
+    """
+    def __init__(self, max_calls):
+        self.max_calls = max_calls
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def spend(self):
+        with self.lock:
+            if self.used >= self.max_calls:
+                raise BudgetExhausted(f"API call budget of {self.max_calls} calls exhausted")
+            self.used += 1
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+_call_budget = None
+
+
+def set_call_budget(max_calls):
+    """
+    Limita le chiamate Etherscan totali dell'esecuzione (--max-calls).
+    :param max_calls: Numero massimo di chiamate, None per nessun limite
+    """
+    global _call_budget
+    with _schedulers_lock:
+        _call_budget = CallBudget(max_calls) if max_calls is not None else None
+        for scheduler in _schedulers.values():
+            scheduler.budget = _call_budget
+
+
+def get_scheduler(api_key=ETHERSCAN_API_KEY):
+    """
+    Restituisce lo scheduler del processo associato alla API key,
+    creandolo alla prima richiesta.
+    :param api_key: API key di Etherscan
+    :return: RequestScheduler condiviso
+    """
+    with _schedulers_lock:
+        if api_key not in _schedulers:
+            _schedulers[api_key] = RequestScheduler(rate=1 / ETHERSCAN_RATE_LIMIT_DELAY, budget=_call_budget)
+        return _schedulers[api_key]
+
+
+def total_stats():
+    """
+    Somma i contatori degli scheduler di tutte le API key usate dal processo.
+    :return: Dizionario come RequestScheduler.stats, più "api keys"
+    """
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    totals = {"tokens waited": 0, "wait time": 0.0, "requests issued": 0, "throttle responses": 0}
+    for scheduler in schedulers:
+        for name, value in scheduler.stats().items():
+            totals[name] += value
+    totals["api keys"] = len(schedulers)
+    return totals
+
+
+def is_throttle_response(result):
+    # Etherscan risponde 200 con "Max rate limit reached" nel campo result
+    # (status "0" per i moduli account/contract, payload JSON-RPC per il modulo proxy)
+    return (
+        isinstance(result, dict)
+        and isinstance(result.get("result"), str)
+        and "rate limit" in result["result"].lower()
+    )
+
+
+class EtherscanError(Exception):
+    pass
+
+
+class BudgetExhausted(EtherscanError):
+    pass
+
+
 class EtherscanClient:
-    def __init__(self, api_key=ETHERSCAN_API_KEY):
+    # Senza una key esplicita ogni richiesta usa la key successiva del pool (key_pool)
+    def __init__(self, api_key=None):
         self.api_key = api_key
+        # I 429 e i payload "Max rate limit reached" sono gestiti qui sotto, i 5xx dall'adapter
+        self.session = get_session("etherscan", status_forcelist=(500, 502, 503, 504))
 
-    def _make_request(self, module, action, params):
-        time.sleep(ETHERSCAN_RATE_LIMIT_DELAY)
+    def _make_request(self, module, action, params, fresh=False):
+        # Le risposte immutabili già salvate non consumano token né chiamate
+        # (fresh=True ignora la voce in cache, che viene poi aggiornata)
+        cached = MISS if fresh else lookup(module, action, params)
+        if cached is not MISS:
+            return cached
+        api_key = self.api_key or etherscan_pool().next()
+        scheduler = get_scheduler(api_key)
         payload = {
             "module": module,
             "action": action,
-            "apikey": self.api_key,
+            "apikey": api_key,
             **params
         }
-        response = requests.get(ETHERSCAN_API_URL, params=payload)
-        return response.json()
+        for attempt in range(MAX_RETRIES + 1):
+            scheduler.acquire()
+            started = time.monotonic()
+            response = self.session.get(ETHERSCAN_API_URL, params=payload)
+            observe_call("etherscan", action, time.monotonic() - started)
+            if response.status_code == 429:
+                scheduler.record_throttle()
+                inc("miner_throttle_total", service="etherscan", endpoint=action)
+            else:
+                response.raise_for_status()
+                result = response.json()
+                if not is_throttle_response(result):
+                    store(module, action, params, result)
+                    return result
+                scheduler.record_throttle()
+                inc("miner_throttle_total", service="etherscan", endpoint=action)
+            if attempt < MAX_RETRIES:
+                inc("miner_retries_total", service="etherscan", endpoint=action)
+                time.sleep(backoff_delay(attempt))
+        raise EtherscanError(f"{module}/{action}: rate limit still reached after {MAX_RETRIES} retries")
 
-    def get_contract_metadata(self, address):
-        result = self._make_request("contract", "getsourcecode", {"address": address})
+    def get_contract_metadata(self, address, fresh=False):
+        # fresh=True per ricontrollare un contratto la cui risposta "non verificato" è in cache
+        result = self._make_request("contract", "getsourcecode", {"address": address}, fresh)
         if result.get("status") == "1":
             return result["result"][0]
         return None
@@ -36,15 +212,22 @@ class EtherscanClient:
     #     return result.get("result", None)
     
     def get_last_block(self):
+        # La testa della catena cambia di continuo e non è mai in cache
+        require_online("eth_blockNumber")
         result = self._make_request("proxy", "eth_blockNumber", {})
         return int(result.get("result", None), 16) 
     
+    def get_block_header(self, block_number):
+        # Blocco senza transazioni complete: bastano hash e parentHash
+        result = self._make_request("proxy", "eth_getBlockByNumber", {"tag": hex(block_number), "boolean": "false"})
+        return result["result"]
+
     def get_transactions_from_block(self, block_number):
         result = self._make_request("proxy", "eth_getBlockByNumber", {"tag": hex(block_number), "boolean": "true"})
         if result["result"]["transactions"] != []:
             return result["result"]["transactions"]
         else:
-            print("Error:", "get_transactions_from_block: No transactions found in block", block_number)
+            logger.debug(f"get_transactions_from_block: No transactions found in block {block_number}")
             return None
     
     def get_transaction_receipt(self, tx_hash):
@@ -52,7 +235,7 @@ class EtherscanClient:
         if result["result"] is not None:        
             return result["result"]
         else:
-            print("Error:", "get_transaction_receipt: Transaction not found", tx_hash)   
+            logger.warning(f"get_transaction_receipt: Transaction not found {tx_hash}")   
             return None
     
     def get_transaction(self, tx_hash):
@@ -60,7 +243,7 @@ class EtherscanClient:
         if result["result"] is not None:        
             return result["result"]
         else:
-            print("Error:", "get_transaction: Transaction not found", tx_hash)   
+            logger.warning(f"get_transaction: Transaction not found {tx_hash}")   
             return None
         
     def isAContractDeployment(self, tx):
@@ -1,15 +1,128 @@
-from web3 import Web3
-from config import INFURA_API_KEY, INFURA_API_URL
-import json
+import threading
+import time
+from scripts.http_session import get_session
+from scripts.key_pool import node_pool
+from scripts.response_cache import lookup, store, require_online, MISS
+from scripts.metrics import observe_call, rpc_endpoint
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_web3(url):
+    """
+    Restituisce l'istanza Web3 condivisa dal processo per l'endpoint,
+    appoggiata al pool di connessioni keep-alive con retry.
+    :param url: URL del nodo (es. INFURA_API_URL + API key)
+    :return: Web3
+    """
+    # Import differito: web3 è il modulo più lento da importare, e serve solo per eth_getCode
+    from web3 import Web3
+    with _providers_lock:
+        if url not in _providers:
+            _providers[url] = Web3(Web3.HTTPProvider(url, session=get_session("web3")))
+        return _providers[url]
+
 
 class Web3Client:
-    # Connettiti a un provider Ethereum, ad esempio Infura
-    def __init__(self, api_key=INFURA_API_KEY):
-        self.w3 = Web3(Web3.HTTPProvider(INFURA_API_URL+api_key))
+    # Connettiti a un provider Ethereum, ad esempio Infura.
+    # Senza un URL esplicito ogni richiesta usa il nodo successivo del pool (key_pool)
+    def __init__(self, url=None):
+        self.url = url
+        self.session = get_session("web3")
+
+    def _batch(self, calls):
+        """
+        Invia più chiamate JSON-RPC in un'unica richiesta HTTP, escludendo
+        quelle la cui risposta è già in cache.
+        :param calls: Lista di (metodo, parametri)
+        :return: Lista dei risultati, nello stesso ordine delle chiamate
+        """
+        results = [lookup("rpc", method, params) for method, params in calls]
+        missing = [i for i, result in enumerate(results) if result is MISS]
+        if missing:
+            fetched = self._send_batch([calls[i] for i in missing])
+            for i, result in zip(missing, fetched):
+                results[i] = result
+                store("rpc", calls[i][0], calls[i][1], result)
+        return results
+
+    def _send_batch(self, calls):
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(calls)
+        ]
+        started = time.monotonic()
+        response = self.session.post(self.url or node_pool().next(), json=payload)
+        observe_call("node", rpc_endpoint(calls), time.monotonic() - started)
+        response.raise_for_status()
+        results = response.json()
+        if isinstance(results, dict):
+            # Il nodo ha rifiutato l'intero batch (es. batch troppo grande)
+            raise RuntimeError(f"JSON-RPC batch rejected: {results.get('error')}")
+        by_id = {result.get("id"): result for result in results}
+        ordered = []
+        for i, (method, _) in enumerate(calls):
+            result = by_id.get(i)
+            if result is None or "error" in result:
+                raise RuntimeError(f"{method}: {result.get('error') if result else 'missing response'}")
+            ordered.append(result["result"])
+        return ordered
+
+    def get_blocks(self, block_numbers):
+        """
+        Scarica più blocchi con le transazioni complete in un unico round trip.
+        :param block_numbers: Lista di numeri di blocco
+        :return: Dizionario {numero_blocco: lista_transazioni}
+        """
+        blocks = self._batch([("eth_getBlockByNumber", [hex(n), True]) for n in block_numbers])
+        return {
+            n: (block["transactions"] if block is not None else None)
+            for n, block in zip(block_numbers, blocks)
+        }
+
+    def get_block_number(self):
+        # La testa della catena cambia di continuo e non è mai in cache
+        require_online("eth_blockNumber")
+        return int(self._send_batch([("eth_blockNumber", [])])[0], 16)
+
+    def get_block_headers(self, block_numbers):
+        """
+        Scarica le intestazioni (senza transazioni) di più blocchi in un unico round trip.
+        :return: Dizionario {numero_blocco: blocco}
+        """
+        blocks = self._batch([("eth_getBlockByNumber", [hex(n), False]) for n in block_numbers])
+        return dict(zip(block_numbers, blocks))
+
+    def get_transactions(self, tx_hashes):
+        """
+        Scarica più transazioni in un unico round trip.
+        :param tx_hashes: Lista di hash di transazione
+        :return: Dizionario {hash: transazione}
+        """
+        transactions = self._batch([("eth_getTransactionByHash", [h]) for h in tx_hashes])
+        return dict(zip(tx_hashes, transactions))
+
+    def get_transaction_receipts(self, tx_hashes):
+        """
+        Scarica le ricevute di più transazioni in un unico round trip.
+        :param tx_hashes: Lista di hash di transazione
+        :return: Dizionario {hash: ricevuta}
+        """
+        receipts = self._batch([("eth_getTransactionReceipt", [h]) for h in tx_hashes])
+        return dict(zip(tx_hashes, receipts))
 
     def get_bytecode(self, address):
         #runtime bytecode
-        bytecode = self.w3.eth.get_code(Web3.to_checksum_address(address))
-        return bytecode.hex()
+        params = [address.lower(), "latest"]
+        cached = lookup("rpc", "eth_getCode", params)
+        if cached is not MISS:
+            return cached
+        started = time.monotonic()
+        w3 = get_web3(self.url or node_pool().next())
+        bytecode = w3.eth.get_code(w3.to_checksum_address(address)).hex()
+        observe_call("node", "eth_getCode", time.monotonic() - started)
+        store("rpc", "eth_getCode", params, bytecode)
+        return bytecode
 
-    
\ No newline at end of file
+    
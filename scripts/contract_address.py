@@ -0,0 +1,85 @@
+import logging
+import random
+
+VERIFY_MODES = ("none", "sample", "all")
+DEFAULT_SAMPLE_RATE = 0.01
+
+logger = logging.getLogger(__name__)
+
+
+def _rlp_length_prefix(length, offset):
+    if length <= 55:
+        return bytes([offset + length])
+    length_bytes = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes([offset + 55 + len(length_bytes)]) + length_bytes
+
+
+def rlp_encode(item):
+    """
+    Codifica RLP minimale (bytes, interi non negativi e liste), sufficiente
+    per [sender, nonce].
+    :param item: bytes, int oppure lista
+    :return: bytes codificati
+    """
+    if isinstance(item, list):
+        payload = b"".join(rlp_encode(element) for element in item)
+        return _rlp_length_prefix(len(payload), 0xc0) + payload
+    if isinstance(item, int):
+        item = item.to_bytes((item.bit_length() + 7) // 8, "big") if item else b""
+    if len(item) == 1 and item[0] < 0x80:
+        return item
+    return _rlp_length_prefix(len(item), 0x80) + item
+
+
+def compute_contract_address(sender: str, nonce: int) -> str:
+    """
+    Calcola l'indirizzo di un contratto creato da una transazione CREATE di
+    primo livello: keccak(rlp([sender, nonce]))[12:].
+    :param sender: Indirizzo del mittente (campo "from")
+    :param nonce: Nonce della transazione
+    :return: Indirizzo del contratto in minuscolo, come in contractAddress
+    """
+    # Import differito: eth_utils pesa sull'avvio, dopo la prima chiamata è una lookup in sys.modules
+    from eth_utils import keccak, to_bytes
+    return "0x" + keccak(rlp_encode([to_bytes(hexstr=sender), nonce]))[12:].hex()
+
+
+def is_empty_bytecode(runtime_bytecode) -> bool:
+    return runtime_bytecode in (None, "", "0x")
+
+
+class ReceiptVerifier:
+    """
+    Decide per quali deployment scaricare comunque la ricevuta, per
+    confrontarne contractAddress con l'indirizzo calcolato localmente.
+    :param mode: "none", "sample" (una frazione casuale) oppure "all"
+    :param sample_rate: Frazione di deployment verificati con mode="sample"
+    """
+    def __init__(self, mode="none", sample_rate=DEFAULT_SAMPLE_RATE):
+        self.mode = mode
+        self.sample_rate = sample_rate
+
+    def should_fetch(self, tx) -> bool:
+        if self.mode == "all":
+            return True
+        if self.mode == "sample":
+            return random.random() < self.sample_rate
+        return False
+
+    def contract_address(self, tx, tx_receipt=None) -> str:
+        """
+        Indirizzo del contratto creato da `tx`, calcolato localmente e,
+        se la ricevuta è disponibile, confrontato con contractAddress.
+        :return: Indirizzo del contratto
+        """
+        derived = compute_contract_address(tx["from"], int(tx["nonce"], 16))
+        if tx_receipt is not None and tx_receipt.get("contractAddress"):
+            if tx_receipt["contractAddress"].lower() != derived:
+                logger.warning(f"✗ Address mismatch for {tx['hash']}: derived {derived}, receipt {tx_receipt['contractAddress']}")
+                return tx_receipt["contractAddress"]
+        return derived
+
+
+def is_reverted(tx_receipt) -> bool:
+    # Le ricevute pre-Byzantium non hanno il campo status
+    return tx_receipt is not None and tx_receipt.get("status") in ("0x0", 0)
@@ -0,0 +1,408 @@
+import argparse
+import http.server
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from scripts.work_queue import iter_chunks, DEFAULT_CHUNK_SIZE
+from scripts.metrics import inc
+
+DEFAULT_COORDINATOR_PATH = "contracts/coordinator.db"
+DEFAULT_COORDINATOR_PORT = 9110
+DEFAULT_LEASE_SECONDS = 300
+# Dopo tanti tentativi falliti un chunk non viene più assegnato
+MAX_LEASE_ATTEMPTS = 5
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseTable:
+    """
+    Tabella dei chunk di blocchi su SQLite, condivisa da tutti i worker.
+    Un chunk è "pending", "leased" (fino alla scadenza del lease), "done"
+    oppure "failed" (dopo MAX_LEASE_ATTEMPTS tentativi falliti).
+    Ogni lease ha un id proprio: solo chi detiene il lease corrente può
+    completare il chunk, quindi ogni chunk è segnato completato una sola volta
+    anche se un worker creduto morto torna in vita dopo la riassegnazione.
+    Un chunk con blocchi falliti non viene completato ma rilasciato, e torna
+    in coda dopo i chunk mai tentati.
+    Più processi sullo stesso host possono aprire lo stesso file.
+    :param path: Percorso del file SQLite
+    """
+    def __init__(self, path=DEFAULT_COORDINATOR_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " start INTEGER PRIMARY KEY,"
+                " end INTEGER,"
+                " state TEXT,"
+                " worker TEXT,"
+                " lease_id TEXT,"
+                " expires REAL,"
+                " attempts INTEGER DEFAULT 0,"
+                " completed_at REAL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_state ON chunks (state, start)")
+
+    def add_ranges(self, ranges, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Aggiunge i chunk dei blocchi degli intervalli non ancora coperti da
+        chunk esistenti: ogni blocco appartiene al più a un chunk.
+        :return: Numero di chunk aggiunti
+        """
+        added = 0
+        with self.lock, self.conn:
+            for start, end in ranges:
+                existing = self.conn.execute(
+                    "SELECT start, end FROM chunks WHERE start >= ? AND end <= ? ORDER BY start DESC", (end, start)
+                ).fetchall()
+                # Le parti dell'intervallo tra un chunk esistente e l'altro
+                gaps = []
+                current = start
+                for chunk_start, chunk_end in existing:
+                    if chunk_start < current:
+                        gaps.append((current, chunk_start + 1))
+                    current = min(current, chunk_end - 1)
+                if current >= end:
+                    gaps.append((current, end))
+                for chunk in iter_chunks(gaps, chunk_size):
+                    self.conn.execute("INSERT INTO chunks (start, end, state) VALUES (?, ?, 'pending')", chunk)
+                    added += 1
+        return added
+
+    def lease(self, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Assegna al worker il chunk libero più alto tra quelli con meno tentativi:
+        pending, oppure con un lease scaduto.
+        :return: {"lease": id, "start": ..., "end": ...} oppure None se non restano chunk liberi
+        """
+        with self.lock:
+            while True:
+                now = time.time()
+                row = self.conn.execute(
+                    "SELECT start, end, state FROM chunks"
+                    " WHERE state = 'pending' OR (state = 'leased' AND expires < ?)"
+                    " ORDER BY attempts, start DESC LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    return None
+                start, end, state = row
+                lease_id = uuid.uuid4().hex
+                with self.conn:
+                    # Aggiornamento condizionato: un altro processo può aver preso lo stesso chunk
+                    updated = self.conn.execute(
+                        "UPDATE chunks SET state = 'leased', worker = ?, lease_id = ?, expires = ?, attempts = attempts + 1"
+                        " WHERE start = ? AND (state = 'pending' OR (state = 'leased' AND expires < ?))",
+                        (worker, lease_id, now + lease_seconds, start, now),
+                    ).rowcount
+                if updated:
+                    if state == "leased":
+                        logger.warning(f"Lease on chunk {start}-{end} expired, re-issued to {worker}")
+                    return {"lease": lease_id, "start": start, "end": end}
+
+    def renew(self, lease_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        :return: False se il lease non è più del chiamante
+        """
+        with self.lock, self.conn:
+            return self.conn.execute(
+                "UPDATE chunks SET expires = ? WHERE lease_id = ? AND state = 'leased'",
+                (time.time() + lease_seconds, lease_id),
+            ).rowcount == 1
+
+    def complete(self, lease_id):
+        """
+        :return: True se il chunk è stato segnato completato con questo lease
+        """
+        with self.lock, self.conn:
+            updated = self.conn.execute(
+                "UPDATE chunks SET state = 'done', completed_at = ? WHERE lease_id = ? AND state = 'leased'",
+                (time.time(), lease_id),
+            ).rowcount
+            if updated:
+                return True
+            # Richiesta ripetuta dopo un errore di rete: il chunk è già completato con questo lease
+            return self.conn.execute(
+                "SELECT 1 FROM chunks WHERE lease_id = ? AND state = 'done'", (lease_id,)
+            ).fetchone() is not None
+
+    def release(self, lease_id, failed=False):
+        """
+        Chunk non completato: torna subito disponibile.
+        :param failed: True se alcuni blocchi sono falliti; dopo MAX_LEASE_ATTEMPTS
+                       tentativi il chunk passa a "failed" e non viene più assegnato
+        """
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE chunks SET state = CASE WHEN ? AND attempts >= ? THEN 'failed' ELSE 'pending' END,"
+                " lease_id = NULL, expires = NULL WHERE lease_id = ? AND state = 'leased'",
+                (failed, MAX_LEASE_ATTEMPTS, lease_id),
+            )
+
+    def status(self):
+        with self.lock:
+            states = self.conn.execute(
+                "SELECT state, COUNT(*), SUM(start - end + 1) FROM chunks GROUP BY state"
+            ).fetchall()
+            workers = self.conn.execute(
+                "SELECT worker, COUNT(*), SUM(start - end + 1) FROM chunks WHERE state = 'done' GROUP BY worker"
+            ).fetchall()
+            expired = self.conn.execute(
+                "SELECT COUNT(*) FROM chunks WHERE state = 'leased' AND expires < ?", (time.time(),)
+            ).fetchone()[0]
+        return {
+            "chunks": {state: chunks for state, chunks, _ in states},
+            "blocks": {state: blocks for state, _, blocks in states},
+            "workers": {worker: {"chunks": chunks, "blocks": blocks} for worker, chunks, blocks in workers},
+            "expired leases": expired,
+        }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class RemoteLeases:
+    """
+    Stessa interfaccia di LeaseTable verso un coordinatore HTTP
+    (python -m scripts.coordinator serve), per worker su host diversi.
+    :param url: Indirizzo del coordinatore, es. http://10.0.0.1:9110
+    """
+    def __init__(self, url):
+        # Import differito: requests serve solo ai worker remoti
+        from scripts.http_session import get_session
+        self.url = url.rstrip("/")
+        self.session = get_session("coordinator")
+
+    def _post(self, path, **payload):
+        response = self.session.post(f"{self.url}/{path}", json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def lease(self, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        return self._post("lease", worker=worker, lease_seconds=lease_seconds)["chunk"]
+
+    def renew(self, lease_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        return self._post("renew", lease=lease_id, lease_seconds=lease_seconds)["ok"]
+
+    def complete(self, lease_id):
+        return self._post("complete", lease=lease_id)["ok"]
+
+    def release(self, lease_id, failed=False):
+        self._post("release", lease=lease_id, failed=failed)
+
+    def status(self):
+        response = self.session.get(f"{self.url}/status")
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        pass
+
+
+def open_leases(target):
+    """
+    :param target: URL http(s) di un coordinatore oppure percorso di una LeaseTable SQLite
+    """
+    if target.startswith(("http://", "https://")):
+        return RemoteLeases(target)
+    return LeaseTable(target)
+
+
+class LeaseQueue:
+    """
+    Sostituisce BlockQueue quando i chunk arrivano dal coordinatore: stessa
+    interfaccia (next_chunk, chunk_done, print_summary, close), così i
+    worker del motore a thread e di quello asyncio restano invariati.
+    Un thread rinnova i lease in corso ogni terzo della loro durata: se il
+    processo muore i lease scadono e i chunk vengono riassegnati.
+    :param leases: LeaseTable oppure RemoteLeases
+    :param worker_id: Identificativo del processo presso il coordinatore
+    :param lease_seconds: Durata di un lease senza rinnovo
+    """
+    def __init__(self, leases, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.leases = leases
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.lock = threading.Lock()
+        self.held = {}
+        self.lost = 0
+        self.failed = 0
+        self.workers = {}
+        self.started = time.monotonic()
+        self.stop = threading.Event()
+        self.heartbeat = threading.Thread(target=self._renew_loop, name="lease-heartbeat", daemon=True)
+        self.heartbeat.start()
+
+    def next_chunk(self, worker):
+        lease = self.leases.lease(f"{self.worker_id}/{worker}", self.lease_seconds)
+        if lease is None:
+            return None
+        chunk = (lease["start"], lease["end"])
+        with self.lock:
+            self.held[chunk] = lease["lease"]
+        return chunk
+
+    def chunk_done(self, chunk, worker, elapsed, failed=()):
+        """
+        :param failed: Blocchi del chunk non completati per un errore: il chunk
+                       non viene completato ma rilasciato, e un worker lo riprende
+        """
+        with self.lock:
+            lease_id = self.held.pop(chunk)
+        if failed:
+            self.leases.release(lease_id, failed=True)
+            with self.lock:
+                self.failed += 1
+            logger.warning(f"Chunk {chunk[0]}-{chunk[1]} released with {len(failed)} failed blocks")
+            return
+        if not self.leases.complete(lease_id):
+            # Il lease è scaduto ed è stato riassegnato: il chunk è contato all'altro worker
+            with self.lock:
+                self.lost += 1
+            logger.warning(f"Lease on chunk {chunk[0]}-{chunk[1]} lost, the coordinator re-issued it")
+            return
+        blocks = chunk[0] - chunk[1] + 1
+        with self.lock:
+            stats = self.workers.setdefault(worker, {"chunks": 0, "blocks": 0, "busy": 0.0})
+            stats["chunks"] += 1
+            stats["blocks"] += blocks
+            stats["busy"] += elapsed
+        inc("miner_blocks_total", blocks)
+        logger.info(f"Chunk {chunk[0]}-{chunk[1]} done by {self.worker_id}/{worker}")
+
+    def _renew_loop(self):
+        while not self.stop.wait(self.lease_seconds / 3):
+            with self.lock:
+                held = list(self.held.items())
+            for chunk, lease_id in held:
+                try:
+                    if not self.leases.renew(lease_id, self.lease_seconds):
+                        logger.warning(f"Could not renew the lease on chunk {chunk[0]}-{chunk[1]}")
+                except Exception as e:
+                    logger.error(f"An error occurred while renewing leases: {e}")
+
+    def print_summary(self):
+        elapsed = time.monotonic() - self.started
+        with self.lock:
+            chunks = sum(stats["chunks"] for stats in self.workers.values())
+            blocks = sum(stats["blocks"] for stats in self.workers.values())
+            print(f"Worker {self.worker_id}: scanned {blocks} blocks in {chunks} leased chunks, {elapsed:.1f}s")
+            for worker, stats in sorted(self.workers.items()):
+                rate = stats["blocks"] / stats["busy"] if stats["busy"] else 0.0
+                print(
+                    f"  {worker}: {stats['chunks']} chunks, {stats['blocks']} blocks, "
+                    f"{rate:.2f} blocks/s"
+                )
+            if self.lost:
+                print(f"  {self.lost} leases lost and re-issued to other workers")
+            if self.failed:
+                print(f"  {self.failed} chunks with failed blocks released to be retried")
+        status = self.leases.status()
+        print(f"Coordinator: {status['chunks'].get('done', 0)}/{sum(status['chunks'].values())} chunks done")
+
+    def close(self):
+        # I chunk ancora in mano (esecuzione fermata) tornano disponibili senza aspettare la scadenza
+        self.stop.set()
+        with self.lock:
+            held, self.held = list(self.held.values()), {}
+        for lease_id in held:
+            self.leases.release(lease_id)
+        self.leases.close()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def _reply(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/status":
+            self._reply(self.server.table.status())
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        table = self.server.table
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/lease":
+            self._reply({"chunk": table.lease(request["worker"], request.get("lease_seconds", DEFAULT_LEASE_SECONDS))})
+        elif self.path == "/renew":
+            self._reply({"ok": table.renew(request["lease"], request.get("lease_seconds", DEFAULT_LEASE_SECONDS))})
+        elif self.path == "/complete":
+            self._reply({"ok": table.complete(request["lease"])})
+        elif self.path == "/release":
+            table.release(request["lease"], request.get("failed", False))
+            self._reply({"ok": True})
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(table, port=DEFAULT_COORDINATOR_PORT, host="0.0.0.0"):
+    """
+    Espone la LeaseTable ai worker remoti (POST /lease, /renew, /complete, /release e GET /status).
+    """
+    server = http.server.ThreadingHTTPServer((host, port), _Handler)
+    server.table = table
+    return server
+
+
+def print_status(status):
+    total = sum(status["chunks"].values())
+    print(f"Chunks: {total} total, " + ", ".join(f"{n} {state}" for state, n in sorted(status["chunks"].items())))
+    print("Blocks: " + ", ".join(f"{n} {state}" for state, n in sorted(status["blocks"].items())))
+    if status["expired leases"]:
+        print(f"Expired leases waiting to be re-issued: {status['expired leases']}")
+    for worker, stats in sorted(status["workers"].items()):
+        print(f"  {worker}: {stats['chunks']} chunks, {stats['blocks']} blocks")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hand out block-chunk leases to distributed miner workers.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    init_parser = subparsers.add_parser("init", help="Add a block range to the lease table")
+    serve_parser = subparsers.add_parser("serve", help="Serve the lease table over HTTP to workers on other hosts")
+    status_parser = subparsers.add_parser("status", help="Print the progress of the lease table")
+    for sub in (init_parser, serve_parser, status_parser):
+        sub.add_argument("--db", default=DEFAULT_COORDINATOR_PATH, help=f"Lease table path (default: {DEFAULT_COORDINATOR_PATH})")
+    for sub in (init_parser, serve_parser):
+        sub.add_argument("--start-block", type=int, default=None, help="Highest block of the range to add")
+        sub.add_argument("--end-block", type=int, default=0, help="Lowest block of the range to add (default: 0)")
+        sub.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help=f"Blocks per lease (default: {DEFAULT_CHUNK_SIZE})")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_COORDINATOR_PORT, help=f"HTTP port (default: {DEFAULT_COORDINATOR_PORT})")
+    args = parser.parse_args()
+    logging.basicConfig(level="INFO", format="%(message)s")
+
+    table = LeaseTable(args.db)
+    if args.command in ("init", "serve") and args.start_block is not None:
+        added = table.add_ranges([(args.start_block, args.end_block)], args.chunk_size)
+        print(f"Added {added} chunks of {args.chunk_size} blocks")
+    if args.command == "serve":
+        server = serve(table, args.port)
+        print(f"Coordinator listening on port {args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    print_status(table.status())
+    table.close()
@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from scripts.metadata_store import open_store, CONTRACTS_DIR, DEFAULT_BACKEND
+
+DEFAULT_INDEX_PATH = "contracts/index.db"
+# Colonne filtrabili della tabella contracts, ciascuna con il proprio indice
+COLUMNS = ("version_folder", "pragma", "compiler_version", "compiler_type", "optimization", "block_number")
+
+
+def _keccak(text):
+    # Import differito: le query per selettore già esadecimale non ne hanno bisogno
+    from eth_utils import keccak
+    return keccak(text=text).hex()
+
+
+def canonical_type(param):
+    # Le struct (tuple) entrano nella firma come lista dei tipi dei campi
+    kind = param["type"]
+    if kind.startswith("tuple"):
+        return "(" + ",".join(canonical_type(c) for c in param.get("components", [])) + ")" + kind[len("tuple"):]
+    return kind
+
+
+def signature(item):
+    return f"{item['name']}({','.join(canonical_type(p) for p in item.get('inputs', []))})"
+
+
+def abi_signatures(abi):
+    """
+    Firme delle funzioni e degli eventi dichiarati nell'ABI.
+    Gli eventi anonymous non hanno topic 0 e sono esclusi.
+    :param abi: ABI come lista o come stringa JSON
+    :return: (firme delle funzioni, firme degli eventi)
+    """
+    if isinstance(abi, str):
+        try:
+            abi = json.loads(abi)
+        except json.JSONDecodeError:
+            return [], []
+    functions, events = [], []
+    for item in abi or []:
+        if not isinstance(item, dict) or "name" not in item:
+            continue
+        kind = item.get("type", "function")
+        if kind == "function":
+            functions.append(signature(item))
+        elif kind == "event" and not item.get("anonymous"):
+            events.append(signature(item))
+    return functions, events
+
+
+def selector_of(value):
+    # "0xa9059cbb" resta com'è, "transfer(address,uint256)" diventa il suo selettore
+    value = value.replace(" ", "")
+    return value.lower() if value.startswith("0x") else "0x" + _keccak(value)[:8]
+
+
+def topic_of(value):
+    value = value.replace(" ", "")
+    return value.lower() if value.startswith("0x") else "0x" + _keccak(value)
+
+
+def _optimization(value):
+    # Etherscan restituisce "1"/"0", il formato storico può contenere anche booleani
+    if value in (None, ""):
+        return None
+    return 1 if str(value).lower() in ("1", "true") else 0
+
+
+class CorpusIndex:
+    """
+    Indice interrogabile dei contratti salvati: indice inverso da selettore
+    di funzione e topic di evento (ricavati dall'ABI) agli indirizzi, e
+    colonne indicizzate per pragma, compilatore e ottimizzazione.
+    Aggiornato da dispatcher.save, le query non leggono mai i logs.
+    :param path: Percorso del file SQLite
+    """
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS contracts ("
+                " address TEXT PRIMARY KEY,"
+                " version_folder TEXT,"
+                " pragma TEXT,"
+                " compiler_version TEXT,"
+                " compiler_type TEXT,"
+                " optimization INTEGER,"
+                " block_number INTEGER)"
+            )
+            for column in COLUMNS:
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{column} ON contracts ({column})")
+            # Chiave primaria (selettore, indirizzo): la ricerca per selettore legge solo l'indice
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS selectors ("
+                " selector TEXT, address TEXT, signature TEXT,"
+                " PRIMARY KEY (selector, address)) WITHOUT ROWID"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " topic TEXT, address TEXT, signature TEXT,"
+                " PRIMARY KEY (topic, address)) WITHOUT ROWID"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_selectors_address ON selectors (address)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_events_address ON events (address)")
+
+    def add(self, version_folder, contract_address, entry):
+        """
+        :param entry: Metadati nel formato di get_store().add
+        """
+        contract_address = contract_address.lower()
+        functions, events = abi_signatures(entry.get("abi"))
+        selectors = [(selector_of(s), contract_address, s) for s in functions]
+        topics = [(topic_of(s), contract_address, s) for s in events]
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO contracts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (contract_address, version_folder, entry.get("pragma"), entry.get("compiler version"),
+                 entry.get("compiler type"), _optimization(entry.get("optimization")), entry.get("block number")),
+            )
+            self.conn.executemany("INSERT OR IGNORE INTO selectors VALUES (?, ?, ?)", selectors)
+            self.conn.executemany("INSERT OR IGNORE INTO events VALUES (?, ?, ?)", topics)
+
+    def query(self, selector=None, event=None, pragma=None, compiler=None, optimization=None,
+              version_folder=None, limit=None):
+        """
+        Contratti che soddisfano tutti i filtri indicati.
+        :param selector: Selettore (0x...) oppure firma, es. "transfer(address,uint256)"
+        :param event: Topic (0x...) oppure firma dell'evento
+        :param compiler: Prefisso della versione del compilatore, es. "v0.5.17"
+        :param optimization: True/False
+        :return: Lista di dizionari, uno per contratto
+        """
+        joins, where, params = [], [], []
+        if selector is not None:
+            joins.append("JOIN selectors s ON s.address = c.address AND s.selector = ?")
+            params.append(selector_of(selector))
+        if event is not None:
+            joins.append("JOIN events e ON e.address = c.address AND e.topic = ?")
+            params.append(topic_of(event))
+        if pragma is not None:
+            where.append("c.pragma = ?")
+            params.append(pragma)
+        if compiler is not None:
+            # Intervallo sull'indice invece di LIKE, che SQLite non sempre usa
+            where.append("c.compiler_version >= ? AND c.compiler_version < ?")
+            params.extend([compiler, compiler + "\uffff"])
+        if optimization is not None:
+            where.append("c.optimization = ?")
+            params.append(1 if optimization else 0)
+        if version_folder is not None:
+            where.append("c.version_folder = ?")
+            params.append(version_folder)
+        sql = f"SELECT c.address, {', '.join('c.' + column for column in COLUMNS)} FROM contracts c {' '.join(joins)}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY c.address"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [dict(zip(("address",) + COLUMNS, row)) for row in rows]
+
+    def signatures(self, contract_address):
+        """
+        :return: (firme delle funzioni, firme degli eventi) di un contratto
+        """
+        contract_address = contract_address.lower()
+        with self.lock:
+            functions = [r[0] for r in self.conn.execute("SELECT signature FROM selectors WHERE address = ?", (contract_address,))]
+            events = [r[0] for r in self.conn.execute("SELECT signature FROM events WHERE address = ?", (contract_address,))]
+        return functions, events
+
+    def stats(self):
+        with self.lock:
+            return {
+                table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("contracts", "selectors", "events")
+            }
+
+    def clear(self):
+        with self.lock, self.conn:
+            for table in ("contracts", "selectors", "events"):
+                self.conn.execute(f"DELETE FROM {table}")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_index = None
+
+
+def configure_index(path=DEFAULT_INDEX_PATH):
+    """
+    Attiva l'indice aggiornato da dispatcher.save.
+    """
+    global _index
+    _index = CorpusIndex(path)
+    return _index
+
+
+def get_index():
+    # None se l'indice non è stato attivato con --index
+    return _index
+
+
+def rebuild_index(backend=DEFAULT_BACKEND, root=CONTRACTS_DIR, path=DEFAULT_INDEX_PATH):
+    """
+    Ricostruisce l'indice da zero a partire dai metadati già salvati.
+    :param backend: "jsonl", "sqlite" oppure "json" (logs.json storici)
+    :return: Numero di contratti indicizzati
+    """
+    index = CorpusIndex(path)
+    index.clear()
+    store = open_store(backend, root)
+    indexed = 0
+    for version_folder in store.versions():
+        for address, entry in store.iter_entries(version_folder):
+            index.add(version_folder, address, entry)
+            indexed += 1
+        print(f"✓ Indexed {version_folder}: {indexed} contracts so far")
+    store.close()
+    index.close()
+    return indexed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the index of mined contracts.")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help=f"Index path (default: {DEFAULT_INDEX_PATH})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    query_parser = subparsers.add_parser("query", help="Print the contracts matching every given filter")
+    query_parser.add_argument("--selector", help="Function selector (0xa9059cbb) or signature (\"transfer(address,uint256)\")")
+    query_parser.add_argument("--event", help="Event topic (0x...) or signature (\"Transfer(address,address,uint256)\")")
+    query_parser.add_argument("--pragma", help="Exact pragma, e.g. ^0.5.0")
+    query_parser.add_argument("--compiler", help="Compiler version prefix, e.g. v0.5.17")
+    query_parser.add_argument("--optimization", choices=["on", "off"], help="Optimizer enabled or not")
+    query_parser.add_argument("--version", help="Version folder, e.g. 0_5")
+    query_parser.add_argument("--limit", type=int, default=None)
+    query_parser.add_argument("--json", action="store_true", help="Print one JSON object per contract")
+    show_parser = subparsers.add_parser("show", help="Print the indexed functions and events of a contract")
+    show_parser.add_argument("address")
+    rebuild_parser = subparsers.add_parser("rebuild", help="Rebuild the index from the saved metadata")
+    rebuild_parser.add_argument("--backend", choices=["jsonl", "sqlite", "json"], default=DEFAULT_BACKEND)
+    rebuild_parser.add_argument("--root", default=CONTRACTS_DIR)
+    subparsers.add_parser("stats", help="Print the number of indexed contracts, selectors and events")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        print(f"Indexed {rebuild_index(args.backend, args.root, args.index)} contracts")
+    else:
+        index = CorpusIndex(args.index)
+        if args.command == "query":
+            optimization = None if args.optimization is None else args.optimization == "on"
+            rows = index.query(args.selector, args.event, args.pragma, args.compiler, optimization, args.version, args.limit)
+            for row in rows:
+                if args.json:
+                    print(json.dumps(row))
+                else:
+                    print(f"{row['address']} {row['version_folder']} {row['pragma']} {row['compiler_version']} optimization={row['optimization']}")
+            if not args.json:
+                print(f"{len(rows)} contracts")
+        elif args.command == "show":
+            functions, events = index.signatures(args.address)
+            for s in functions:
+                print(f"function {selector_of(s)} {s}")
+            for s in events:
+                print(f"event {s}")
+        elif args.command == "stats":
+            print(", ".join(f"{name}: {count}" for name, count in index.stats().items()))
+        index.close()
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import threading
+from config import COUNTER_LIMIT
+
+DEFAULT_COUNTER_PATH = "contracts/counters.db"
+
+
+class SaveCounter:
+    """
+    Contratti salvati per cartella di versione, condivisi dai thread del
+    processo. reserve() controlla il limite e prenota il posto in un solo
+    passo; se il salvataggio non avviene il posto torna libero con release().
+    :param limits: Limite per versione (COUNTER_LIMIT)
+    """
+    def __init__(self, limits=COUNTER_LIMIT):
+        self.limits = limits
+        self.lock = threading.Lock()
+        self.counts = dict.fromkeys(limits, 0)
+
+    def reserve(self, version_folder):
+        """
+        :return: False se il bucket è già pieno
+        """
+        with self.lock:
+            if self.counts[version_folder] >= self.limits[version_folder]:
+                return False
+            self.counts[version_folder] += 1
+            return True
+
+    def release(self, version_folder):
+        with self.lock:
+            self.counts[version_folder] -= 1
+
+    def __getitem__(self, version_folder):
+        return self.counts[version_folder]
+
+    def close(self):
+        pass
+
+
+class StoreCounter:
+    """
+    Stessa interfaccia di SaveCounter, con i conteggi su SQLite accanto
+    all'output: i processi che scrivono nella stessa cartella contracts/
+    (worker del coordinatore) condividono un unico COUNTER_LIMIT.
+    La prenotazione è un UPDATE condizionato, atomico anche tra processi.
+    A differenza di SaveCounter i conteggi restano tra un'esecuzione e l'altra.
+    :param path: Percorso del file SQLite
+    """
+    def __init__(self, path=DEFAULT_COUNTER_PATH, limits=COUNTER_LIMIT):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.limits = limits
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS counters (version_folder TEXT PRIMARY KEY, count INTEGER)")
+            self.conn.executemany("INSERT OR IGNORE INTO counters VALUES (?, 0)", [(v,) for v in limits])
+
+    def reserve(self, version_folder):
+        with self.lock, self.conn:
+            return self.conn.execute(
+                "UPDATE counters SET count = count + 1 WHERE version_folder = ? AND count < ?",
+                (version_folder, self.limits[version_folder]),
+            ).rowcount == 1
+
+    def release(self, version_folder):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE counters SET count = count - 1 WHERE version_folder = ?", (version_folder,))
+
+    def __getitem__(self, version_folder):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT count FROM counters WHERE version_folder = ?", (version_folder,)
+            ).fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_counter = None
+_counter_lock = threading.Lock()
+
+
+def configure_counter(path=None):
+    """
+    Sceglie il contatore dei salvataggi del processo.
+    :param path: File SQLite condiviso tra processi, None per il contatore in memoria
+    """
+    global _counter
+    with _counter_lock:
+        if _counter is not None:
+            _counter.close()
+        _counter = StoreCounter(path) if path else SaveCounter()
+        return _counter
+
+
+def get_counter():
+    global _counter
+    with _counter_lock:
+        if _counter is None:
+            _counter = SaveCounter()
+        return _counter
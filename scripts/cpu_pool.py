@@ -0,0 +1,166 @@
+import concurrent.futures
+import json
+import multiprocessing
+import threading
+import time
+from collections import defaultdict
+from scripts.utils import decode_constructor_args
+from scripts.metrics import inc
+
+DEFAULT_CPU_QUEUE_SIZE = 64
+
+
+def _timed(fn, args):
+    # Eseguita nel processo worker: restituisce anche il tempo CPU speso
+    started = time.process_time()
+    result = fn(*args)
+    return result, time.process_time() - started
+
+
+def decode_contract(abi, constructor_arguments):
+    """
+    Parsing dell'ABI e decodifica degli argomenti del costruttore in un solo
+    task, così l'ABI attraversa il confine tra processi una volta sola.
+    :return: (ABI come lista, argomenti decodificati)
+    """
+    try:
+        abi = json.loads(abi)
+    except json.JSONDecodeError:
+        # Come dispatcher.save: un ABI non valido non blocca il salvataggio
+        abi = []
+    return abi, decode_constructor_args(abi, constructor_arguments)
+
+
+class CpuPool:
+    """
+    Esegue il lavoro CPU-bound (json.loads, decodifica eth_abi) in un
+    ProcessPoolExecutor, così i thread di I/O non competono per il GIL.
+    Al più `queue_size` task sono in attesa: oltre, il chiamante si blocca.
+    Con workers=0 i task girano nel thread chiamante, misurandone comunque il costo.
+    :param workers: Numero di processi
+    :param queue_size: Task in coda o in esecuzione al massimo
+    """
+    def __init__(self, workers=0, queue_size=DEFAULT_CPU_QUEUE_SIZE):
+        self.workers = workers
+        self.executor = None
+        if workers > 0:
+            # spawn: fork con thread di I/O già attivi può ereditare lock acquisiti
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        self.slots = threading.BoundedSemaphore(max(queue_size, 1))
+        self.lock = threading.Lock()
+        # Per task: [numero, secondi CPU, secondi di attesa nel thread chiamante]
+        self.timings = defaultdict(lambda: [0, 0.0, 0.0])
+
+    def submit(self, name, fn, *args):
+        """
+        Avvia fn(*args) nel pool senza attenderne il risultato, così il thread
+        di I/O può continuare (es. scaricare il bytecode) mentre il task gira.
+        Si blocca solo se `queue_size` task sono già in corso.
+        Con workers=0 il task viene eseguito subito nel thread chiamante.
+        :param name: Nome del task nel riepilogo
+        :return: Future con il risultato, da leggere con wait()
+        """
+        started = time.monotonic()
+        if self.executor is None:
+            future = concurrent.futures.Future()
+            cpu_started = time.thread_time()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            self._record(name, 1, time.thread_time() - cpu_started, time.monotonic() - started)
+            return future
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(_timed, fn, args)
+        except Exception:
+            self.slots.release()
+            raise
+        # Il tempo CPU è noto solo a task concluso
+        future.add_done_callback(lambda f: self._done(name, f))
+        self._record(name, 0, 0.0, time.monotonic() - started)
+        return future
+
+    def _done(self, name, future):
+        self.slots.release()
+        cpu_time = future.result()[1] if future.exception() is None else 0.0
+        self._record(name, 1, cpu_time, 0.0)
+
+    def wait(self, name, future):
+        """
+        :return: Il risultato del task; le eccezioni sono rilanciate
+        """
+        if self.executor is None:
+            return future.result()
+        started = time.monotonic()
+        try:
+            return future.result()[0]
+        finally:
+            self._record(name, 0, 0.0, time.monotonic() - started)
+
+    def run(self, name, fn, *args):
+        """
+        Esegue fn(*args) e ne restituisce il risultato; le eccezioni sono rilanciate.
+        """
+        return self.wait(name, self.submit(name, fn, *args))
+
+    def _record(self, name, count, cpu_time, wall_time):
+        with self.lock:
+            timing = self.timings[name]
+            timing[0] += count
+            timing[1] += cpu_time
+            timing[2] += wall_time
+        if cpu_time:
+            inc("miner_cpu_task_seconds_total", cpu_time, task=name)
+        if wall_time:
+            inc("miner_cpu_task_wait_seconds_total", wall_time, task=name)
+
+    def print_summary(self):
+        where = f"{self.workers} worker processes" if self.executor is not None else "I/O threads"
+        print(f"CPU tasks (on {where}):")
+        with self.lock:
+            for name, (count, cpu_time, wall_time) in sorted(self.timings.items()):
+                print(f"  {name}: {count} tasks, {cpu_time:.2f}s CPU, {wall_time:.2f}s waited by I/O threads")
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configure_cpu_pool(workers=0, queue_size=DEFAULT_CPU_QUEUE_SIZE):
+    """
+    Sceglie dove eseguire i task CPU-bound della pipeline.
+    :param workers: 0 per restare nei thread di I/O
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = CpuPool(workers, queue_size)
+        return _pool
+
+
+def get_cpu_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = CpuPool()
+        return _pool
+
+
+def run_cpu(name, fn, *args):
+    return get_cpu_pool().run(name, fn, *args)
+
+
+def submit_cpu(name, fn, *args):
+    return get_cpu_pool().submit(name, fn, *args)
+
+
+def wait_cpu(name, future):
+    return get_cpu_pool().wait(name, future)
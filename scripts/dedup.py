@@ -0,0 +1,139 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+DEFAULT_DEDUP_PATH = "contracts/dedup.db"
+
+
+def strip_metadata(runtime_bytecode: str) -> bytes:
+    """
+    Rimuove dal runtime bytecode i metadati CBOR aggiunti da solc (hash IPFS/
+    bzzr del sorgente e versione del compilatore), che cambiano anche tra
+    contratti altrimenti identici.
+    :param runtime_bytecode: Bytecode esadecimale, con o senza 0x
+    :return: Bytecode normalizzato
+    """
+    code = bytes.fromhex(runtime_bytecode[2:] if runtime_bytecode.startswith("0x") else runtime_bytecode)
+    if len(code) < 2:
+        return code
+    # Gli ultimi 2 byte contengono la lunghezza della mappa CBOR che li precede
+    length = int.from_bytes(code[-2:], "big")
+    start = len(code) - 2 - length
+    if 0 <= start < len(code) - 2 and 0xa1 <= code[start] <= 0xa7:
+        return code[:start]
+    return code
+
+
+def runtime_hash(runtime_bytecode: str) -> str:
+    return hashlib.sha256(strip_metadata(runtime_bytecode)).hexdigest()
+
+
+def source_hash(source_code: str) -> str:
+    # Differenze di soli fine riga e spazi finali non rendono il sorgente diverso
+    normalized = "\n".join(line.rstrip() for line in source_code.strip().splitlines())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class DedupIndex:
+    """
+    Indice degli artefatti già salvati per hash del runtime bytecode
+    normalizzato e del sorgente. I cloni sono registrati come riferimento
+    al contratto canonico invece di essere scaricati e salvati di nuovo.
+    Anche i runtime dei contratti scartati sono ricordati con il motivo,
+    così i loro cloni vengono scartati senza chiedere i metadati.
+    :param path: Percorso del file SQLite
+    """
+    def __init__(self, path=DEFAULT_DEDUP_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        # Rende atomici controllo e registrazione durante il salvataggio
+        self.save_lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS runtime_hashes (hash TEXT PRIMARY KEY, address TEXT)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS source_hashes (hash TEXT PRIMARY KEY, address TEXT)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS duplicates ("
+                " address TEXT PRIMARY KEY,"
+                " canonical TEXT,"
+                " kind TEXT,"
+                " block_number INTEGER)"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS rejected_runtime (hash TEXT PRIMARY KEY, address TEXT, reason TEXT)")
+
+    def _find(self, table, value):
+        with self.lock:
+            row = self.conn.execute(f"SELECT address FROM {table} WHERE hash = ?", (value,)).fetchone()
+        return row[0] if row else None
+
+    def find_runtime(self, runtime_bytecode):
+        """
+        :return: Indirizzo del contratto canonico con lo stesso runtime, oppure None
+        """
+        return self._find("runtime_hashes", runtime_hash(runtime_bytecode))
+
+    def find_source(self, source_code):
+        return self._find("source_hashes", source_hash(source_code))
+
+    def register(self, contract_address, runtime_bytecode, source_code):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO runtime_hashes VALUES (?, ?)",
+                (runtime_hash(runtime_bytecode), contract_address),
+            )
+            self.conn.execute(
+                "INSERT OR IGNORE INTO source_hashes VALUES (?, ?)",
+                (source_hash(source_code), contract_address),
+            )
+
+    def add_rejected(self, contract_address, runtime_bytecode, reason):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO rejected_runtime VALUES (?, ?, ?)",
+                (runtime_hash(runtime_bytecode), contract_address, reason),
+            )
+
+    def find_rejected(self, runtime_bytecode):
+        """
+        :return: (indirizzo, motivo) del primo contratto scartato con lo stesso runtime, oppure None
+        """
+        with self.lock:
+            return self.conn.execute(
+                "SELECT address, reason FROM rejected_runtime WHERE hash = ?", (runtime_hash(runtime_bytecode),)
+            ).fetchone()
+
+    def add_duplicate(self, contract_address, canonical, kind, block_number=None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO duplicates VALUES (?, ?, ?, ?)",
+                (contract_address, canonical, kind, block_number),
+            )
+
+    def duplicates_of(self, canonical):
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                "SELECT address FROM duplicates WHERE canonical = ? ORDER BY block_number", (canonical,)
+            )]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_dedup = None
+
+
+def configure_dedup(path=DEFAULT_DEDUP_PATH):
+    """
+    Attiva l'indice dei duplicati usato dalle pipeline create in seguito.
+    """
+    global _dedup
+    _dedup = DedupIndex(path)
+    return _dedup
+
+
+def get_dedup():
+    # None se la deduplicazione non è stata attivata con --dedup
+    return _dedup
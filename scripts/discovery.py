@@ -0,0 +1,236 @@
+import concurrent.futures
+import csv
+import logging
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from scripts.client_etherscan import EtherscanClient
+from scripts.client_web3 import Web3Client
+from scripts.block_source import NodeBlockSource, iter_batches
+from scripts.checkpoint import ProgressJournal, plan_ranges
+from scripts.contract_address import compute_contract_address
+from scripts.dispatcher import is_already_saved
+from scripts.pipeline import Candidate
+from scripts.work_queue import BlockQueue
+
+DEFAULT_CANDIDATES_PATH = "contracts/candidates.db"
+DISCOVERY_MODES = ("scan", "import")
+LOOKUP_PAGE_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+# Nomi di colonna accettati nei file importati
+ADDRESS_COLUMNS = ("contract_address", "address", "receipt_contract_address")
+BLOCK_COLUMNS = ("block_number", "block", "blockNumber")
+HASH_COLUMNS = ("tx_hash", "transaction_hash", "hash")
+
+
+class CandidateStore:
+    """
+    Insieme deduplicato dei deployment candidati (indirizzo, blocco,
+    transazione di creazione), con lo stato della richiesta getsourcecode.
+    :param path: Percorso del file SQLite
+    """
+    def __init__(self, path=DEFAULT_CANDIDATES_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS candidates ("
+                " address TEXT PRIMARY KEY,"
+                " block_number INTEGER,"
+                " tx_hash TEXT,"
+                " input TEXT,"
+                " looked_up INTEGER DEFAULT 0)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_looked_up ON candidates (looked_up, block_number)")
+
+    def add_many(self, rows):
+        """
+        :param rows: Lista di (indirizzo, blocco, hash, input); i duplicati sono ignorati
+        :return: Numero di candidati nuovi
+        """
+        with self.lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO candidates (address, block_number, tx_hash, input) VALUES (?, ?, ?, ?)",
+                [(address.lower(), block_number, tx_hash, tx_input) for address, block_number, tx_hash, tx_input in rows],
+            )
+            return self.conn.total_changes - before
+
+    def pending(self, limit=LOOKUP_PAGE_SIZE):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT address, block_number, tx_hash, input FROM candidates"
+                " WHERE looked_up = 0 ORDER BY block_number DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+
+    def mark_looked_up(self, address):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE candidates SET looked_up = 1 WHERE address = ?", (address,))
+
+    def counts(self):
+        with self.lock:
+            total, done = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(looked_up), 0) FROM candidates"
+            ).fetchone()
+        return total, done
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def _pick(row, columns):
+    for column in columns:
+        if row.get(column) not in (None, ""):
+            return row[column]
+    return None
+
+
+def read_candidates_file(path):
+    """
+    Legge un elenco di deployment da CSV o Parquet.
+    Colonne richieste: indirizzo del contratto, numero di blocco, hash della
+    transazione; "input" (creation bytecode) è facoltativa.
+    :return: Generatore di (indirizzo, blocco, hash, input)
+    """
+    if path.endswith(".parquet"):
+        # Import differito: pyarrow serve solo per i file Parquet
+        import pyarrow.parquet
+        yield from _parse_rows(pyarrow.parquet.read_table(path).to_pylist())
+    else:
+        with open(path, newline="") as file:
+            yield from _parse_rows(csv.DictReader(file))
+
+
+def _parse_rows(rows):
+    for row in rows:
+        address = _pick(row, ADDRESS_COLUMNS)
+        block_number = _pick(row, BLOCK_COLUMNS)
+        if address is None or block_number is None:
+            continue
+        if isinstance(block_number, str):
+            block_number = int(block_number, 16) if block_number.startswith("0x") else int(block_number)
+        yield address, block_number, _pick(row, HASH_COLUMNS), row.get("input") or None
+
+
+def import_candidates(store, path):
+    added, batch = 0, []
+    for row in read_candidates_file(path):
+        batch.append(row)
+        if len(batch) >= 10000:
+            added += store.add_many(batch)
+            batch = []
+    added += store.add_many(batch)
+    print(f"Imported {added} new candidates from {path}")
+
+
+def scan_chunks(block_queue, source, store, journal):
+    # Scansione dal nodo: solo le transazioni con to == null diventano candidati
+    worker = threading.current_thread().name
+    chunk = block_queue.next_chunk(worker)
+    while chunk is not None:
+        started = time.monotonic()
+        failed = []
+        for batch in iter_batches(chunk[0], chunk[1], source.batch_size):
+            try:
+                blocks = source.get_blocks(batch)
+                rows = [
+                    (compute_contract_address(tx["from"], int(tx["nonce"], 16)), block_number, tx["hash"], tx["input"])
+                    for block_number in batch
+                    for tx in blocks[block_number] or []
+                    if tx["to"] is None
+                ]
+                store.add_many(rows)
+                for block_number in batch:
+                    journal.mark_done(block_number, chunk[0], chunk[1])
+            except Exception as e:
+                logger.error(f"An error occurred in block {batch[0]}: {e}\n{traceback.format_exc()}")
+                failed.extend(batch)
+        block_queue.chunk_done(chunk, worker, time.monotonic() - started, failed)
+        chunk = block_queue.next_chunk(worker)
+
+
+def look_up_candidate(clientEth, clientWeb3, pipeline, store, row):
+    address, block_number, tx_hash, tx_input = row
+    try:
+        if is_already_saved(address):
+            logger.info(f"✗ Skipped {address}: already saved.")
+        else:
+            tx = {"hash": tx_hash, "input": tx_input}
+            pipeline.run(
+                Candidate(address, tx, block_number),
+                clientEth.get_contract_metadata,
+                clientWeb3.get_bytecode,
+                lambda h: clientWeb3.get_transaction_receipts([h])[h]
+            )
+        # Dopo lo stop il candidato potrebbe non essere stato controllato: resta in attesa
+        if not pipeline.quota.stopped.is_set():
+            store.mark_looked_up(address)
+    except Exception as e:
+        logger.error(f"An error occurred for candidate {address}: {e}")
+
+
+def look_up_candidates(store, pipeline, num_threads, rpc_batch_size):
+    """
+    Richiede getsourcecode una sola volta per ogni candidato non ancora
+    controllato, a pagine, con `num_threads` worker che condividono il rate limit.
+    """
+    clientEth = EtherscanClient()
+    clientWeb3 = Web3Client()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix="lookup") as executor:
+        page = store.pending()
+        while page:
+            # Creation bytecode mancante (file importati): una richiesta batch al nodo per pagina
+            missing = [row[2] for row in page if row[3] is None and row[2]]
+            inputs = {}
+            for start in range(0, len(missing), rpc_batch_size):
+                transactions = clientWeb3.get_transactions(missing[start:start + rpc_batch_size])
+                inputs.update({h: tx["input"] for h, tx in transactions.items() if tx})
+            page = [(a, b, h, i if i is not None else inputs.get(h)) for a, b, h, i in page]
+
+            list(executor.map(lambda row: look_up_candidate(clientEth, clientWeb3, pipeline, store, row), page))
+            total, done = store.counts()
+            logger.info(f"Looked up {done}/{total} candidates")
+            if pipeline.quota.stopped.is_set():
+                break
+            next_page = store.pending()
+            if [row[0] for row in next_page] == [row[0] for row in page]:
+                # Gli stessi candidati falliscono di nuovo: si riprova alla prossima esecuzione
+                break
+            page = next_page
+
+
+def run_discovery(mode, pipeline, start_block, end_block, num_threads, chunk_size, rpc_batch_size,
+                  candidates_file=None, candidates_path=DEFAULT_CANDIDATES_PATH, resume=False):
+    """
+    Modalità discovery: prima costruisce l'insieme dei deployment candidati
+    (scansione batch dal nodo oppure import da file), poi richiede getsourcecode
+    solo per quelli, così il budget Etherscan non si spende sui blocchi vuoti.
+    :param mode: "scan" oppure "import"
+    """
+    store = CandidateStore(candidates_path)
+    if mode == "import":
+        import_candidates(store, candidates_file)
+    else:
+        # Il registro dei blocchi scansionati vive nello stesso database dei candidati
+        journal = ProgressJournal(candidates_path)
+        ranges = plan_ranges(journal, start_block, end_block, resume)
+        block_queue = BlockQueue(ranges, chunk_size)
+        source = NodeBlockSource(Web3Client(), rpc_batch_size)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix="scan") as executor:
+            for future in [executor.submit(scan_chunks, block_queue, source, store, journal) for _ in range(num_threads)]:
+                future.result()
+        block_queue.print_summary()
+        journal.close()
+
+    total, done = store.counts()
+    print(f"Candidates: {total}, already looked up: {done}")
+    look_up_candidates(store, pipeline, num_threads, rpc_batch_size)
+    store.close()
@@ -1,10 +1,38 @@
-import re, os, json
+import json
+import logging
+import threading
 
 from scripts.utils import (
     get_pragma_from_code,
+    get_version_folder,
 )
+from scripts.metadata_store import get_store
+from scripts.artifact_sink import get_sink
+from scripts.corpus_index import get_index
+from scripts.metrics import inc
 from config import COUNTER_LIMIT
 
+logger = logging.getLogger(__name__)
+
+# I worker salvano in parallelo: contatori e logs.json vanno aggiornati in modo atomico
+_save_lock = threading.Lock()
+
+# Indirizzi già presenti in contracts/, caricati alla prima richiesta
+_saved_addresses = None
+
+
+def is_already_saved(contract_address: str) -> bool:
+    """
+    Controlla se il contratto è già stato salvato in una qualsiasi cartella
+    di versione, così da evitare la richiesta dei metadati.
+    :param contract_address: Indirizzo del contratto
+    :return: True se il file .sol esiste già, False altrimenti
+    """
+    global _saved_addresses
+    with _save_lock:
+        if _saved_addresses is None:
+            _saved_addresses = {address.lower() for address in get_sink().saved_addresses()}
+        return contract_address.lower() in _saved_addresses
 
 
 
@@ -17,13 +45,16 @@ def save(
     compiler_version: str,  # Versione del compilatore
     compiler_type: str,  # Tipo di compilatore
     optimization: str,  # Ottimizzazione
-    abi: str,  # ABI
+    abi,  # ABI, come stringa JSON o già decodificato
     constructor_arguments: str,  # Argomenti del costruttore
     constructor_arguments_decoded: str,  # Argomenti del costruttore decodificati
-    file_counter: dict  # Contatore dei file salvati
+    file_counter,  # Contatore dei file salvati (scripts.counter)
+    block_number: int = None,  # Blocco della transazione di creazione
+    pragma_version: str = None  # Pragma già estratta dal sorgente
 ):
     """
     Salva le infor in un file con relativo logs.
+    :return: True se il contratto è stato salvato
     """
     # if is_candidate(
     #     contract_address,
@@ -34,58 +65,58 @@ def save(
     #     library
     # ):  
 
-    pragma_version = get_pragma_from_code(source_code)
-    version = pragma_version.replace(".", "_")
-    # From 0_8_30 to 0_8
-    version_folder = "_".join(version.split("_")[:2])  # Es. 0_8
-    if file_counter[version_folder] < COUNTER_LIMIT[version_folder]:
-        file_counter[version_folder] += 1
-        # Creazione delle cartelle se non esistono
-        os.makedirs(f"contracts/{version_folder}/sourcecode", exist_ok=True)
-        os.makedirs(f"contracts/{version_folder}/runtime_bytecode", exist_ok=True)
-        os.makedirs(f"contracts/{version_folder}/creation_bytecode", exist_ok=True)
+    if pragma_version is None:
+        pragma_version = get_pragma_from_code(source_code)
+    version_folder = get_version_folder(pragma_version)  # Es. 0_8
+    with _save_lock:
+        # Controllo del limite e incremento in un solo passo (atomico anche tra processi con StoreCounter)
+        reserved = file_counter.reserve(version_folder)
+    if not reserved:
+        logger.info(f"✗ Skipped: Counter limit reached for {version_folder}. Max: {COUNTER_LIMIT[version_folder]}")
+        return False
+    # Salva sorgente e bytecode (tre file oppure shard) solo se non esistono. Fuori dal lock:
+    # con gli shard write attende il flush, che i worker in attesa condividono
+    try:
+        written = get_sink().write(version_folder, contract_address, source_code, runtime_bytecode, creation_bytecode)
+    except Exception:
+        # Writer degli shard fallito: il posto torna libero e l'errore arriva al worker
+        file_counter.release(version_folder)
+        raise
+    if not written:
+        # Nessun salvataggio: il posto prenotato torna libero
+        file_counter.release(version_folder)
+        logger.info(f"✗ Skipped: Source file already exists for {contract_address}")
+        return False
 
-        source_path = f"contracts/{version_folder}/sourcecode/{contract_address}.sol"
-        runtime_bytecode_path = f"contracts/{version_folder}/runtime_bytecode/{contract_address}.hex"
-        creation_bytecode_path = f"contracts/{version_folder}/creation_bytecode/{contract_address}.hex"
+    # La pipeline passa l'ABI già decodificato dal pool CPU
+    if isinstance(abi, str):
+        try:
+            abi = json.loads(abi)
+        except json.JSONDecodeError:
+            logger.warning("ABI non è un JSON valido.")
+            abi = []
 
-        # Salva il source code solo se non esiste
-        if not os.path.exists(source_path) and not os.path.exists(runtime_bytecode_path) and not os.path.exists(creation_bytecode_path):
-            with open(source_path, "w") as file:
-                file.write(source_code)
-            with open(runtime_bytecode_path, "w") as file:
-                file.write(runtime_bytecode)
-            with open(creation_bytecode_path, "w") as file:
-                file.write(creation_bytecode)
-            # Salvataggio su logs.json
-            logs_path = f"contracts/{version_folder}/logs.json"
-            if os.path.exists(logs_path):
-                with open(logs_path, "r") as file:
-                    logs = json.load(file)
-            else:
-                logs = {}
-            
-            try:
-                abi = json.loads(abi)
-            except json.JSONDecodeError:
-                print("ABI non è un JSON valido.")
-                abi = []
-            
-            logs[contract_address] = {
-                "pragma": pragma_version,
-                "compiler version": compiler_version,
-                "compiler type": compiler_type,
-                "optimization": optimization,
-                "abi": abi,
-                "constructor arguments": constructor_arguments,
-                "constructor arguments decoded": constructor_arguments_decoded,
-            }
+    # Salvataggio dei metadati sul backend configurato (append, O(1))
+    entry = {
+        "pragma": pragma_version,
+        "compiler version": compiler_version,
+        "compiler type": compiler_type,
+        "optimization": optimization,
+        "block number": block_number,
+        "abi": abi,
+        "constructor arguments": constructor_arguments,
+        "constructor arguments decoded": constructor_arguments_decoded,
+    }
+    with _save_lock:
+        get_store().add(version_folder, contract_address, entry)
+        # Indice per selettore, evento e compilatore (--index)
+        index = get_index()
+        if index is not None:
+            index.add(version_folder, contract_address, entry)
 
-            with open(logs_path, "w") as file:
-                json.dump(logs, file, indent=4)
+        if _saved_addresses is not None:
+            _saved_addresses.add(contract_address.lower())
+    inc("miner_saves_total", version=version_folder)
+    logger.info(f"✓ Saved: {contract_address}")
+    return True
 
-            print("✓ Saved:", contract_address)
-        else:
-            print(f"✗ Skipped: Source file already exists for {contract_address}")
-    else:
-        print(f"✗ Skipped: Counter limit reached for {version_folder}. Max: {COUNTER_LIMIT[version_folder]}")
\ No newline at end of file
@@ -0,0 +1,330 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from scripts.pipeline import Candidate
+from scripts.contract_address import is_empty_bytecode
+from scripts.work_queue import DEFAULT_CHUNK_SIZE
+from scripts.metrics import inc
+
+DEFAULT_FOLLOW_PATH = "contracts/follow.db"
+DEFAULT_CONFIRMATIONS = 12
+DEFAULT_POLL_INTERVAL = 12
+# Attese prima di ogni nuovo getsourcecode per un contratto non ancora verificato
+RETRY_DELAYS = (5 * 60, 15 * 60, 60 * 60, 4 * 60 * 60, 24 * 60 * 60)
+# Oltre questa profondità la ricerca del punto di fork si arrende
+MAX_REORG_DEPTH = 128
+
+logger = logging.getLogger(__name__)
+
+
+def _connect(path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class FollowState:
+    """
+    Hash dei blocchi già scansionati in modalità --follow: il confronto con
+    il parentHash del blocco successivo rivela un reorg più profondo delle
+    conferme attese. Il blocco più alto registrato è il punto di ripresa.
+    Registra anche il blocco di ogni contratto salvato: dopo un reorg quelli
+    dei blocchi scartati e non più presenti sulla catena sono segnati orfani.
+    :param path: Percorso del file SQLite
+    """
+    def __init__(self, path=DEFAULT_FOLLOW_PATH):
+        self.lock = threading.Lock()
+        self.conn = _connect(path)
+        with self.lock, self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS blocks (number INTEGER PRIMARY KEY, hash TEXT)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS saved ("
+                " address TEXT PRIMARY KEY,"
+                " block INTEGER,"
+                " version_folder TEXT,"
+                " orphaned INTEGER DEFAULT 0)"
+            )
+
+    def last_block(self):
+        with self.lock:
+            return self.conn.execute("SELECT MAX(number) FROM blocks").fetchone()[0]
+
+    def block_hash(self, block_number):
+        with self.lock:
+            row = self.conn.execute("SELECT hash FROM blocks WHERE number = ?", (block_number,)).fetchone()
+        return row[0] if row else None
+
+    def record(self, hashes):
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO blocks VALUES (?, ?)", hashes.items())
+            # Oltre la profondità massima di reorg gli hash e i contratti salvati non servono più
+            self.conn.execute("DELETE FROM blocks WHERE number < ?", (max(hashes) - MAX_REORG_DEPTH,))
+            self.conn.execute(
+                "DELETE FROM saved WHERE block < ? AND orphaned = 0", (max(hashes) - MAX_REORG_DEPTH,)
+            )
+
+    def forget_from(self, block_number):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM blocks WHERE number >= ?", (block_number,))
+
+    def record_save(self, candidate):
+        # Chiamata dalla pipeline dopo ogni salvataggio
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO saved VALUES (?, ?, ?, 0)",
+                (candidate.address, candidate.block_number, candidate.version_folder),
+            )
+
+    def saved_from(self, block_number):
+        """
+        :return: Lista di (indirizzo, blocco, cartella di versione) salvati da block_number in poi
+        """
+        with self.lock:
+            return self.conn.execute(
+                "SELECT address, block, version_folder FROM saved WHERE block >= ? AND orphaned = 0 ORDER BY block",
+                (block_number,),
+            ).fetchall()
+
+    def mark_orphaned(self, address):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE saved SET orphaned = 1 WHERE address = ?", (address,))
+
+    def orphaned(self):
+        """
+        :return: Lista di (indirizzo, blocco, cartella di versione) salvati da blocchi scartati da un reorg
+        """
+        with self.lock:
+            return self.conn.execute(
+                "SELECT address, block, version_folder FROM saved WHERE orphaned = 1 ORDER BY block"
+            ).fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class RetryQueue:
+    """
+    Contratti appena deployati e non ancora verificati su Etherscan: getsourcecode
+    viene ripetuto dopo attese crescenti (RETRY_DELAYS), poi il contratto è scartato.
+    La coda è su SQLite e sopravvive ai riavvii.
+    :param path: Percorso del file SQLite
+    """
+    def __init__(self, path=DEFAULT_FOLLOW_PATH):
+        self.lock = threading.Lock()
+        self.conn = _connect(path)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS retries ("
+                " address TEXT PRIMARY KEY,"
+                " block INTEGER,"
+                " tx_hash TEXT,"
+                " tx_input TEXT,"
+                " attempts INTEGER,"
+                " due REAL)"
+            )
+
+    def add(self, candidate):
+        # Un contratto già in coda mantiene il proprio calendario
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO retries VALUES (?, ?, ?, ?, 0, ?)",
+                (candidate.address, candidate.block_number, candidate.tx["hash"], candidate.tx.get("input"),
+                 time.time() + RETRY_DELAYS[0]),
+            )
+
+    def due(self):
+        """
+        :return: Lista di (indirizzo, blocco, hash, input, tentativi) da ricontrollare adesso
+        """
+        with self.lock:
+            return self.conn.execute(
+                "SELECT address, block, tx_hash, tx_input, attempts FROM retries WHERE due <= ? ORDER BY due",
+                (time.time(),),
+            ).fetchall()
+
+    def reschedule(self, address, attempts):
+        """
+        :return: False se i tentativi sono finiti e il contratto è stato rimosso
+        """
+        if attempts >= len(RETRY_DELAYS):
+            self.remove(address)
+            return False
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE retries SET attempts = ?, due = ? WHERE address = ?",
+                (attempts, time.time() + RETRY_DELAYS[attempts], address),
+            )
+        return True
+
+    def remove(self, address):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM retries WHERE address = ?", (address,))
+
+    def pending(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM retries").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class ChainHead:
+    """
+    Altezza della catena e hash dei blocchi, dal nodo (JSON-RPC batch) oppure
+    dal proxy di Etherscan, come i blocchi della sorgente scelta.
+    :param block_source: "etherscan" oppure "node"
+    """
+    def __init__(self, block_source, clientEth, clientWeb3):
+        self.block_source = block_source
+        self.clientEth = clientEth
+        self.clientWeb3 = clientWeb3
+
+    def block_number(self):
+        if self.block_source == "node":
+            return self.clientWeb3.get_block_number()
+        return self.clientEth.get_last_block()
+
+    def headers(self, block_numbers):
+        """
+        :return: Dizionario {numero_blocco: blocco con hash e parentHash}
+        """
+        if self.block_source == "node":
+            return self.clientWeb3.get_block_headers(block_numbers)
+        return {n: self.clientEth.get_block_header(n) for n in block_numbers}
+
+
+def find_fork(state, head, block_number):
+    """
+    Risale dai blocchi registrati fino all'ultimo il cui hash coincide
+    ancora con quello della catena.
+    :return: Primo blocco da scansionare di nuovo
+    """
+    n = block_number - 1
+    for _ in range(MAX_REORG_DEPTH):
+        recorded = state.block_hash(n)
+        if recorded is None or head.headers([n])[n]["hash"] == recorded:
+            break
+        n -= 1
+    return n + 1
+
+
+def check_orphans(state, clientWeb3, fork):
+    """
+    Dopo un reorg, i contratti salvati da blocchi a partire da `fork` senza più
+    codice sulla catena sono segnati orfani. Gli artefatti restano in contracts/:
+    l'elenco è in FollowState.orphaned().
+    :return: Numero di contratti segnati orfani
+    """
+    orphaned = 0
+    for address, block_number, version_folder in state.saved_from(fork):
+        # Una transazione riordinata può aver creato lo stesso contratto in un altro blocco
+        if is_empty_bytecode(clientWeb3.get_bytecode(address)):
+            state.mark_orphaned(address)
+            orphaned += 1
+            logger.warning(f"Contract {address} ({version_folder}) saved from orphaned block {block_number} is no longer on chain")
+    if orphaned:
+        inc("miner_orphaned_contracts_total", orphaned)
+    return orphaned
+
+
+def process_retries(pipeline, retries, clientEth, clientWeb3, source):
+    """
+    Ripete getsourcecode per i contratti in coda il cui turno è arrivato.
+    """
+    for address, block_number, tx_hash, tx_input, attempts in retries.due():
+        if pipeline.quota.stopped.is_set():
+            return
+        candidate = Candidate(address, {"hash": tx_hash, "input": tx_input}, block_number)
+        try:
+            pipeline.run(
+                candidate,
+                # La risposta "non verificato" in cache è proprio quella da ricontrollare
+                lambda a: clientEth.get_contract_metadata(a, fresh=True),
+                clientWeb3.get_bytecode,
+                lambda h: source.get_transaction_receipts([h])[h]
+            )
+        except Exception as e:
+            logger.error(f"An error occurred while retrying {address}: {e}")
+            continue
+        if pipeline.quota.stopped.is_set():
+            # Il contratto potrebbe non essere stato ricontrollato: resta in coda
+            return
+        if candidate.rejected == "source not verified":
+            if retries.reschedule(address, attempts + 1):
+                inc("miner_verification_retries_total", result="rescheduled")
+            else:
+                inc("miner_verification_retries_total", result="gave up")
+                logger.info(f"✗ Gave up on {address}: still not verified after {attempts + 1} retries.")
+        else:
+            inc("miner_verification_retries_total", result="checked")
+            retries.remove(address)
+
+
+def run_follow(pipeline, scan_range, head, state, retries, clientEth, clientWeb3, source, start_block,
+               confirmations=DEFAULT_CONFIRMATIONS, poll_interval=DEFAULT_POLL_INTERVAL, step=DEFAULT_CHUNK_SIZE):
+    """
+    Segue la testa della catena: scansiona in avanti i blocchi con almeno
+    `confirmations` conferme, poi attende `poll_interval` secondi e ricontrolla
+    eth_blockNumber. Si ferma con Ctrl+C o quando la quota è esaurita.
+    :param scan_range: Funzione (start, end) -> None se l'esecuzione è stata fermata, altrimenti
+                       la lista dei blocchi dell'intervallo (all'indietro) falliti
+    :param start_block: Primo blocco se FollowState non ha un punto di ripresa, None per la testa attuale
+    :param step: Blocchi scansionati al più per ogni passo, durante il recupero del ritardo
+    """
+    last = state.last_block()
+    if last is not None:
+        next_block = last + 1
+    elif start_block is not None:
+        next_block = start_block
+    else:
+        next_block = head.block_number() - confirmations
+    logger.info(f"Following the chain from block {next_block} with {confirmations} confirmations")
+    try:
+        while not pipeline.quota.stopped.is_set():
+            try:
+                safe = head.block_number() - confirmations
+                if next_block <= safe:
+                    end = min(safe, next_block + step - 1)
+                    headers = head.headers(list(range(next_block, end + 1)))
+                    parent = state.block_hash(next_block - 1)
+                    if parent is not None and headers[next_block]["parentHash"] != parent:
+                        fork = find_fork(state, head, next_block)
+                        logger.warning(f"Reorg deeper than {confirmations} confirmations: rescanning from block {fork}")
+                        inc("miner_reorgs_total")
+                        # Prima di dimenticare gli hash: se il nodo non risponde il reorg è rilevato di nuovo
+                        check_orphans(state, clientWeb3, fork)
+                        state.forget_from(fork)
+                        next_block = fork
+                        continue
+                    if any(headers[n]["parentHash"] != headers[n - 1]["hash"] for n in range(next_block + 1, end + 1)):
+                        # Reorg durante il download delle intestazioni: si riprova al prossimo giro
+                        time.sleep(poll_interval)
+                        continue
+                    failed = scan_range(end, next_block)
+                    if failed is None:
+                        break
+                    if failed:
+                        # L'intervallo viene riscansionato al prossimo giro: i contratti già salvati sono saltati
+                        logger.warning(f"{len(failed)} blocks failed in {next_block}-{end}, retrying")
+                        time.sleep(poll_interval)
+                        continue
+                    state.record({n: headers[n]["hash"] for n in range(next_block, end + 1)})
+                    next_block = end + 1
+                process_retries(pipeline, retries, clientEth, clientWeb3, source)
+            except Exception as e:
+                # Nodo o Etherscan non raggiungibili: si riprova al prossimo giro
+                logger.error(f"An error occurred while following the chain: {e}")
+                safe = next_block - 1
+            if next_block > safe:
+                time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        logger.warning("Process interrupted by user.")
+    print(f"Followed the chain up to block {next_block - 1}, {retries.pending()} contracts waiting for verification")
+    orphaned = state.orphaned()
+    if orphaned:
+        print(f"{len(orphaned)} saved contracts were orphaned by reorgs: " + ", ".join(address for address, _, _ in orphaned))
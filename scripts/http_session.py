@@ -0,0 +1,78 @@
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from scripts.metrics import inc
+
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 0.5   # 0.5s, 1s, 2s, 4s, ...
+BACKOFF_MAX = 30
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+_pool_size = 10
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class JitterRetry(Retry):
+    """
+    Retry di urllib3 con jitter sul backoff esponenziale, così i thread
+    che ricevono lo stesso errore non ritentano tutti nello stesso istante.
+    """
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return backoff * random.uniform(0.5, 1.0) if backoff else backoff
+
+    def increment(self, *args, **kwargs):
+        # Tentativi ritentati dall'adapter, invisibili ai client
+        inc("miner_http_retries_total")
+        return super().increment(*args, **kwargs)
+
+
+def backoff_delay(attempt):
+    """
+    Attesa prima del tentativo `attempt` (da 0): backoff esponenziale con jitter.
+    :param attempt: Numero del tentativo fallito
+    :return: Secondi da attendere
+    """
+    return min(BACKOFF_MAX, BACKOFF_FACTOR * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def configure_pool(size):
+    """
+    Dimensiona i pool di connessioni keep-alive sul numero di worker.
+    Va chiamata prima di avviare i worker: le sessioni già create vengono chiuse.
+    :param size: Numero di connessioni per host
+    """
+    global _pool_size
+    with _sessions_lock:
+        _pool_size = max(1, size)
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def get_session(name, status_forcelist=RETRY_STATUS):
+    """
+    Restituisce la sessione HTTP condivisa dal processo per un servizio.
+    :param name: Nome del servizio (es. "etherscan", "web3")
+    :param status_forcelist: Status HTTP ritentati direttamente dall'adapter
+    :return: requests.Session con pool di connessioni e retry
+    """
+    with _sessions_lock:
+        if name not in _sessions:
+            retry = JitterRetry(
+                total=MAX_RETRIES,
+                backoff_factor=BACKOFF_FACTOR,
+                status_forcelist=status_forcelist,
+                allowed_methods=None,  # anche POST: le chiamate JSON-RPC sono idempotenti
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=_pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[name] = session
+        return _sessions[name]
@@ -0,0 +1,74 @@
+import itertools
+import threading
+import config
+from config import ETHERSCAN_API_KEY, INFURA_API_URL, INFURA_API_KEY
+
+
+class KeyPool:
+    """
+    Rotazione round robin su un insieme di API key o endpoint, condivisa
+    da tutti i thread del processo. Ogni API key Etherscan ha il proprio
+    token bucket: con N key il processo fa fino a N volte le chiamate al secondo.
+    :param keys: Lista non vuota di API key o URL
+    """
+    def __init__(self, keys):
+        self.keys = list(keys)
+        if not self.keys:
+            raise ValueError("Empty key pool")
+        self.lock = threading.Lock()
+        self.cycle = itertools.cycle(self.keys)
+
+    def next(self):
+        with self.lock:
+            return next(self.cycle)
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def load_pools(worker_id=None):
+    """
+    Legge da config.py le key del worker. In ordine di priorità:
+    WORKER_KEYS[worker_id] ({"etherscan": [...], "node": [...]}),
+    ETHERSCAN_API_KEYS e NODE_URLS, infine ETHERSCAN_API_KEY e INFURA_API_URL + INFURA_API_KEY.
+    :param worker_id: Identificativo del worker (--worker-id)
+    :return: (API key Etherscan, URL dei nodi)
+    """
+    worker_keys = getattr(config, "WORKER_KEYS", {}).get(worker_id, {}) if worker_id else {}
+    etherscan = worker_keys.get("etherscan") or getattr(config, "ETHERSCAN_API_KEYS", None) or [ETHERSCAN_API_KEY]
+    nodes = worker_keys.get("node") or getattr(config, "NODE_URLS", None) or [INFURA_API_URL + INFURA_API_KEY]
+    return etherscan, nodes
+
+
+_etherscan_pool = None
+_node_pool = None
+_pools_lock = threading.Lock()
+
+
+def configure_pools(worker_id=None):
+    """
+    Sceglie le key usate dai client creati senza una key esplicita.
+    :return: (pool Etherscan, pool dei nodi)
+    """
+    global _etherscan_pool, _node_pool
+    etherscan, nodes = load_pools(worker_id)
+    with _pools_lock:
+        _etherscan_pool = KeyPool(etherscan)
+        _node_pool = KeyPool(nodes)
+        return _etherscan_pool, _node_pool
+
+
+def etherscan_pool():
+    global _etherscan_pool
+    with _pools_lock:
+        if _etherscan_pool is None:
+            _etherscan_pool = KeyPool(load_pools()[0])
+        return _etherscan_pool
+
+
+def node_pool():
+    global _node_pool
+    with _pools_lock:
+        if _node_pool is None:
+            _node_pool = KeyPool(load_pools()[1])
+        return _node_pool
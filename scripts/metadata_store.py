@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+CONTRACTS_DIR = "contracts"
+BACKENDS = ("jsonl", "sqlite", "json")
+DEFAULT_BACKEND = "jsonl"
+
+
+def _json_default(value):
+    # Gli argomenti decodificati possono contenere bytes (es. bytes32)
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    return str(value)
+
+
+def to_json(value, **kwargs):
+    return json.dumps(value, default=_json_default, **kwargs)
+
+
+class JsonlStore:
+    """
+    Un file contracts/<versione>/logs.jsonl per versione, una riga per contratto.
+    Ogni salvataggio è un'append: il costo non dipende dai contratti già salvati.
+    Ogni riga è scritta con una sola write in O_APPEND, così più processi
+    possono aggiungere allo stesso file senza mescolare le righe.
+    """
+    def __init__(self, root=CONTRACTS_DIR):
+        self.root = root
+        self.lock = threading.Lock()
+
+    def _path(self, version_folder):
+        return f"{self.root}/{version_folder}/logs.jsonl"
+
+    def add(self, version_folder, contract_address, entry):
+        line = to_json({"address": contract_address, **entry}) + "\n"
+        os.makedirs(f"{self.root}/{version_folder}", exist_ok=True)
+        with self.lock:
+            fd = os.open(self._path(version_folder), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode())
+            finally:
+                os.close(fd)
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(v for v in os.listdir(self.root) if os.path.exists(self._path(v)))
+
+    def iter_entries(self, version_folder):
+        path = self._path(version_folder)
+        if not os.path.exists(path):
+            return
+        with open(path) as file:
+            for line in file:
+                # Un'interruzione può lasciare l'ultima riga troncata
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                yield entry.pop("address"), entry
+
+    def close(self):
+        pass
+
+
+class SqliteStore:
+    """
+    Un unico database contracts/metadata.db con indici su indirizzo, pragma,
+    versione del compilatore e numero di blocco.
+    """
+    COLUMNS = {
+        "pragma": "pragma",
+        "compiler version": "compiler_version",
+        "compiler type": "compiler_type",
+        "optimization": "optimization",
+        "block number": "block_number",
+        "abi": "abi",
+        "constructor arguments": "constructor_arguments",
+        "constructor arguments decoded": "constructor_arguments_decoded",
+    }
+    JSON_FIELDS = ("abi", "constructor arguments decoded")
+
+    def __init__(self, root=CONTRACTS_DIR):
+        os.makedirs(root, exist_ok=True)
+        self.lock = threading.Lock()
+        # Attesa generosa sui lock: il database può essere condiviso dai worker del coordinatore
+        self.conn = sqlite3.connect(f"{root}/metadata.db", timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS contracts ("
+                " address TEXT PRIMARY KEY,"
+                " version_folder TEXT,"
+                " pragma TEXT,"
+                " compiler_version TEXT,"
+                " compiler_type TEXT,"
+                " optimization TEXT,"
+                " block_number INTEGER,"
+                " abi TEXT,"
+                " constructor_arguments TEXT,"
+                " constructor_arguments_decoded TEXT)"
+            )
+            for column in ("version_folder", "pragma", "compiler_version", "block_number"):
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{column} ON contracts ({column})")
+
+    def add(self, version_folder, contract_address, entry):
+        values = {
+            column: to_json(entry.get(key)) if key in self.JSON_FIELDS else entry.get(key)
+            for key, column in self.COLUMNS.items()
+        }
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO contracts (address, version_folder, {', '.join(values)})"
+                f" VALUES (?, ?, {', '.join('?' for _ in values)})",
+                (contract_address, version_folder, *values.values()),
+            )
+
+    def versions(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT DISTINCT version_folder FROM contracts ORDER BY version_folder")
+            return [row[0] for row in rows]
+
+    def iter_entries(self, version_folder):
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT address, {', '.join(self.COLUMNS.values())} FROM contracts"
+                " WHERE version_folder = ? ORDER BY rowid",
+                (version_folder,),
+            ).fetchall()
+        for address, *values in rows:
+            entry = dict(zip(self.COLUMNS, values))
+            for key in self.JSON_FIELDS:
+                entry[key] = json.loads(entry[key]) if entry[key] is not None else None
+            yield address, entry
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class JsonStore:
+    """
+    Formato storico: rilegge e riscrive contracts/<versione>/logs.json a ogni
+    salvataggio. Costo O(n) per contratto, mantenuto solo per compatibilità.
+    """
+    def __init__(self, root=CONTRACTS_DIR):
+        self.root = root
+        self.lock = threading.Lock()
+
+    def add(self, version_folder, contract_address, entry):
+        logs_path = f"{self.root}/{version_folder}/logs.json"
+        os.makedirs(f"{self.root}/{version_folder}", exist_ok=True)
+        with self.lock:
+            if os.path.exists(logs_path):
+                with open(logs_path, "r") as file:
+                    logs = json.load(file)
+            else:
+                logs = {}
+            logs[contract_address] = {k: v for k, v in entry.items() if k != "block number"}
+            with open(logs_path, "w") as file:
+                file.write(to_json(logs, indent=4))
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(v for v in os.listdir(self.root) if os.path.exists(f"{self.root}/{v}/logs.json"))
+
+    def iter_entries(self, version_folder):
+        # Il file storico va letto per intero: usato solo per migrare i dati esistenti
+        with open(f"{self.root}/{version_folder}/logs.json") as file:
+            logs = json.load(file)
+        for address, entry in logs.items():
+            yield address, entry
+
+    def close(self):
+        pass
+
+
+def open_store(backend=DEFAULT_BACKEND, root=CONTRACTS_DIR):
+    if backend == "jsonl":
+        return JsonlStore(root)
+    if backend == "sqlite":
+        return SqliteStore(root)
+    if backend == "json":
+        return JsonStore(root)
+    raise ValueError(f"Unknown metadata store backend: {backend}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def configure_store(backend=DEFAULT_BACKEND, root=CONTRACTS_DIR):
+    """
+    Sceglie il backend usato da dispatcher.save per i metadati.
+    :param backend: "jsonl", "sqlite" oppure "json" (logs.json storico)
+    """
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+        _store = open_store(backend, root)
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = open_store(DEFAULT_BACKEND)
+        return _store
+
+
+def export_logs(backend, root=CONTRACTS_DIR):
+    """
+    Rigenera contracts/<versione>/logs.json nel formato storico a partire
+    dal backend indicato.
+    :param backend: "jsonl" oppure "sqlite"
+    :return: Numero di contratti esportati
+    """
+    store = open_store(backend, root)
+    exported = 0
+    for version_folder in store.versions():
+        logs = {}
+        for address, entry in store.iter_entries(version_folder):
+            entry.pop("block number", None)
+            logs[address] = entry
+        os.makedirs(f"{root}/{version_folder}", exist_ok=True)
+        with open(f"{root}/{version_folder}/logs.json", "w") as file:
+            file.write(to_json(logs, indent=4))
+        print(f"✓ Exported {len(logs)} contracts to {root}/{version_folder}/logs.json")
+        exported += len(logs)
+    store.close()
+    return exported
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the contract metadata store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Regenerate contracts/<version>/logs.json")
+    export_parser.add_argument("--backend", choices=["jsonl", "sqlite"], default=DEFAULT_BACKEND)
+    export_parser.add_argument("--root", default=CONTRACTS_DIR)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_logs(args.backend, args.root)
@@ -0,0 +1,201 @@
+import http.server
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+DEFAULT_METRICS_PORT = 9108
+DEFAULT_SNAPSHOT_INTERVAL = 10
+LOG_LEVELS = ("debug", "info", "warning", "error")
+DEFAULT_LOG_LEVEL = "info"
+# Estremi superiori (secondi) dei bucket degli istogrammi di latenza
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_name(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Metrics:
+    """
+    Contatori e istogrammi in memoria, condivisi da tutti i thread del processo,
+    esportabili in formato Prometheus o come snapshot JSON.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.counters = defaultdict(float)
+        # (nome, etichette) -> [conteggi per bucket..., +Inf, somma]
+        self.histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        with self.lock:
+            self.counters[(name, _labels_key(labels))] += amount
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(LATENCY_BUCKETS)] += 1
+            histogram[-1] += value
+
+    def value(self, name, **labels):
+        with self.lock:
+            return self.counters.get((name, _labels_key(labels)), 0)
+
+    def snapshot(self):
+        uptime = time.monotonic() - self.started
+        with self.lock:
+            counters = {_format_name(name, labels): value for (name, labels), value in sorted(self.counters.items())}
+            histograms = {
+                _format_name(name, labels): {
+                    "count": sum(histogram[:-1]),
+                    "sum": histogram[-1],
+                    "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], histogram[:-1])),
+                }
+                for (name, labels), histogram in sorted(self.histograms.items())
+            }
+        return {
+            "time": time.time(),
+            "uptime seconds": uptime,
+            "counters": counters,
+            # Medie dall'avvio, per chi legge lo snapshot senza Prometheus
+            "rates per second": {name: value / uptime for name, value in counters.items()} if uptime else {},
+            "histograms": histograms,
+        }
+
+    def render_prometheus(self):
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{_format_name(name, labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], histogram[:-1]):
+                    cumulative += count
+                    lines.append(f"{_format_name(name + '_bucket', labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{_format_name(name + '_sum', labels)} {histogram[-1]}")
+                lines.append(f"{_format_name(name + '_count', labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def inc(name, amount=1, **labels):
+    metrics.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    metrics.observe(name, value, **labels)
+
+
+def observe_call(service, endpoint, seconds):
+    """
+    Registra una richiesta HTTP verso Etherscan o il nodo.
+    :param service: "etherscan" oppure "node"
+    :param endpoint: Azione Etherscan o metodo JSON-RPC
+    """
+    metrics.inc("miner_api_calls_total", service=service, endpoint=endpoint)
+    metrics.observe("miner_api_latency_seconds", seconds, service=service, endpoint=endpoint)
+
+
+def rpc_endpoint(calls):
+    # Un batch JSON-RPC è etichettato con il metodo se tutte le chiamate lo condividono
+    methods = {method for method, _ in calls}
+    return f"batch:{methods.pop()}" if len(methods) == 1 else "batch"
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = metrics.render_prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(metrics.snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Le richieste dello scraper non finiscono sullo stdout del miner
+        pass
+
+
+def start_http_server(port=DEFAULT_METRICS_PORT, host="127.0.0.1"):
+    """
+    Espone /metrics (formato Prometheus) e /metrics.json su un thread in background.
+    """
+    server = http.server.ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_snapshot(path):
+    # Scrittura atomica: chi legge il file non vede mai uno snapshot a metà
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as file:
+        json.dump(metrics.snapshot(), file, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def start_snapshot_writer(path, interval=DEFAULT_SNAPSHOT_INTERVAL):
+    """
+    Riscrive lo snapshot JSON ogni `interval` secondi fino a stop.set().
+    :return: threading.Event per fermare il writer
+    """
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            write_snapshot(path)
+
+    threading.Thread(target=loop, name="metrics-snapshot", daemon=True).start()
+    return stop
+
+
+def print_profile():
+    """
+    Tempi per stadio della pipeline (wall e CPU del thread), per task del
+    pool CPU e per endpoint, raccolti durante l'esecuzione.
+    """
+    uptime = time.monotonic() - metrics.started
+    print(f"Profile: {uptime:.1f}s wall, {time.process_time():.1f}s CPU in the main process")
+    with metrics.lock:
+        histograms = dict(metrics.histograms)
+        counters = dict(metrics.counters)
+    print("  Pipeline stages (wall / CPU on I/O threads):")
+    for (name, labels), histogram in sorted(histograms.items()):
+        if name == "miner_stage_seconds":
+            stage = dict(labels)["stage"]
+            cpu = counters.get(("miner_stage_cpu_seconds_total", labels), 0)
+            print(f"    {stage}: {sum(histogram[:-1])} runs, {histogram[-1]:.2f}s wall, {cpu:.2f}s CPU")
+    print("  CPU tasks (CPU / waited):")
+    for (name, labels), value in sorted(counters.items()):
+        if name == "miner_cpu_task_seconds_total":
+            waited = counters.get(("miner_cpu_task_wait_seconds_total", labels), 0)
+            print(f"    {dict(labels)['task']}: {value:.2f}s CPU, {waited:.2f}s waited")
+    print("  API endpoints (calls / total latency / mean):")
+    for (name, labels), histogram in sorted(histograms.items()):
+        if name == "miner_api_latency_seconds":
+            labels = dict(labels)
+            count = sum(histogram[:-1])
+            print(f"    {labels['service']} {labels['endpoint']}: {count} calls, {histogram[-1]:.2f}s, {histogram[-1] / count * 1000:.0f} ms")
@@ -0,0 +1,365 @@
+import logging
+import threading
+import time
+from collections import Counter
+from config import COUNTER_LIMIT
+from scripts.utils import (
+    get_pragma_from_code,
+    get_version_folder,
+    check_source_and_byte,
+    is_same_version,
+    isLibraryEmpty,
+    isAbiAvailable,
+)
+from scripts.dispatcher import save
+from scripts.contract_address import is_empty_bytecode, is_reverted
+from scripts.dedup import get_dedup
+from scripts.cpu_pool import get_cpu_pool, submit_cpu, wait_cpu, decode_contract
+from scripts.metrics import inc, observe
+from scripts.quota import Quota
+from scripts.client_etherscan import BudgetExhausted
+
+logger = logging.getLogger(__name__)
+
+# Versione esclusa dal mining (es. "0_8")
+VERSION_TO_SKIP = "0_8"
+
+# Scarti che valgono per ogni clone con lo stesso runtime (Etherscan verifica i cloni
+# con lo stesso sorgente); "source not verified" o "bucket full" possono cambiare
+CLONE_REJECTIONS = frozenset({
+    "pragma missing",
+    "version skipped",
+    "version not tracked",
+    "proxy",
+    "multi-file source",
+    "library",
+    "abi missing",
+    "compiler mismatch",
+})
+
+
+class Candidate:
+    """
+    Stato di un contratto lungo la pipeline: i valori ricavati da uno stadio
+    (pragma, cartella di versione, bytecode, ...) restano disponibili ai
+    successivi senza essere ricalcolati.
+    """
+    def __init__(self, contract_address, tx, block_number, metadata=None, tx_receipt=None):
+        self.address = contract_address
+        self.tx = tx
+        self.block_number = block_number
+        self.tx_receipt = tx_receipt
+        self.pragma_version = None
+        self.version_folder = None
+        self.runtime_bytecode = None
+        self.abi = None
+        self.constructor_arguments_decoded = None
+        # Decodifica già avviata nel pool CPU (Future), None se non ancora richiesta
+        self.decoding = None
+        # Motivo dello scarto, None se il contratto non è stato scartato
+        self.rejected = None
+        self.set_metadata(metadata)
+
+    def set_metadata(self, metadata):
+        # Con la deduplicazione i metadati arrivano dopo il bytecode
+        self.metadata = metadata
+        self.source_code = metadata["SourceCode"] if metadata else None
+
+
+class Stage:
+    """
+    Uno stadio della pipeline: `check` restituisce True se il contratto
+    passa allo stadio successivo, altrimenti chiama `reject` con il motivo.
+    """
+    name = "stage"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.passed = 0
+        self.rejections = Counter()
+        self.seconds = 0.0
+
+    def check(self, candidate):
+        raise NotImplementedError
+
+    def reject(self, candidate, reason, message=None):
+        # message=None quando il controllo in scripts/utils ha già stampato il motivo
+        if message is not None:
+            logger.info(f"✗ Skipped {candidate.address}: {message}")
+        candidate.rejected = reason
+        with self.lock:
+            self.rejections[reason] += 1
+        inc("miner_rejections_total", stage=self.name, reason=reason)
+        return False
+
+    def run(self, candidate):
+        started, cpu_started = time.monotonic(), time.thread_time()
+        passed = self.check(candidate)
+        elapsed = time.monotonic() - started
+        with self.lock:
+            self.seconds += elapsed
+            if passed:
+                self.passed += 1
+        observe("miner_stage_seconds", elapsed, stage=self.name)
+        inc("miner_stage_cpu_seconds_total", time.thread_time() - cpu_started, stage=self.name)
+        return passed
+
+
+class RuntimeDuplicateFilter(Stage):
+    """Runtime bytecode identico a un contratto già salvato o scartato: getsourcecode non serve."""
+    name = "duplicate runtime"
+
+    def __init__(self, dedup):
+        super().__init__()
+        self.dedup = dedup
+
+    def check(self, candidate):
+        # Un indirizzo senza codice non è un clone di nulla
+        if is_empty_bytecode(candidate.runtime_bytecode):
+            return True
+        canonical = self.dedup.find_runtime(candidate.runtime_bytecode)
+        if canonical is not None and canonical != candidate.address:
+            self.dedup.add_duplicate(candidate.address, canonical, "runtime", candidate.block_number)
+            return self.reject(candidate, "duplicate runtime", f"same runtime bytecode as {canonical}.")
+        rejected = self.dedup.find_rejected(candidate.runtime_bytecode)
+        if rejected is not None and rejected[0] != candidate.address:
+            self.dedup.add_duplicate(candidate.address, rejected[0], "rejected", candidate.block_number)
+            return self.reject(
+                candidate, "clone of rejected", f"same runtime bytecode as {rejected[0]}, rejected: {rejected[1]}."
+            )
+        return True
+
+
+class VersionFilter(Stage):
+    """Pragma estratta una sola volta, versione esclusa, bucket non previsti o già pieni."""
+    name = "version"
+
+    def __init__(self, quota):
+        super().__init__()
+        self.quota = quota
+
+    def check(self, candidate):
+        if candidate.metadata is None:
+            return self.reject(candidate, "metadata unavailable", "metadata not available.")
+        if not candidate.source_code:
+            return self.reject(candidate, "source not verified")
+        # Una sola regex: nel pool CPU costerebbe più il passaggio del sorgente tra processi
+        candidate.pragma_version = get_pragma_from_code(candidate.source_code)
+        if candidate.pragma_version is None:
+            return self.reject(candidate, "pragma missing", "pragma solidity not found.")
+        candidate.version_folder = get_version_folder(candidate.pragma_version)
+        if candidate.version_folder == VERSION_TO_SKIP:
+            logger.info(f"✗ Skipped version: {VERSION_TO_SKIP}")
+            return self.reject(candidate, "version skipped")
+        if candidate.version_folder not in COUNTER_LIMIT:
+            return self.reject(candidate, "version not tracked", f"version {candidate.version_folder} not in COUNTER_LIMIT.")
+        # Il bytecode di un contratto che non verrebbe salvato non va scaricato
+        if self.quota.is_full(candidate.version_folder):
+            return self.reject(candidate, "bucket full", f"bucket {candidate.version_folder} is full.")
+        return True
+
+
+class MetadataFilter(Stage):
+    """Controlli sui soli metadati di Etherscan: proxy, sorgente multi-file, librerie, ABI, compilatore."""
+    name = "metadata"
+
+    def check(self, candidate):
+        metadata = candidate.metadata
+        if metadata["Proxy"] == "1":
+            return self.reject(candidate, "proxy", f"Proxy contract detected. Proxy: {metadata['Proxy']}")
+        if candidate.source_code.strip().startswith('{'):
+            return self.reject(candidate, "multi-file source", "Source code import external file or library.")
+        if not isLibraryEmpty(metadata["Library"], candidate.address):
+            return self.reject(candidate, "library")
+        if not isAbiAvailable(metadata["ABI"], candidate.address):
+            return self.reject(candidate, "abi missing")
+        if not is_same_version(
+                candidate.source_code,
+                metadata["CompilerVersion"],
+                candidate.address,
+                candidate.pragma_version):
+            return self.reject(candidate, "compiler mismatch")
+        return True
+
+
+class SourceDuplicateFilter(Stage):
+    """Sorgente identico a un contratto già salvato (es. stesso codice compilato con altre opzioni)."""
+    name = "duplicate source"
+
+    def __init__(self, dedup):
+        super().__init__()
+        self.dedup = dedup
+
+    def check(self, candidate):
+        canonical = self.dedup.find_source(candidate.source_code)
+        if canonical is not None and canonical != candidate.address:
+            self.dedup.add_duplicate(candidate.address, canonical, "source", candidate.block_number)
+            return self.reject(candidate, "duplicate source", f"same source code as {canonical}.")
+        return True
+
+
+class BytecodeCheck(Stage):
+    """Verifiche sul bytecode, scaricato solo per i contratti che hanno superato i filtri."""
+    name = "bytecode"
+
+    def check(self, candidate):
+        if is_empty_bytecode(candidate.runtime_bytecode) and is_reverted(candidate.tx_receipt):
+            return self.reject(candidate, "deployment reverted", "deployment reverted.")
+        if not check_source_and_byte(
+                candidate.source_code,
+                candidate.runtime_bytecode,
+                candidate.tx["input"],
+                candidate.address):
+            return self.reject(candidate, "bytecode missing")
+        if not candidate.tx.get("input"):
+            # Possibile solo per i candidati importati senza hash della transazione
+            return self.reject(candidate, "creation bytecode missing", "creation bytecode missing.")
+        return True
+
+
+class ConstructorDecode(Stage):
+    """Parsing dell'ABI e decodifica degli argomenti del costruttore, l'ultimo passo prima del salvataggio."""
+    name = "constructor"
+
+    def check(self, candidate):
+        try:
+            if candidate.decoding is None:
+                candidate.decoding = start_decode(candidate)
+            candidate.abi, candidate.constructor_arguments_decoded = wait_cpu("constructor", candidate.decoding)
+        except Exception as e:
+            return self.reject(candidate, "constructor decode failed", f"constructor arguments not decodable: {e}")
+        return True
+
+
+def start_decode(candidate):
+    return submit_cpu("constructor", decode_contract, candidate.metadata["ABI"], candidate.metadata["ConstructorArguments"])
+
+
+class ContractPipeline:
+    """
+    Stadi ordinati dal più economico al più costoso: i filtri sui metadati
+    non fanno I/O, eth_getCode viene chiamato solo per i contratti che li
+    superano, la decodifica del costruttore solo prima del salvataggio.
+    Con la deduplicazione attiva (scripts.dedup.configure_dedup) il bytecode
+    è invece scaricato per primo: una chiamata al nodo costa meno di una
+    getsourcecode, che viene saltata per i cloni di contratti già salvati.
+    :param file_counter: Contatore dei file salvati per versione
+    :param max_calls: Budget di chiamate Etherscan dell'esecuzione, None per nessun limite
+    :param retries: Coda in cui rimettere i contratti non ancora verificati (--follow), None per scartarli
+    :param follow_state: FollowState in cui registrare il blocco dei contratti salvati (--follow), None per nessuno
+    """
+    def __init__(self, file_counter, max_calls=None, retries=None, follow_state=None):
+        self.file_counter = file_counter
+        self.retries = retries
+        self.follow_state = follow_state
+        self.quota = Quota(file_counter, max_calls, VERSION_TO_SKIP)
+        self.dedup = get_dedup()
+        self.duplicates = [RuntimeDuplicateFilter(self.dedup)] if self.dedup is not None else []
+        self.filters = [VersionFilter(self.quota), MetadataFilter()]
+        if self.dedup is not None:
+            self.filters.append(SourceDuplicateFilter(self.dedup))
+        self.checks = [BytecodeCheck(), ConstructorDecode()]
+        self.stages = self.duplicates + self.filters + self.checks
+
+    def deduplicate(self, candidate):
+        """
+        Controllo sul runtime bytecode, già in candidate.runtime_bytecode,
+        prima della richiesta dei metadati.
+        """
+        return all(stage.run(candidate) for stage in self.duplicates)
+
+    def prefilter(self, candidate):
+        # all() si ferma al primo stadio che scarta il contratto
+        if all(stage.run(candidate) for stage in self.filters):
+            if get_cpu_pool().workers > 0:
+                # La decodifica procede nei processi worker mentre il thread scarica il bytecode
+                candidate.decoding = start_decode(candidate)
+            return True
+        if (self.dedup is not None and candidate.runtime_bytecode is not None
+                and not is_empty_bytecode(candidate.runtime_bytecode) and candidate.rejected in CLONE_REJECTIONS):
+            self.dedup.add_rejected(candidate.address, candidate.runtime_bytecode, candidate.rejected)
+        # Un deployment recente può essere verificato su Etherscan dopo qualche minuto
+        if self.retries is not None and candidate.rejected == "source not verified":
+            self.retries.add(candidate)
+        return False
+
+    def finish(self, candidate):
+        """
+        Stadi successivi al download del bytecode e salvataggio.
+        """
+        if not all(stage.run(candidate) for stage in self.checks):
+            return
+        if self.dedup is None:
+            self._save(candidate)
+            return
+        # Due cloni elaborati in parallelo superano entrambi i filtri:
+        # controllo e registrazione atomici ne salvano uno solo
+        with self.dedup.save_lock:
+            canonical = self.dedup.find_runtime(candidate.runtime_bytecode) or self.dedup.find_source(candidate.source_code)
+            if canonical is not None and canonical != candidate.address:
+                self.dedup.add_duplicate(candidate.address, canonical, "save", candidate.block_number)
+                logger.info(f"✗ Skipped {candidate.address}: duplicate of {canonical}.")
+                return
+            if self._save(candidate):
+                self.dedup.register(candidate.address, candidate.runtime_bytecode, candidate.source_code)
+
+    def _save(self, candidate):
+        metadata = candidate.metadata
+        saved = save(
+            candidate.address,
+            candidate.source_code,
+            candidate.runtime_bytecode,
+            candidate.tx["input"],
+            metadata["CompilerVersion"],
+            metadata["CompilerType"],
+            metadata["OptimizationUsed"],
+            candidate.abi,
+            metadata["ConstructorArguments"],
+            candidate.constructor_arguments_decoded,
+            self.file_counter,
+            candidate.block_number,
+            candidate.pragma_version
+        )
+        # Un reorg può rendere orfano il contratto: run_follow lo controlla con il blocco registrato
+        if saved and self.follow_state is not None:
+            self.follow_state.record_save(candidate)
+        return saved
+
+    def run(self, candidate, fetch_metadata, fetch_bytecode, fetch_receipt):
+        """
+        Esegue l'intera pipeline con client sincroni.
+        :param fetch_metadata: Funzione indirizzo -> metadati di getsourcecode
+        :param fetch_bytecode: Funzione indirizzo -> runtime bytecode
+        :param fetch_receipt: Funzione hash -> ricevuta, usata solo se manca il codice
+        """
+        # Nessuna richiesta se i bucket sono pieni o il budget è esaurito
+        if not self.quota.check():
+            return
+        if self.dedup is not None:
+            candidate.runtime_bytecode = fetch_bytecode(candidate.address)
+            if not self.deduplicate(candidate):
+                return
+        try:
+            candidate.set_metadata(fetch_metadata(candidate.address))
+        except BudgetExhausted as e:
+            self.quota.stop(str(e))
+            return
+        if not self.prefilter(candidate):
+            return
+        if candidate.runtime_bytecode is None:
+            candidate.runtime_bytecode = fetch_bytecode(candidate.address)
+        if is_empty_bytecode(candidate.runtime_bytecode) and candidate.tx_receipt is None:
+            # Nessun codice all'indirizzo: il deployment potrebbe essere fallito
+            candidate.tx_receipt = fetch_receipt(candidate.tx["hash"])
+        self.finish(candidate)
+
+    def print_summary(self):
+        self.quota.print_summary()
+        print("Pipeline stages:")
+        for stage in self.stages:
+            with stage.lock:
+                rejected = ", ".join(f"{reason}: {count}" for reason, count in stage.rejections.most_common())
+                print(
+                    f"  {stage.name}: {stage.passed} passed" + (f", rejected ({rejected})" if rejected else "")
+                    + f", {stage.seconds:.2f}s"
+                )
@@ -0,0 +1,59 @@
+import logging
+import threading
+from config import COUNTER_LIMIT
+from scripts.client_etherscan import total_stats
+
+logger = logging.getLogger(__name__)
+
+
+class Quota:
+    """
+    Obiettivi dell'esecuzione: i bucket di COUNTER_LIMIT da riempire e il
+    budget di chiamate Etherscan. Quando tutti i bucket sono pieni o il
+    budget è esaurito l'esecuzione si ferma: i worker non prendono altri
+    chunk e i blocchi non completati restano da fare per --resume.
+    :param file_counter: Contatore dei file salvati per versione
+    :param max_calls: Chiamate Etherscan consentite, None per nessun limite
+    :param skip: Cartella di versione esclusa dal mining, che non va riempita
+    """
+    def __init__(self, file_counter, max_calls=None, skip=None):
+        self.file_counter = file_counter
+        self.max_calls = max_calls
+        # I bucket con limite 0 o esclusi non vanno mai riempiti
+        self.targets = [v for v, limit in COUNTER_LIMIT.items() if limit > 0 and v != skip]
+        self.stopped = threading.Event()
+        self.reason = None
+
+    def is_full(self, version_folder):
+        return self.file_counter[version_folder] >= COUNTER_LIMIT[version_folder]
+
+    def all_full(self):
+        return all(self.is_full(version_folder) for version_folder in self.targets)
+
+    def calls_used(self):
+        return total_stats()["requests issued"]
+
+    def check(self):
+        """
+        Da chiamare prima di ogni nuova richiesta dei metadati.
+        :return: False se l'esecuzione deve fermarsi
+        """
+        if self.stopped.is_set():
+            return False
+        if self.all_full():
+            self.stop("all COUNTER_LIMIT buckets are full")
+        elif self.max_calls is not None and self.calls_used() >= self.max_calls:
+            self.stop(f"--max-calls budget of {self.max_calls} Etherscan calls reached")
+        return not self.stopped.is_set()
+
+    def stop(self, reason):
+        if not self.stopped.is_set():
+            self.reason = reason
+            self.stopped.set()
+            logger.warning(f"Stopping: {reason}")
+
+    def print_summary(self):
+        filled = ", ".join(f"{v}: {self.file_counter[v]}/{COUNTER_LIMIT[v]}" for v in self.targets)
+        print(f"Buckets: {filled}")
+        if self.reason is not None:
+            print(f"Stopped early: {self.reason}")
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = "contracts/cache.db"
+DEFAULT_CACHE_SIZE_MB = 2048
+# Un blocco più vecchio di così è considerato finalizzato (2 epoche ≈ 13 minuti)
+FINALITY_SECONDS = 20 * 60
+# Un contratto non verificato può esserlo in seguito: la risposta scade
+UNVERIFIED_TTL = 24 * 60 * 60
+
+
+# Valore restituito da get() quando la risposta non è in cache
+MISS = object()
+
+
+class CacheMiss(Exception):
+    pass
+
+
+def cache_ttl(module, action, value):
+    """
+    Decide se e per quanto tempo una risposta può essere salvata in cache.
+    Solo le risposte immutabili sono salvate senza scadenza.
+    :param module: Modulo Etherscan, oppure "rpc" per le chiamate al nodo
+    :param action: Azione Etherscan o metodo JSON-RPC
+    :param value: Risposta da salvare
+    :return: None se non va salvata, 0 se non scade, altrimenti secondi di validità
+    """
+    # Le risposte del proxy Etherscan hanno il risultato JSON-RPC nel campo "result"
+    result = value.get("result") if module == "proxy" and isinstance(value, dict) else value
+    if action == "getsourcecode":
+        if value.get("status") != "1":
+            return None
+        return 0 if value["result"][0].get("SourceCode") else UNVERIFIED_TTL
+    if action == "eth_getBlockByNumber":
+        if not isinstance(result, dict) or "timestamp" not in result:
+            return None
+        return 0 if time.time() - int(result["timestamp"], 16) > FINALITY_SECONDS else None
+    if action == "eth_getTransactionReceipt":
+        return 0 if isinstance(result, dict) else None
+    if action == "eth_getTransactionByHash":
+        # Una transazione ancora in mempool non ha blockNumber
+        return 0 if isinstance(result, dict) and result.get("blockNumber") else None
+    if action == "eth_getCode":
+        return 0 if result not in (None, "", "0x") else None
+    return None
+
+
+class ResponseCache:
+    """
+    Cache persistente su SQLite delle risposte di Etherscan e del nodo,
+    indirizzata dall'hash di (modulo, azione, parametri).
+    Quando supera `max_bytes` elimina le voci usate meno di recente.
+    :param path: Percorso del file SQLite
+    :param max_bytes: Dimensione massima dei valori salvati
+    :param compress: Comprime i valori con zstd (richiede il pacchetto zstandard)
+    :param offline: Con True una voce mancante solleva CacheMiss invece di andare in rete
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_CACHE_SIZE_MB * 1024 * 1024,
+                 compress=False, offline=False):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.compressor = self.decompressor = None
+        if compress:
+            # Import differito: zstandard è una dipendenza opzionale
+            import zstandard
+            self.compressor = zstandard.ZstdCompressor()
+            self.decompressor = zstandard.ZstdDecompressor()
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.counters = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB,"
+                " codec TEXT,"
+                " size INTEGER,"
+                " expires REAL,"
+                " last_access REAL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)")
+            self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(module, action, params):
+        return hashlib.sha256(json.dumps([module, action, params], sort_keys=True).encode()).hexdigest()
+
+    def get(self, module, action, params):
+        """
+        :return: La risposta salvata, oppure MISS se manca o è scaduta
+        :raise CacheMiss: se la voce manca in modalità offline
+        """
+        key = self.make_key(module, action, params)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT value, codec, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            # Offline le voci scadute restano comunque utilizzabili
+            if row is None or (row[2] and row[2] < now and not self.offline):
+                self.counters["misses"] += 1
+                if self.offline:
+                    raise CacheMiss(f"{module}/{action} {params} not in cache (--cache-only)")
+                return MISS
+            with self.conn:
+                self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.counters["hits"] += 1
+        value, codec = row[0], row[1]
+        if codec == "zstd":
+            value = self.decompressor.decompress(value)
+        return json.loads(value)
+
+    def put(self, module, action, params, value):
+        ttl = cache_ttl(module, action, value)
+        if ttl is None:
+            return
+        key = self.make_key(module, action, params)
+        data = json.dumps(value).encode()
+        codec = "none"
+        if self.compressor is not None:
+            data, codec = self.compressor.compress(data), "zstd"
+        now = time.time()
+        with self.lock, self.conn:
+            old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, data, codec, len(data), now + ttl if ttl else None, now),
+            )
+            self.total_bytes += len(data) - (old[0] if old else 0)
+            self.counters["stored"] += 1
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Elimina le voci meno usate fino a scendere al 90% del limite
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            evicted.append((key,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self.counters["evicted"] += len(evicted)
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "bytes": self.total_bytes}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_cache = None
+
+
+def configure_cache(path=DEFAULT_CACHE_PATH, max_size_mb=DEFAULT_CACHE_SIZE_MB, compress=False, offline=False):
+    """
+    Attiva la cache condivisa dai client del processo.
+    """
+    global _cache
+    _cache = ResponseCache(path, max_size_mb * 1024 * 1024, compress, offline)
+    return _cache
+
+
+def get_cache():
+    # None se la cache non è stata attivata con --cache
+    return _cache
+
+
+def lookup(module, action, params):
+    """
+    Cerca una risposta nella cache condivisa.
+    :return: La risposta salvata, oppure MISS (anche con la cache disattivata)
+    """
+    if _cache is None:
+        return MISS
+    return _cache.get(module, action, params)
+
+
+def require_online(action):
+    """
+    Per le risposte che non vengono mai salvate (es. eth_blockNumber).
+    :raise CacheMiss: in modalità offline (--cache-only)
+    """
+    if _cache is not None and _cache.offline:
+        raise CacheMiss(f"{action} is never cached: pass --start-block with --cache-only")
+
+
+def store(module, action, params, value):
+    if _cache is not None:
+        _cache.put(module, action, params, value)
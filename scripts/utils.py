@@ -1,7 +1,7 @@
 import re, json
-from eth_abi import decode
-from scripts.client_web3 import Web3Client
-from eth_utils import remove_0x_prefix
+import logging
+
+logger = logging.getLogger(__name__)
 
 def get_pragma_from_code(source_code: str) -> str:
     """
@@ -39,23 +39,35 @@ def isAbiAvailable(abi: str, contract_address) -> bool:
     :return: True se l'ABI è disponibile, False altrimenti
     """
     if abi is None or abi == "":
-        print(f"✗ Skipped {contract_address}: ABI not available. ABI: {abi}")
+        logger.info(f"✗ Skipped {contract_address}: ABI not available. ABI: {abi}")
         return False
     else: 
         return True
     
-def is_same_version(source_code: str, compiler_version: str, contract_address) -> str:
+def get_version_folder(pragma_version: str) -> str:
+    """
+    Ricava la cartella di versione dalla pragma.
+    :param pragma_version: Versione estratta dalla pragma (es. "0.8.30")
+    :return: Cartella di versione (es. "0_8")
+    """
+    version = pragma_version.replace(".", "_")
+    # From 0_8_30 to 0_8
+    return "_".join(version.split("_")[:2])
+
+def is_same_version(source_code: str, compiler_version: str, contract_address, pragma_version: str = None) -> str:
     """
     Controlla se la versione del compilatore corrisponde a quella del codice sorgente.
     :param source_code: Codice sorgente del contratto
     :param compiler_version: Versione del compilatore
+    :param pragma_version: Pragma già estratta dal sorgente, se disponibile
     :return: True se le versioni corrispondono, False altrimenti
     """
-    pragma_version = get_pragma_from_code(source_code)
-    compiler_version = get_compiler_version(compiler_version)   
+    if pragma_version is None:
+        pragma_version = get_pragma_from_code(source_code)
+    compiler_version = get_compiler_version(compiler_version or "")
     # Esempio: "0.8" == "0.8, match della major version"
     match_pragma = re.match(r'^(\d+\.\d+)', pragma_version)  
-    match_compiler = re.match(r'^(\d+\.\d+)', compiler_version)
+    match_compiler = re.match(r'^(\d+\.\d+)', compiler_version or "")
     if match_pragma and match_compiler:
         pragma_major_minor = match_pragma.group(1)
         compiler_major_minor = match_compiler.group(1)
@@ -63,7 +75,7 @@ def is_same_version(source_code: str, compiler_version: str, contract_address) -
         if pragma_major_minor == compiler_major_minor:
             return True
         else:
-            print(f"✗ Skipped {contract_address}: pragma version and compiler version do not match. Pragma: {pragma_major_minor}, Compiler: {compiler_major_minor}")
+            logger.info(f"✗ Skipped {contract_address}: pragma version and compiler version do not match. Pragma: {pragma_major_minor}, Compiler: {compiler_major_minor}")
             return False
         
 
@@ -76,7 +88,7 @@ def isLibraryEmpty(library: str, contract_address) -> bool:
     if library is None or library == "":
         return True
     else:
-        print(f"✗ Skipped {contract_address}: library not empty. Library: {library}")
+        logger.info(f"✗ Skipped {contract_address}: library not empty. Library: {library}")
         return False
     
 def check_source_and_byte(
@@ -96,11 +108,11 @@ def check_source_and_byte(
         return True
     else:
         if source_code is None or source_code == "":
-            print(f"✗ Skipped {contract_address}: source code missing. Source code: {source_code}")
+            logger.info(f"✗ Skipped {contract_address}: source code missing. Source code: {source_code}")
         if runtime_bytecode is None or runtime_bytecode == "":    
-            print(f"✗ Skipped {contract_address}: runtime bytecode missing. Runtime bytecode: {runtime_bytecode}")
+            logger.info(f"✗ Skipped {contract_address}: runtime bytecode missing. Runtime bytecode: {runtime_bytecode}")
         if creation_bytecode is None or creation_bytecode == "":
-            print(f"✗ Skipped {contract_address}: creation bytecode missing. Creation bytecode: {creation_bytecode}")
+            logger.info(f"✗ Skipped {contract_address}: creation bytecode missing. Creation bytecode: {creation_bytecode}")
         return False
 
 def decode_constructor_args(abi, constructor_arguments_hex):
@@ -113,6 +125,10 @@ def decode_constructor_args(abi, constructor_arguments_hex):
     """
     if constructor_arguments_hex is None or constructor_arguments_hex == '':
         return ""
+    # Import differiti: eth_abi ed eth_utils rallentano l'avvio e servono solo qui
+    # (nei processi del pool CPU, se attivo)
+    from eth_abi import decode
+    from eth_utils import remove_0x_prefix
     if isinstance(abi, str):
         abi = json.loads(abi)
 
@@ -135,10 +151,8 @@ def decode_constructor_args(abi, constructor_arguments_hex):
 
     for item in constructor["inputs"]:
         input_types.append(parse_type(item))
-    if constructor_arguments_hex.startswith("0x"):
-        constructor_args_bytes = bytes.fromhex(remove_0x_prefix(constructor_arguments_hex))
-    else:
-        constructor_args_bytes = constructor_arguments_hex
+    # Etherscan restituisce gli argomenti senza prefisso 0x: vanno convertiti in ogni caso
+    constructor_args_bytes = bytes.fromhex(remove_0x_prefix(constructor_arguments_hex))
     decoded_values = decode(input_types, constructor_args_bytes)
 
     # Associa ogni valore al nome
@@ -183,9 +197,7 @@ def is_candidate(
     
 def skipVersion(skip_version, source_code):
     pragma_version = get_pragma_from_code(source_code)
-    version = pragma_version.replace(".", "_")
-    # From 0_8_30 to 0_8
-    version_folder = "_".join(version.split("_")[:2])  # Es. 0_8
+    version_folder = get_version_folder(pragma_version)  # Es. 0_8
     if skip_version == version_folder:
         return True
     else:
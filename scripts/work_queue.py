@@ -0,0 +1,99 @@
+import logging
+import threading
+import time
+from scripts.metrics import inc
+
+DEFAULT_CHUNK_SIZE = 100
+
+logger = logging.getLogger(__name__)
+
+
+def iter_chunks(ranges, chunk_size):
+    """
+    Spezza gli intervalli in chunk contigui di al più `chunk_size` blocchi.
+    :param ranges: Lista di (start, end) decrescenti, estremi inclusi
+    :return: Generatore di (start, end)
+    """
+    for start, end in ranges:
+        while start >= end:
+            chunk_end = max(end, start - chunk_size + 1)
+            yield (start, chunk_end)
+            start = chunk_end - 1
+
+
+class BlockQueue:
+    """
+    Coda condivisa di chunk di blocchi: ogni worker libero prende il chunk
+    successivo, così il tempo totale segue il lavoro complessivo e non
+    l'intervallo più denso di deployment.
+    :param ranges: Lista di (start, end) decrescenti da scansionare
+    :param chunk_size: Numero di blocchi per chunk
+    """
+    def __init__(self, ranges, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.lock = threading.Lock()
+        self.chunks = iter_chunks(ranges, chunk_size)
+        self.total_blocks = sum(start - end + 1 for start, end in ranges)
+        self.total_chunks = sum(-(-(start - end + 1) // chunk_size) for start, end in ranges)
+        self.in_progress = {}
+        self.completed_chunks = 0
+        self.completed_blocks = 0
+        # Chunk con blocchi falliti -> numero di blocchi falliti
+        self.failed_chunks = {}
+        self.workers = {}
+        self.started = time.monotonic()
+
+    def next_chunk(self, worker):
+        with self.lock:
+            chunk = next(self.chunks, None)
+            if chunk is not None:
+                self.in_progress[chunk] = worker
+            return chunk
+
+    def chunk_done(self, chunk, worker, elapsed, failed=()):
+        """
+        :param failed: Blocchi del chunk non completati per un errore: non sono
+                       contati come scansionati e il chunk risulta fallito
+        """
+        blocks = chunk[0] - chunk[1] + 1 - len(failed)
+        with self.lock:
+            self.in_progress.pop(chunk, None)
+            if failed:
+                self.failed_chunks[chunk] = len(failed)
+            else:
+                self.completed_chunks += 1
+            self.completed_blocks += blocks
+            stats = self.workers.setdefault(worker, {"chunks": 0, "blocks": 0, "busy": 0.0})
+            stats["chunks"] += 1
+            stats["blocks"] += blocks
+            stats["busy"] += elapsed
+            done, total = self.completed_chunks, self.total_chunks
+        inc("miner_blocks_total", blocks)
+        if failed:
+            inc("miner_blocks_failed_total", len(failed))
+            logger.warning(f"Chunk {chunk[0]}-{chunk[1]} done by {worker} with {len(failed)} failed blocks")
+        else:
+            logger.info(f"Chunk {chunk[0]}-{chunk[1]} done by {worker} ({done}/{total} chunks)")
+
+    def print_summary(self):
+        elapsed = time.monotonic() - self.started
+        with self.lock:
+            print(
+                f"Scanned {self.completed_blocks}/{self.total_blocks} blocks "
+                f"in {self.completed_chunks}/{self.total_chunks} chunks, {elapsed:.1f}s"
+            )
+            for worker, stats in sorted(self.workers.items()):
+                rate = stats["blocks"] / stats["busy"] if stats["busy"] else 0.0
+                print(
+                    f"  {worker}: {stats['chunks']} chunks, {stats['blocks']} blocks, "
+                    f"{rate:.2f} blocks/s"
+                )
+            if self.failed_chunks:
+                print(
+                    f"  {len(self.failed_chunks)} chunks with {sum(self.failed_chunks.values())} failed blocks "
+                    f"(rerun with --resume): {sorted(self.failed_chunks)}"
+                )
+            if self.in_progress:
+                print(f"  {len(self.in_progress)} chunks left incomplete: {sorted(self.in_progress)}")
+
+    def close(self):
+        pass
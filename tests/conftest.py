@@ -0,0 +1,16 @@
+import sys
+import types
+
+# config.py contiene le API key dell'utente e non è nel repository:
+# senza di esso i test usano limiti e indirizzi fittizi
+try:
+    import config  # noqa: F401
+except ImportError:
+    config = types.ModuleType("config")
+    config.ETHERSCAN_API_KEY = "test"
+    config.ETHERSCAN_API_URL = "http://127.0.0.1:9/api"
+    config.ETHERSCAN_RATE_LIMIT_DELAY = 0
+    config.INFURA_API_URL = "http://127.0.0.1:9/rpc/"
+    config.INFURA_API_KEY = "test"
+    config.COUNTER_LIMIT = {"0_4": 10, "0_5": 10, "0_6": 10, "0_7": 10, "0_8": 10}
+    sys.modules["config"] = config
@@ -0,0 +1,61 @@
+import pytest
+from scripts.artifact_sink import ShardSink, iter_shard, list_shards
+
+ADDRESSES = [f"0x{i:040x}" for i in range(1, 4)]
+
+
+def write_all(sink, addresses):
+    return [sink.write("0_5", address, f"contract C{i} {{}}", "0x60", "0x6080") for i, address in enumerate(addresses)]
+
+
+def test_write_returns_after_the_contract_is_on_disk(tmp_path):
+    sink = ShardSink(str(tmp_path), flush_batch=2)
+    try:
+        assert write_all(sink, ADDRESSES) == [True, True, True]
+        # Il writer ha già fatto il flush: lo shard aperto contiene tutti i contratti
+        [path] = list_shards(str(tmp_path))
+        assert [address for address, _ in iter_shard(path)] == ADDRESSES
+    finally:
+        sink.close()
+
+
+def test_saved_addresses_are_read_once_at_open(tmp_path):
+    sink = ShardSink(str(tmp_path))
+    write_all(sink, ADDRESSES[:2])
+    sink.close()
+    reopened = ShardSink(str(tmp_path))
+    try:
+        assert sorted(reopened.saved_addresses()) == ADDRESSES[:2]
+        assert write_all(reopened, ADDRESSES) == [False, False, True]
+        assert sorted(reopened.saved_addresses()) == ADDRESSES
+    finally:
+        reopened.close()
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_truncated_shard_is_read_up_to_the_last_complete_contract(tmp_path, compress):
+    if compress:
+        pytest.importorskip("zstandard")
+    sink = ShardSink(str(tmp_path), compress=compress)
+    write_all(sink, ADDRESSES)
+    sink.close()
+    [path] = list_shards(str(tmp_path))
+    with open(path, "rb") as file:
+        data = file.read()
+    with open(path, "wb") as file:
+        file.write(data[:len(data) * 2 // 3])
+    addresses = [address for address, _ in iter_shard(path)]
+    assert addresses == ADDRESSES[:len(addresses)]
+    assert len(addresses) < len(ADDRESSES)
+
+
+def test_corrupted_compressed_shard_is_skipped(tmp_path):
+    pytest.importorskip("zstandard")
+    path = tmp_path / "0_5" / "shards" / "shard-00001.tar.zst"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"not a zstd frame" * 8)
+    # L'errore del decompressore non interrompe la lettura degli altri shard
+    assert list(iter_shard(str(path))) == []
+    sink = ShardSink(str(tmp_path))
+    assert sink.saved_addresses() == []
+    sink.close()
@@ -0,0 +1,38 @@
+import pytest
+from scripts.checkpoint import ProgressJournal, plan_ranges
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = ProgressJournal(str(tmp_path / "progress.db"))
+    yield journal
+    journal.close()
+
+
+def test_remaining_ranges_without_progress(journal):
+    assert journal.remaining_ranges(100, 1) == [(100, 1)]
+
+
+def test_remaining_ranges_with_gaps(journal):
+    for block in (100, 99, 50, 49, 10, 1):
+        journal.mark_done(block)
+    assert journal.remaining_ranges(100, 1) == [(98, 51), (48, 11), (9, 2)]
+
+
+def test_remaining_ranges_all_done(journal):
+    for block in range(1, 11):
+        journal.mark_done(block)
+    assert journal.remaining_ranges(10, 1) == []
+
+
+def test_remaining_ranges_ignores_blocks_outside_the_range(journal):
+    for block in (200, 5, 0):
+        journal.mark_done(block)
+    assert journal.remaining_ranges(10, 1) == [(10, 6), (4, 1)]
+    assert journal.completed_count(10, 1) == 1
+
+
+def test_plan_ranges(journal):
+    journal.mark_done(5)
+    assert plan_ranges(journal, 10, 1, resume=False) == [(10, 1)]
+    assert plan_ranges(journal, 10, 1, resume=True) == [(10, 6), (4, 1)]
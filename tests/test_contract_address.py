@@ -0,0 +1,32 @@
+import pytest
+from scripts.contract_address import rlp_encode, compute_contract_address, is_empty_bytecode
+
+
+@pytest.mark.parametrize("item, expected", [
+    (0, "80"),
+    (15, "0f"),
+    (1024, "820400"),
+    (b"dog", "83646f67"),
+    ([b"cat", b"dog"], "c88363617483646f67"),
+    ([], "c0"),
+    (b"a" * 56, "b838" + "61" * 56),
+])
+def test_rlp_encode(item, expected):
+    assert rlp_encode(item).hex() == expected
+
+
+@pytest.mark.parametrize("nonce, expected", [
+    (0, "0xcd234a471b72ba2f1ccf0a70fcaba648a5eecd8d"),
+    (1, "0x343c43a37d37dff08ae8c4a11544c718abb4fcf8"),
+    (2, "0xf778b86fa74e846c4f0a1fbd1335fe81c00a0c91"),
+    (3, "0xfffd933a0bc612844eaf0c6fe3e5b8e9b6c1d19c"),
+])
+def test_compute_contract_address(nonce, expected):
+    pytest.importorskip("eth_utils")
+    assert compute_contract_address("0x6ac7ea33f8831ea9dcc53393aaa88b25a785dbf0", nonce) == expected
+
+
+def test_is_empty_bytecode():
+    assert is_empty_bytecode(None)
+    assert is_empty_bytecode("0x")
+    assert not is_empty_bytecode("0x6080")
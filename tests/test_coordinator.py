@@ -0,0 +1,88 @@
+import pytest
+from scripts.coordinator import LeaseQueue, LeaseTable, MAX_LEASE_ATTEMPTS
+
+
+@pytest.fixture
+def table(tmp_path):
+    table = LeaseTable(str(tmp_path / "coordinator.db"))
+    yield table
+    table.close()
+
+
+def test_add_ranges_chunks_each_block_once(table):
+    assert table.add_ranges([(100, 1)], chunk_size=25) == 4
+    # Intervallo sovrapposto: si aggiungono solo i blocchi non ancora coperti
+    assert table.add_ranges([(120, 51)], chunk_size=25) == 1
+    assert table.status()["blocks"] == {"pending": 120}
+
+
+def test_lease_hands_out_the_highest_chunk_once(table):
+    table.add_ranges([(20, 1)], chunk_size=10)
+    first = table.lease("a")
+    second = table.lease("b")
+    assert (first["start"], first["end"]) == (20, 11)
+    assert (second["start"], second["end"]) == (10, 1)
+    assert table.lease("c") is None
+
+
+def test_expired_lease_is_reissued(table):
+    table.add_ranges([(10, 1)], chunk_size=10)
+    stale = table.lease("a", lease_seconds=-1)
+    fresh = table.lease("b")
+    assert fresh["start"] == stale["start"]
+    # Il worker creduto morto non può più rinnovare né completare il chunk
+    assert not table.renew(stale["lease"])
+    assert not table.complete(stale["lease"])
+    assert table.complete(fresh["lease"])
+    assert table.status()["chunks"] == {"done": 1}
+    assert table.status()["workers"] == {"b": {"chunks": 1, "blocks": 10}}
+
+
+def test_live_lease_is_not_reissued(table):
+    table.add_ranges([(10, 1)], chunk_size=10)
+    lease = table.lease("a")
+    assert table.lease("b") is None
+    assert table.renew(lease["lease"])
+
+
+def test_complete_is_idempotent(table):
+    table.add_ranges([(10, 1)], chunk_size=10)
+    lease = table.lease("a")
+    assert table.complete(lease["lease"])
+    assert table.complete(lease["lease"])
+    assert table.lease("b") is None
+
+
+def test_release_makes_the_chunk_available(table):
+    table.add_ranges([(10, 1)], chunk_size=10)
+    lease = table.lease("a")
+    table.release(lease["lease"])
+    assert not table.complete(lease["lease"])
+    assert table.lease("b")["start"] == 10
+
+
+def test_failed_chunk_is_released_and_re_leased(table):
+    table.add_ranges([(10, 1)], chunk_size=10)
+    first = LeaseQueue(table, "host-a")
+    second = LeaseQueue(table, "host-b")
+    try:
+        chunk = first.next_chunk("t0")
+        first.chunk_done(chunk, "t0", 1.0, failed=[7])
+        assert first.failed == 1
+        assert table.status()["chunks"] == {"pending": 1}
+        # Un altro worker riprende il chunk fallito e lo completa
+        assert second.next_chunk("t0") == chunk
+        second.chunk_done(chunk, "t0", 1.0, failed=[])
+        assert table.status()["chunks"] == {"done": 1}
+        assert table.status()["workers"] == {"host-b/t0": {"chunks": 1, "blocks": 10}}
+    finally:
+        first.stop.set()
+        second.stop.set()
+
+
+def test_chunk_fails_after_max_attempts(table):
+    table.add_ranges([(10, 1)], chunk_size=10)
+    for _ in range(MAX_LEASE_ATTEMPTS):
+        table.release(table.lease("a")["lease"], failed=True)
+    assert table.status()["chunks"] == {"failed": 1}
+    assert table.lease("b") is None
@@ -0,0 +1,37 @@
+from scripts.dedup import strip_metadata, runtime_hash, source_hash
+
+CODE = "6080604052348015600f57600080fd5b50"
+
+
+def metadata(digest):
+    # a1 65 "bzzr0" 58 20 <32 byte> seguito dalla lunghezza della mappa CBOR (0x0029)
+    return "a165627a7a72305820" + digest * 32 + "0029"
+
+
+def test_strip_metadata_removes_cbor_tail():
+    assert strip_metadata("0x" + CODE + metadata("11")) == bytes.fromhex(CODE)
+
+
+def test_strip_metadata_accepts_missing_prefix():
+    assert strip_metadata(CODE + metadata("11")) == bytes.fromhex(CODE)
+
+
+def test_strip_metadata_keeps_code_without_metadata():
+    assert strip_metadata("0x" + CODE) == bytes.fromhex(CODE)
+    assert strip_metadata("0x") == b""
+
+
+def test_strip_metadata_ignores_length_out_of_range():
+    # Gli ultimi due byte indicano una mappa più lunga del bytecode
+    code = CODE + "ffff"
+    assert strip_metadata(code) == bytes.fromhex(code)
+
+
+def test_runtime_hash_ignores_metadata():
+    assert runtime_hash("0x" + CODE + metadata("11")) == runtime_hash("0x" + CODE + metadata("22"))
+    assert runtime_hash("0x" + CODE + metadata("11")) != runtime_hash("0x" + CODE + "00" + metadata("11"))
+
+
+def test_source_hash_ignores_trailing_whitespace():
+    assert source_hash("contract A {}  \r\n") == source_hash("contract A {}\n")
+    assert source_hash("contract A {}") != source_hash("contract B {}")
@@ -0,0 +1,65 @@
+import threading
+from types import SimpleNamespace
+import pytest
+from scripts.follow import FollowState, RetryQueue, run_follow
+
+SAVED = "0x00000000000000000000000000000000000000aa"
+KEPT = "0x00000000000000000000000000000000000000bb"
+
+
+def chain(prefix, fork=None, base=None):
+    # Intestazioni dei blocchi 100-105; da `fork` in poi i blocchi sono di un'altra catena
+    headers = dict(base or {})
+    for n in range(fork or 100, 106):
+        parent = headers[n - 1]["hash"] if n - 1 in headers else "0x00"
+        headers[n] = {"hash": f"{prefix}{n}", "parentHash": parent}
+    return headers
+
+
+class Head:
+    def __init__(self, headers):
+        self.chain = headers
+
+    def block_number(self):
+        return max(self.chain)
+
+    def headers(self, block_numbers):
+        return {n: self.chain[n] for n in block_numbers}
+
+
+@pytest.fixture
+def state(tmp_path):
+    state = FollowState(str(tmp_path / "follow.db"))
+    yield state
+    state.close()
+
+
+def test_reorg_marks_contracts_saved_from_orphaned_blocks(tmp_path, monkeypatch, state):
+    monkeypatch.setattr("scripts.follow.time.sleep", lambda seconds: None)
+    retries = RetryQueue(str(tmp_path / "follow.db"))
+    pipeline = SimpleNamespace(quota=SimpleNamespace(stopped=threading.Event()))
+    original = chain("a")
+    head = Head(original)
+    # SAVED non è più sulla nuova catena, KEPT è in un blocco prima del fork
+    clientWeb3 = SimpleNamespace(get_bytecode=lambda address: "0x" if address == SAVED else "0x6080")
+    scanned = []
+
+    def scan_range(end, start):
+        scanned.append((start, end))
+        if len(scanned) == 1:
+            state.record_save(SimpleNamespace(address=KEPT, block_number=101, version_folder="0_5"))
+            state.record_save(SimpleNamespace(address=SAVED, block_number=102, version_folder="0_5"))
+            # Reorg dei blocchi dal 102 dopo la scansione
+            head.chain = chain("b", fork=102, base={n: original[n] for n in (100, 101)})
+        else:
+            pipeline.quota.stopped.set()
+        return []
+
+    run_follow(pipeline, scan_range, head, state, retries, None, clientWeb3, None,
+               start_block=100, confirmations=0, step=3)
+    # Il reorg è rilevato al blocco 103 e la scansione riprende dal punto di fork
+    assert scanned == [(100, 102), (102, 104)]
+    assert state.orphaned() == [(SAVED, 102, "0_5")]
+    assert state.saved_from(0) == [(KEPT, 101, "0_5")]
+    assert state.block_hash(102) == "b102"
+    retries.close()
@@ -0,0 +1,172 @@
+import json
+import pytest
+from config import COUNTER_LIMIT
+from scripts.artifact_sink import FileSink
+from scripts.counter import SaveCounter
+from scripts.dedup import DedupIndex
+from scripts.metadata_store import open_store
+from scripts.pipeline import Candidate, ContractPipeline
+
+ADDRESS = "0x00000000000000000000000000000000000000aa"
+RUNTIME = "0x6080604052"
+ABI = json.dumps([{"type": "function", "name": "f", "inputs": []}])
+
+
+def metadata(source="pragma solidity ^0.5.17;\ncontract A {}", **fields):
+    return {
+        "SourceCode": source,
+        "ABI": ABI,
+        "ContractName": "A",
+        "CompilerVersion": "v0.5.17+commit.d19bba13",
+        "OptimizationUsed": "1",
+        "ConstructorArguments": "",
+        "Library": "",
+        "Proxy": "0",
+        "CompilerType": "solc",
+        **fields,
+    }
+
+
+class Fetches:
+    # Client finti: registrano ogni richiesta
+    def __init__(self, metadata, runtime=RUNTIME, status="0x1"):
+        self.metadata = metadata
+        self.runtime = runtime
+        self.status = status
+        self.calls = []
+
+    def fetch_metadata(self, address):
+        self.calls.append("getsourcecode")
+        return self.metadata
+
+    def fetch_bytecode(self, address):
+        self.calls.append("eth_getCode")
+        return self.runtime
+
+    def fetch_receipt(self, tx_hash):
+        self.calls.append("eth_getTransactionReceipt")
+        return {"status": self.status}
+
+
+@pytest.fixture
+def output(tmp_path, monkeypatch):
+    # dispatcher.save scrive artefatti e metadati in una cartella temporanea
+    root = str(tmp_path / "contracts")
+    monkeypatch.setattr("scripts.artifact_sink._sink", FileSink(root))
+    monkeypatch.setattr("scripts.metadata_store._store", open_store("jsonl", root))
+    monkeypatch.setattr("scripts.dispatcher._saved_addresses", None)
+    return tmp_path
+
+
+def make_pipeline(monkeypatch, dedup=None):
+    monkeypatch.setattr("scripts.pipeline.get_dedup", lambda: dedup)
+    return ContractPipeline(SaveCounter())
+
+
+def run(pipeline, fetches, address=ADDRESS):
+    candidate = Candidate(address, {"hash": "0x01", "input": "0x6080604052600a"}, 100)
+    pipeline.run(candidate, fetches.fetch_metadata, fetches.fetch_bytecode, fetches.fetch_receipt)
+    return candidate
+
+
+def rejections(pipeline):
+    return {stage.name: dict(stage.rejections) for stage in pipeline.stages if stage.rejections}
+
+
+def test_stage_order(monkeypatch, tmp_path):
+    assert [s.name for s in make_pipeline(monkeypatch).stages] == ["version", "metadata", "bytecode", "constructor"]
+    dedup = DedupIndex(str(tmp_path / "dedup.db"))
+    # Con la deduplicazione il runtime è controllato per primo, prima di getsourcecode
+    assert [s.name for s in make_pipeline(monkeypatch, dedup).stages] == [
+        "duplicate runtime", "version", "metadata", "duplicate source", "bytecode", "constructor"
+    ]
+
+
+def test_contract_passing_every_stage_is_saved(monkeypatch, output):
+    pipeline = make_pipeline(monkeypatch)
+    fetches = Fetches(metadata())
+    candidate = run(pipeline, fetches)
+    assert candidate.rejected is None
+    assert fetches.calls == ["getsourcecode", "eth_getCode"]
+    assert all(stage.passed == 1 for stage in pipeline.stages)
+    assert (output / "contracts" / "0_5" / "sourcecode" / f"{ADDRESS}.sol").exists()
+    assert pipeline.file_counter["0_5"] == 1
+
+
+@pytest.mark.parametrize("fields, stage, reason", [
+    ({"source": ""}, "version", "source not verified"),
+    ({"source": "contract A {}"}, "version", "pragma missing"),
+    ({"source": "pragma solidity ^0.8.20;\ncontract A {}", "CompilerVersion": "v0.8.20"}, "version", "version skipped"),
+    ({"Proxy": "1"}, "metadata", "proxy"),
+    ({"source": "{{\"sources\": {\"A.sol\": {\"content\": \"pragma solidity ^0.5.17;\"}}}}"}, "metadata", "multi-file source"),
+    ({"Library": "Lib:0x01"}, "metadata", "library"),
+    ({"ABI": ""}, "metadata", "abi missing"),
+    ({"CompilerVersion": "v0.6.12"}, "metadata", "compiler mismatch"),
+])
+def test_rejection_is_counted_and_skips_bytecode(monkeypatch, output, fields, stage, reason):
+    pipeline = make_pipeline(monkeypatch)
+    fetches = Fetches(metadata(**fields))
+    candidate = run(pipeline, fetches)
+    assert candidate.rejected == reason
+    assert rejections(pipeline) == {stage: {reason: 1}}
+    # Scartato prima dello stadio del bytecode: nessuna eth_getCode
+    assert fetches.calls == ["getsourcecode"]
+
+
+def test_full_bucket_skips_bytecode(monkeypatch, output):
+    pipeline = make_pipeline(monkeypatch)
+    pipeline.file_counter.counts["0_5"] = COUNTER_LIMIT["0_5"]
+    fetches = Fetches(metadata())
+    assert run(pipeline, fetches).rejected == "bucket full"
+    assert fetches.calls == ["getsourcecode"]
+
+
+def test_bytecode_stage_rejection(monkeypatch, output):
+    pipeline = make_pipeline(monkeypatch)
+    fetches = Fetches(metadata(), runtime="0x", status="0x0")
+    candidate = run(pipeline, fetches)
+    assert candidate.rejected == "deployment reverted"
+    # Nessun codice all'indirizzo: la ricevuta dice se il deployment è fallito
+    assert fetches.calls == ["getsourcecode", "eth_getCode", "eth_getTransactionReceipt"]
+    assert rejections(pipeline) == {"bytecode": {"deployment reverted": 1}}
+
+
+def test_constructor_stage_rejection(monkeypatch, output):
+    abi = json.dumps([{"type": "constructor", "inputs": [{"name": "x", "type": "uint256"}]}])
+    pipeline = make_pipeline(monkeypatch)
+    fetches = Fetches(metadata(ABI=abi, ConstructorArguments="zz"))
+    assert run(pipeline, fetches).rejected == "constructor decode failed"
+    assert rejections(pipeline) == {"constructor": {"constructor decode failed": 1}}
+    assert pipeline.file_counter["0_5"] == 0
+
+
+def test_runtime_duplicate_skips_getsourcecode(monkeypatch, output, tmp_path):
+    dedup = DedupIndex(str(tmp_path / "dedup.db"))
+    pipeline = make_pipeline(monkeypatch, dedup)
+    run(pipeline, Fetches(metadata()))
+    clone = Fetches(metadata())
+    candidate = run(pipeline, clone, address="0x00000000000000000000000000000000000000bb")
+    assert candidate.rejected == "duplicate runtime"
+    assert clone.calls == ["eth_getCode"]
+    dedup.close()
+
+
+def test_clone_of_rejected_contract_skips_getsourcecode(monkeypatch, output, tmp_path):
+    dedup = DedupIndex(str(tmp_path / "dedup.db"))
+    pipeline = make_pipeline(monkeypatch, dedup)
+    assert run(pipeline, Fetches(metadata(Proxy="1"))).rejected == "proxy"
+    clone = Fetches(metadata(Proxy="1"))
+    candidate = run(pipeline, clone, address="0x00000000000000000000000000000000000000bb")
+    assert candidate.rejected == "clone of rejected"
+    assert clone.calls == ["eth_getCode"]
+    dedup.close()
+
+
+def test_unverified_contract_does_not_reject_its_clones(monkeypatch, output, tmp_path):
+    dedup = DedupIndex(str(tmp_path / "dedup.db"))
+    pipeline = make_pipeline(monkeypatch, dedup)
+    assert run(pipeline, Fetches(metadata(source=""))).rejected == "source not verified"
+    clone = Fetches(metadata())
+    assert run(pipeline, clone, address="0x00000000000000000000000000000000000000bb").rejected is None
+    assert clone.calls == ["eth_getCode", "getsourcecode"]
+    dedup.close()
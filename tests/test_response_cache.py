@@ -0,0 +1,44 @@
+import time
+import pytest
+from scripts.response_cache import cache_ttl, UNVERIFIED_TTL, FINALITY_SECONDS
+
+
+def sourcecode(source, status="1"):
+    return {"status": status, "result": [{"SourceCode": source}]}
+
+
+def block(age):
+    return {"result": {"timestamp": hex(int(time.time() - age)), "transactions": []}}
+
+
+def test_verified_source_never_expires():
+    assert cache_ttl("contract", "getsourcecode", sourcecode("contract A {}")) == 0
+
+
+def test_unverified_source_expires():
+    assert cache_ttl("contract", "getsourcecode", sourcecode("")) == UNVERIFIED_TTL
+
+
+def test_error_response_is_not_cached():
+    assert cache_ttl("contract", "getsourcecode", {"status": "0", "result": "Max rate limit reached"}) is None
+
+
+def test_only_finalized_blocks_are_cached():
+    assert cache_ttl("proxy", "eth_getBlockByNumber", block(FINALITY_SECONDS + 60)) == 0
+    assert cache_ttl("proxy", "eth_getBlockByNumber", block(30)) is None
+    # Dal nodo arriva il blocco senza l'involucro del proxy Etherscan
+    assert cache_ttl("rpc", "eth_getBlockByNumber", block(FINALITY_SECONDS + 60)["result"]) == 0
+    assert cache_ttl("rpc", "eth_getBlockByNumber", None) is None
+
+
+@pytest.mark.parametrize("module, action, value, expected", [
+    ("rpc", "eth_getTransactionReceipt", {"status": "0x1"}, 0),
+    ("proxy", "eth_getTransactionReceipt", {"result": None}, None),
+    ("rpc", "eth_getTransactionByHash", {"blockNumber": "0x10"}, 0),
+    ("rpc", "eth_getTransactionByHash", {"blockNumber": None}, None),
+    ("rpc", "eth_getCode", "0x6080", 0),
+    ("rpc", "eth_getCode", "0x", None),
+    ("proxy", "eth_blockNumber", {"result": "0x10"}, None),
+])
+def test_cache_ttl(module, action, value, expected):
+    assert cache_ttl(module, action, value) == expected
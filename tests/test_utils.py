@@ -0,0 +1,43 @@
+import pytest
+from scripts.utils import decode_constructor_args, get_pragma_from_code, get_version_folder
+
+ABI = [
+    {"type": "constructor", "inputs": [
+        {"name": "owner", "type": "address"},
+        {"name": "supply", "type": "uint256"},
+    ]},
+    {"type": "function", "name": "totalSupply", "inputs": []},
+]
+OWNER = "0x6ac7ea33f8831ea9dcc53393aaa88b25a785dbf0"
+ARGUMENTS = "000000000000000000000000" + OWNER[2:] + f"{1000:064x}"
+
+
+@pytest.mark.parametrize("arguments", [ARGUMENTS, "0x" + ARGUMENTS])
+def test_decode_constructor_args_with_and_without_prefix(arguments):
+    pytest.importorskip("eth_abi")
+    decoded = decode_constructor_args(ABI, arguments)
+    assert decoded["owner"].lower() == OWNER
+    assert decoded["supply"] == 1000
+
+
+def test_decode_constructor_args_accepts_abi_as_json():
+    pytest.importorskip("eth_abi")
+    import json
+    assert decode_constructor_args(json.dumps(ABI), ARGUMENTS)["supply"] == 1000
+
+
+def test_decode_constructor_args_without_arguments():
+    assert decode_constructor_args(ABI, "") == ""
+    assert decode_constructor_args(ABI, None) == ""
+
+
+def test_decode_constructor_args_without_constructor():
+    pytest.importorskip("eth_abi")
+    with pytest.raises(ValueError):
+        decode_constructor_args(ABI[1:], ARGUMENTS)
+
+
+def test_pragma_and_version_folder():
+    pragma = get_pragma_from_code("// SPDX-License-Identifier: MIT\npragma solidity ^0.5.17;\ncontract A {}")
+    assert pragma == "0.5.17"
+    assert get_version_folder(pragma) == "0_5"
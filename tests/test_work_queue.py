@@ -0,0 +1,20 @@
+from scripts.work_queue import BlockQueue, iter_chunks
+
+
+def test_iter_chunks_splits_ranges_backwards():
+    assert list(iter_chunks([(25, 1)], 10)) == [(25, 16), (15, 6), (5, 1)]
+
+
+def test_failed_blocks_are_not_counted_as_scanned(capsys):
+    queue = BlockQueue([(20, 1)], chunk_size=10)
+    first = queue.next_chunk("t0")
+    second = queue.next_chunk("t1")
+    queue.chunk_done(first, "t0", 1.0)
+    queue.chunk_done(second, "t1", 1.0, failed=[4, 3])
+    assert queue.completed_chunks == 1
+    assert queue.completed_blocks == 18
+    assert queue.failed_chunks == {(10, 1): 2}
+    queue.print_summary()
+    summary = capsys.readouterr().out
+    assert "Scanned 18/20 blocks in 1/2 chunks" in summary
+    assert "1 chunks with 2 failed blocks" in summary